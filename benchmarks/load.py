@@ -0,0 +1,132 @@
+'''
+Load test of the server mode. Simulated devices are run in a separate
+process, each of them opens its own connection (or sends datagrams) and
+replays the dataset at the rate of the real device. Reports the latency
+of each device (time between receiving the data and processing it), total
+throughput of the server and how long it was processing the data that
+was left after the devices stopped (if it could not keep up with them).
+Devices share the machine with the server, so they take part of its CPU.
+
+python -m benchmarks.load [--devices 1000] [--rate 5] [--duration 30] [--udp] [--binary]
+'''
+
+import asyncio
+import argparse
+import logging
+import multiprocessing
+import numpy as np
+import pandas as pd
+from time import perf_counter
+from typing import Dict, List
+
+import server
+from strYa.adts import encode_frames
+from strYa.batch import RAW_COLUMNS
+from strYa.logs import LOGGER_NAME
+from benchmarks.pipeline import DATASETS, to_lines
+
+
+def device_chunks(binary: bool = False) -> List[bytes]:
+    '''
+    Frames of the dataset, that are sent by the simulated devices
+    '''
+
+    values = pd.read_csv(DATASETS.joinpath('steady.csv'))[RAW_COLUMNS].to_numpy()
+    if binary:
+        return [encode_frames(row[None], seq) for seq, row in enumerate(values)]
+    return to_lines(values)
+
+
+async def _device(device_id: str, address: tuple, chunks: List[bytes],
+                  rate: float, duration: float, udp: bool) -> None:
+    loop = asyncio.get_running_loop()
+    # devices are started at different moments, as they would be
+    start = loop.time() + np.random.uniform(0, 1 / rate)
+    if udp:
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=address)
+        prefix = device_id.encode('utf-8') + b'\n'
+        send = lambda chunk: transport.sendto(prefix + chunk)
+    else:
+        reader, transport = await asyncio.open_connection(*address)
+        transport.write(device_id.encode('utf-8') + b'\n')
+        send = transport.write
+
+    for idx in range(int(duration * rate)):
+        await asyncio.sleep(max(start + idx / rate - loop.time(), 0))
+        send(chunks[idx % len(chunks)])
+
+    if not udp:
+        await transport.drain()
+    transport.close()
+
+
+async def _devices(num_of_devices: int, address: tuple, rate: float,
+                   duration: float, udp: bool, binary: bool) -> None:
+    chunks = device_chunks(binary)
+    await asyncio.gather(*(_device(f'device-{idx}', address, chunks, rate, duration, udp)
+                           for idx in range(num_of_devices)))
+
+
+def run_devices(*args) -> None:
+    asyncio.run(_devices(*args))
+
+
+async def run(num_of_devices: int = 1000, rate: float = 5.0, duration: float = 30.0,
+              udp: bool = False, binary: bool = False) -> Dict[str, float]:
+    '''
+    Runs the server and the simulated devices, returns the results
+    '''
+
+    posture_server = server.PostureServer(binary)
+    # all the devices connect at once
+    address = await posture_server.start('127.0.0.1', 0, udp, max(num_of_devices, server.BACKLOG))
+
+    devices = multiprocessing.get_context('spawn').Process(
+        target=run_devices, args=(num_of_devices, address, rate, duration, udp, binary))
+    start = perf_counter()
+    devices.start()
+    await asyncio.get_running_loop().run_in_executor(None, devices.join)
+    joined = last_change = perf_counter()
+
+    # lets the server process what is left in the sockets, if it could
+    # not keep up with the devices, that is the backlog it had
+    processed = -1
+    while posture_server.stats()['processed'] != processed:
+        processed = posture_server.stats()['processed']
+        last_change = perf_counter()
+        await asyncio.sleep(0.5)
+    elapsed = last_change - start
+    posture_server.close()
+
+    stats = posture_server.stats()
+    sessions = posture_server.sessions.values()
+    per_device = np.array([np.percentile(session.latencies, [50, 99])
+                           for session in sessions if session.latencies]) * 1e3
+    expected = num_of_devices * int(duration * rate)
+    return {'devices': stats['devices'],
+            'frames_sent': expected,
+            'frames_processed': stats['processed'],
+            'frames_lost': expected - stats['processed'],
+            'offered_frames_per_sec': num_of_devices * rate,
+            'frames_per_sec': stats['processed'] / elapsed,
+            'backlog_s': last_change - joined,
+            'device_p50_ms': float(np.median(per_device[:, 0])),
+            'device_p99_ms': float(np.median(per_device[:, 1])),
+            'worst_device_p99_ms': float(per_device[:, 1].max())}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--devices', type=int, default=1000, help='number of simulated devices')
+    parser.add_argument('--rate', type=float, default=5.0, help='frames per second of each device')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds each device sends data')
+    parser.add_argument('--udp', action='store_true', help='send datagrams instead of connections')
+    parser.add_argument('--binary', action='store_true', help='send binary frames')
+    args = parser.parse_args()
+
+    # logs of the pipelines of all the devices are not needed
+    logging.getLogger(LOGGER_NAME).setLevel(logging.ERROR)
+    results = asyncio.run(run(args.devices, args.rate, args.duration, args.udp, args.binary))
+    for key, value in results.items():
+        print(f'{key:<24}{value:>12.1f}')
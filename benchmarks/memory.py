@@ -0,0 +1,134 @@
+'''
+Memory benchmarks of the pipeline. Measures (with tracemalloc) how much
+memory a parsed frame takes while it waits in the queue of the reader,
+how much memory the state of one device takes,
+how much memory processing of a long session takes, how much memory
+is allocated for a moment while a sample is processed (short-lived
+objects that are created for it) and how many collections of the
+garbage collector it causes.
+
+python -m benchmarks.memory [--samples 100000]
+'''
+
+import gc
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from time import time
+from typing import Dict
+
+import main
+from strYa.adts import LineParser, PosturePosition
+from strYa.analyser import Analyzer
+from strYa.batch import RAW_COLUMNS
+from strYa.recording import RecordingWriter, RAW_RECORDING_COLUMNS
+from benchmarks.pipeline import DATASETS, to_lines
+
+
+def session(num_of_samples: int) -> np.ndarray:
+    '''
+    Long session of measurements, that is made of the steady dataset
+    '''
+
+    values = pd.read_csv(DATASETS.joinpath('steady.csv'))[RAW_COLUMNS].to_numpy()
+    return np.resize(values, (num_of_samples, len(RAW_COLUMNS)))
+
+
+def in_flight(values: np.ndarray) -> float:
+    '''
+    Bytes that each (time, frame) item, given by the parser, takes
+    '''
+
+    chunk = b''.join(to_lines(values))
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    # reader gives the same timestamp to all the frames of a chunk
+    timestamp = time()
+    items = [(timestamp, frame) for frame in LineParser().feed(chunk)]
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return size / len(items)
+
+
+def device_state(num_of_devices: int = 1000) -> float:
+    '''
+    Bytes of the state of one device (PosturePosition and Analyzer),
+    which the server keeps for each of them
+    '''
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    devices = [(PosturePosition(), Analyzer()) for _ in range(num_of_devices)]
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return size / len(devices)
+
+
+class _Collections:
+    '''
+    Counts the collections of the youngest generation
+    '''
+
+    def __init__(self) -> None:
+        self.count: int = 0
+
+    def __call__(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == 'start' and info['generation'] == 0:
+            self.count += 1
+
+
+def processing(values: np.ndarray, path: str) -> Dict[str, float]:
+    '''
+    Processes the session frame by frame and records it. Returns peak of
+    the traced memory, mean of the memory allocated at the peak of
+    processing of a sample and number of collections per 1000 samples
+    '''
+
+    timestamps = np.arange(len(values)) * 0.2
+    collections = _Collections()
+    posture, analyser = PosturePosition(), Analyzer()
+    with RecordingWriter(path, RAW_RECORDING_COLUMNS) as writer:
+        gc.collect()
+        gc.callbacks.append(collections)
+        tracemalloc.start()
+        transient = 0
+        peak = 0
+        try:
+            for iteration, (timestamp, frame) in enumerate(zip(timestamps.tolist(), values), 1):
+                before, session_peak = tracemalloc.get_traced_memory()
+                peak = max(peak, session_peak)
+                tracemalloc.reset_peak()
+                main.process_frame(posture, analyser, iteration, timestamp, frame, writer)
+                transient += tracemalloc.get_traced_memory()[1] - before
+            current, session_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, session_peak)
+        finally:
+            tracemalloc.stop()
+            gc.callbacks.remove(collections)
+
+    return {'peak_kb': peak / 1024, 'retained_kb': current / 1024,
+            'transient_bytes_per_sample': transient / len(values),
+            'gen0_collections_per_1k': collections.count * 1000 / len(values)}
+
+
+def run(num_of_samples: int = 100000, path: str = 'memory_benchmark.strya') -> Dict[str, float]:
+    values = session(num_of_samples)
+    results = {'in_flight_bytes_per_frame': in_flight(values[:10000]),
+               'device_state_bytes': device_state()}
+    results.update(processing(values, path))
+    return results
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=100000, help='length of the session')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(args.samples, os.path.join(tmp, 'session.strya'))
+    for key, value in results.items():
+        print(f'{key:<28}{value:>12.1f}')
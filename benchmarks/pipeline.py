@@ -0,0 +1,286 @@
+'''
+Benchmarks of the ingest -> fusion -> classification pipeline, that are
+run on the bundled datasets. Each stage is timed separately, sample by
+sample, as well as the whole pipeline. Results can be saved as a baseline
+and later compared against it, so the regressions are noticed.
+
+python -m benchmarks.pipeline [--save] [--compare] [--tolerance 0.25] [--repeat 3]
+'''
+
+import sys
+import json
+import pathlib
+import argparse
+import numpy as np
+import pandas as pd
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from ahrs.filters import Mahony
+
+import main
+from strYa.adts import Gyro, SensorGroup, QuaternionContainer, PosturePosition, parse_lines
+from strYa.analyser import Analyzer
+from strYa.batch import RAW_COLUMNS, orientations_from_raw
+from strYa.fusion import FusedMahony
+from strYa.ingest import ReplaySource
+from strYa.metrics import Registry, PipelineMetrics, DISABLED
+from strYa.rotations import quaternion_to_euler
+
+PATH = pathlib.Path(__file__).parent
+DATASETS = PATH.parent.joinpath('datasets', 'raw_data')
+BASELINE = PATH.joinpath('baseline.json')
+
+
+def to_lines(values: np.ndarray) -> List[bytes]:
+    '''
+    Formats (N, 12) array of measurements as the firmware prints them
+    '''
+
+    lines = []
+    for row in values.tolist():
+        groups = []
+        for acc, gyro in ((row[0:3], row[3:6]), (row[6:9], row[9:12])):
+            groups.append(', '.join(f'{i:.2f}' for i in acc) + '; ' +
+                          ', '.join(f'{i:.2f}' for i in gyro))
+        lines.append(('|'.join(groups) + '\r\n').encode('utf-8'))
+    return lines
+
+
+def summary(latencies: List[float], num_of_samples: int = None) -> Dict[str, float]:
+    '''
+    Throughput and latency percentiles (in microseconds) of per-sample timings.
+    If one timing covers several samples, their number should be given
+    '''
+
+    latencies = np.array(latencies)
+    total = latencies.sum()
+    num_of_samples = num_of_samples or len(latencies)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e6
+    return {'samples': num_of_samples,
+            'samples_per_sec': num_of_samples / total,
+            'p50_us': p50, 'p90_us': p90, 'p99_us': p99}
+
+
+def time_calls(func: Callable, args: Iterable[Tuple[Any]]) -> List[float]:
+    latencies = []
+    for arg in args:
+        start = perf_counter()
+        func(*arg)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def bench_preprocess_data(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    posture = PosturePosition()
+    lines = [line for df in datasets.values() for line in to_lines(df[RAW_COLUMNS].to_numpy())]
+    return summary(time_calls(posture.preprocess_data, ((line, ) for line in lines)))
+
+
+def bench_parse_lines(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    chunks = [b''.join(to_lines(df[RAW_COLUMNS].to_numpy())) for df in datasets.values()]
+    latencies = time_calls(parse_lines, ((chunk, ) for chunk in chunks))
+    return summary(latencies, sum(len(df) for df in datasets.values()))
+
+
+def bench_preprocess_data_from_file(paths: List[pathlib.Path]) -> Dict[str, float]:
+    posture = PosturePosition()
+    lines = []
+    for path in paths:
+        with open(path) as file:
+            # most of the datasets have a blank line after each row,
+            # which are skipped, as the replay does it
+            lines.extend(line for line in file.readlines()[1:] if line.strip())
+    return summary(time_calls(posture.preprocess_data_from_file, ((line, ) for line in lines)))
+
+
+def bench_gyro(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    latencies = []
+    for df in datasets.values():
+        gyro = Gyro()
+        latencies += time_calls(gyro.set_values,
+                                ((row, ) for row in df[RAW_COLUMNS[3:6]].to_numpy().tolist()))
+    return summary(latencies)
+
+
+def bench_count_orientation(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    latencies = []
+    for df in datasets.values():
+        sensor_group = SensorGroup()
+        sensor_group.gyro.settings = (0.0, 0.0, 0.0)
+        for row in df[RAW_COLUMNS[:6]].to_numpy().tolist():
+            sensor_group.acc.set_values(row[:3])
+            sensor_group.gyro.set_values(row[3:])
+            start = perf_counter()
+            sensor_group.count_orientation()
+            latencies.append(perf_counter() - start)
+    return summary(latencies)
+
+
+def bench_ahrs_mahony(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    '''
+    Update of the orientation as it was done before FusedMahony: arrays
+    of the quaternion and measurements are created for each sample
+    '''
+
+    latencies = []
+    for df in datasets.values():
+        mahony = Mahony(frequency=5)
+        q = np.array([1.0, 0.0, 0.0, 0.0])
+        for row in df[RAW_COLUMNS[:6]].to_numpy().tolist():
+            start = perf_counter()
+            q = mahony.updateIMU(np.array(q), np.array(row[3:]), np.array(row[:3]))
+            latencies.append(perf_counter() - start)
+    return summary(latencies)
+
+
+def bench_fused_mahony(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    latencies = []
+    for df in datasets.values():
+        mahony = FusedMahony(frequency=5)
+        latencies += time_calls(mahony.update, ((row[3:], row[:3])
+                                                for row in df[RAW_COLUMNS[:6]].to_numpy().tolist()))
+    return summary(latencies)
+
+
+def bench_to_euler(quats: np.ndarray) -> Dict[str, float]:
+    containers = [QuaternionContainer(q) for q in quats.tolist()]
+    return summary(time_calls(QuaternionContainer.to_euler, ((q, ) for q in containers)))
+
+
+def bench_quaternion_to_euler(quats: np.ndarray) -> Dict[str, float]:
+    out = np.empty((len(quats), 3))
+    latencies = time_calls(quaternion_to_euler, [(quats, out)] * 10)
+    return summary(latencies, 10 * len(quats))
+
+
+def bench_check_mode(angles: np.ndarray) -> Dict[str, float]:
+    analyser = Analyzer()
+    latencies = time_calls(analyser.check_mode, ((row[:2], row[3:5]) for row in angles.tolist()))
+    return summary(latencies)
+
+
+def bench_classify(angles: np.ndarray) -> Dict[str, float]:
+    latencies = time_calls(Analyzer.classify, [(angles[:, :2], angles[:, 3:5])] * 10)
+    return summary(latencies, 10 * len(angles))
+
+
+def bench_orientations_from_raw(datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    raws = [(df[RAW_COLUMNS].to_numpy(), ) for df in datasets.values()]
+    return summary(time_calls(orientations_from_raw, raws), sum(len(df) for df in datasets.values()))
+
+
+class TimedSource:
+    '''
+    Wraps the source of frames and measures the time that is spent
+    on each frame, which is time between giving it and request for the next one
+    '''
+
+    def __init__(self, source: Iterable) -> None:
+        self.source = source
+        self.latencies: List[float] = []
+
+    def __iter__(self) -> Iterator:
+        for item in self.source:
+            start = perf_counter()
+            yield item
+            self.latencies.append(perf_counter() - start)
+
+
+def bench_pipeline(paths: List[pathlib.Path], metrics: PipelineMetrics = DISABLED) -> Dict[str, float]:
+    latencies = []
+    for path in paths:
+        source = TimedSource(ReplaySource(path, speed=None))
+        main.process(PosturePosition(), Analyzer(), source, None, None, metrics=metrics)
+        latencies += source.latencies
+    return summary(latencies)
+
+
+def run(repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    '''
+    Runs all the benchmarks on the datasets. Each of them is run repeat
+    times and the fastest run is kept, so the results are less noisy
+    '''
+
+    paths = sorted(DATASETS.glob('*.csv'))
+    datasets = {path.stem: pd.read_csv(path) for path in paths}
+    angles = np.concatenate([orientations_from_raw(df[RAW_COLUMNS].to_numpy())[0]
+                             for df in datasets.values()])
+    quats = np.random.default_rng(0).normal(size=(len(angles), 4))
+    quats /= np.linalg.norm(quats, axis=1)[:, None]
+
+    stages = {
+        'preprocess_data': lambda: bench_preprocess_data(datasets),
+        'parse_lines': lambda: bench_parse_lines(datasets),
+        'preprocess_data_from_file': lambda: bench_preprocess_data_from_file(paths),
+        'Gyro.set_values': lambda: bench_gyro(datasets),
+        'SensorGroup.count_orientation': lambda: bench_count_orientation(datasets),
+        'ahrs.Mahony.updateIMU': lambda: bench_ahrs_mahony(datasets),
+        'FusedMahony.update': lambda: bench_fused_mahony(datasets),
+        'to_euler': lambda: bench_to_euler(quats),
+        'quaternion_to_euler': lambda: bench_quaternion_to_euler(quats),
+        'Analyzer.check_mode': lambda: bench_check_mode(angles),
+        'Analyzer.classify': lambda: bench_classify(angles),
+        'orientations_from_raw': lambda: bench_orientations_from_raw(datasets),
+        'pipeline': lambda: bench_pipeline(paths),
+        'pipeline_with_metrics': lambda: bench_pipeline(paths, PipelineMetrics(Registry())),
+    }
+
+    return {stage: max((bench() for _ in range(repeat)), key=lambda result: result['samples_per_sec'])
+            for stage, bench in stages.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    '''
+    Returns names of the stages, whose throughput is lower
+    than the one in baseline by more than tolerance
+    '''
+
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        if result['samples_per_sec'] < baseline[stage]['samples_per_sec'] * (1 - tolerance):
+            regressions.append(stage)
+    return regressions
+
+
+def report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]] = None) -> str:
+    lines = [f'{"stage":<32}{"samples/s":>14}{"p50, us":>10}{"p90, us":>10}{"p99, us":>10}'
+             + ('{:>12}'.format('vs baseline') if baseline else '')]
+    for stage, result in results.items():
+        line = f'{stage:<32}{result["samples_per_sec"]:>14.0f}{result["p50_us"]:>10.1f}' \
+               f'{result["p90_us"]:>10.1f}{result["p99_us"]:>10.1f}'
+        if baseline and stage in baseline:
+            line += f'{result["samples_per_sec"] / baseline[stage]["samples_per_sec"]:>11.2f}x'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save', action='store_true', help='save results as a baseline')
+    parser.add_argument('--compare', action='store_true', help='compare results with the baseline')
+    parser.add_argument('--baseline', default=BASELINE, help='path of the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown of a stage')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of each benchmark')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print(report(results, baseline))
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'Regressions: {", ".join(regressions)}')
+            sys.exit(1)
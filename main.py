@@ -5,108 +5,201 @@ TODO: check current posture block is obviously bad one,
 should work with analyser class
 '''
 import csv
-from time import time, sleep
+import logging
 from typing import List, Tuple
 from strYa.adts import SensorGroup, Accelerometer,\
                         Gyro, Buffer, QuaternionContainer,\
-                        PosturePosition
+                        PosturePosition, LineParser, FrameDecoder
 from strYa.analyser import Analyzer
+from strYa.events import LedWriter
+from strYa.ingest import SerialReader, ReplaySource, DROP_OLDEST
+from strYa.live import LiveFeed
+from strYa.logs import setup as setup_logging
+from strYa.metrics import Registry, PipelineMetrics, DISABLED
+from strYa.recording import RecordingWriter, RECORDING_SUFFIX
 
 COLUMNS_NAMES = ['human_time', 'computer_time', 'x_acc_1', 'y_acc_1',\
             'z_acc_1', 'x_gyro_1', 'y_gyro_1', 'z_gyro_1', 'x_acc_2', \
             'y_acc_2', 'z_acc_2', 'x_gyro_2', 'y_gyro_2', 'z_gyro_2']
 
-def main(from_file: str = None, to_file: str = None) -> None:
+# returned when the sensors should be calibrated once again
+RECALIBRATE = -1
+
+logger = logging.getLogger('strYa.main')
+
+def main(from_file: str = None, to_file: str = None,
+         binary: bool = False, policy: str = DROP_OLDEST,
+         speed: float = 1.0, feed: LiveFeed = None,
+         metrics_port: int = None, metrics_file: str = None,
+         fixed_rate: bool = True) -> None:
     '''
     Script function.
     
     Allows to write the raw data file in csv format
     (containing row data that then would be useful for prototyping), 
-    if the filename is specified.
+    if the filename is specified. If it ends with .strya, the data
+    is written as binary recording (see strYa.recording)
 
     Has two modes of working:
     - direct when the user uses the devise that transmits some data
-    through the serial port
+    through the serial port (as text lines or, if binary is set, as binary
+    frames). The port is read in a separate thread, policy determines what
+    happens with new measurements if processing falls behind
     - if the from_file param is specified, reads data from datasets
     and displays in the terminal how the system would behave with
-    such measurements. Useful for degub and test writing
+    such measurements. Useful for degub and test writing. Measurements
+    are replayed speed times faster than they were recorded, or as fast
+    as possible if speed is None
+
+    If feed is given, angles and postures are pushed to it for the live view
+
+    If metrics_port is given, timings of the stages and counters of the frames
+    are served in Prometheus text format on http://127.0.0.1:<port>/metrics,
+    if metrics_file is given, they are written into it when the script ends
+
+    Measurements are integrated at 5 Hz, unless fixed_rate is False, then
+    the sample periods are taken from their timestamps (see PosturePosition)
     '''
 
     # creates an instance of posture position class, which
     # allocates memory for 4 sensors (combined in two sensor groups)
-    posture = PosturePosition()
+    posture = PosturePosition(fixed_rate)
     analyser = Analyzer()
 
+    # metrics cost almost nothing when neither of the exports is asked for
+    registry = Registry(enabled=metrics_port is not None or metrics_file is not None)
+    metrics = PipelineMetrics(registry)
+    metrics_server = registry.serve(metrics_port) if metrics_port is not None else None
+
     if from_file:
-        file = open(from_file)
-        from_file_data = file.readlines()[1:]
-        from_file_data = [line for line in from_file_data if line]
-        port = None # so not to write separate handler of it later on
+        source = ReplaySource(from_file, speed)
+        port = led = None # so not to write separate handler of it later on
     else:
         port = posture.establish_connection()
+        # commands to the led are sent from a separate thread
+        led = LedWriter(port)
+        source = SerialReader(port, FrameDecoder() if binary else LineParser(),
+                              policy=policy, metrics=metrics)
+        metrics.watch_reader(source)
+        source.start()
 
-    if to_file:
-        # TODO: The keyboard interupt should handle its closing
-        file = open(to_file, 'w')
-        writer = csv.writer(file)
+    if to_file and to_file.endswith(RECORDING_SUFFIX):
+        # binary recording, that has the same columns except human time
+        out_file = writer = RecordingWriter(to_file, COLUMNS_NAMES[1:])
+    elif to_file:
+        out_file = open(to_file, 'w')
+        writer = csv.writer(out_file)
         writer.writerow(COLUMNS_NAMES)
     else:
         # so not to write separate handler of it later on
         writer = None
 
+    try:
+        return process(posture, analyser, source, writer, led, feed, metrics)
+    finally:
+        if not from_file:
+            source.stop()
+            # the device keeps the led on until it is told otherwise,
+            # and the analyser after recalibration starts with the ok posture
+            led.set(False)
+            led.close()
+            port.close()
+        if to_file:
+            out_file.close()
+        if metrics_file:
+            registry.write(metrics_file)
+        if metrics_server:
+            metrics_server.shutdown()
+            # so the port is free when main is called again after recalibration
+            metrics_server.server_close()
+
+
+def process(posture: PosturePosition, analyser: Analyzer, source, writer, led,
+            feed: LiveFeed = None, metrics: PipelineMetrics = DISABLED) -> None:
+    '''
+    Processing loop of the script. Source gives (time, frame) pairs,
+    it is either the reader of the serial port or replay of the dataset
+    '''
+
+    clock = metrics.clock
     iteration: int = 0  
-    while True:
+    for timestamp, values in source:
         iteration += 1
+        start = clock()
+        label = process_frame(posture, analyser, iteration, timestamp, values,
+                              writer, led, feed, metrics)
+        metrics.frame.observe(clock() - start)
+        metrics.frames.inc()
+        if label == RECALIBRATE:
+            return RECALIBRATE
 
-        # implemets some kind of recalibration
-        # TODO: this should be rewritten when analyser class would be
-        # implemented in in live code
-        if iteration < 200 and posture.bad_posture_iters > 30:
-            # function will end its execution and called one more time
-            # so to make the calibration one more time
-            print('Oooh, somethig has gone wrong... Wait for recalibration...')
-            return -1
+    logger.info('%s', dict(analyser.info_on_user))
 
-        if not from_file:
-            line = port.readline()
-            data = posture.preprocess_data(line)
+
+def process_frame(posture: PosturePosition, analyser: Analyzer, iteration: int,
+                  timestamp: float, values, writer=None, led: LedWriter = None,
+                  feed: LiveFeed = None, metrics: PipelineMetrics = DISABLED) -> int:
+    '''
+    Processes one frame of 12 measurements, iteration is its number since
+    the start. Returns label of the posture, None if the sensors are not
+    calibrated yet, or RECALIBRATE if the calibration should be made again
+    '''
+
+    clock = metrics.clock
+
+    # implemets some kind of recalibration
+    # TODO: this should be rewritten when analyser class would be
+    # implemented in in live code
+    if iteration < 200 and posture.bad_posture_iters > 30:
+        # function will end its execution and called one more time
+        # so to make the calibration one more time
+        logger.warning('Oooh, somethig has gone wrong... Wait for recalibration...')
+        return RECALIBRATE
+
+    start = clock()
+    if writer:
+        posture.write_frame(values, writer, timestamp)
+        written = clock()
+        metrics.write.observe(written - start)
+        start = written
+    posture.set_frame(values, None, timestamp)
+    metrics.set_frame.observe(clock() - start)
+    if not posture.lower_sensor_group.gyro.settings:
+        # waits for bias that will be then applied to each element
+        logger.info('. . .')
+        return None
+
+    start = clock()
+    current_angles: List[Tuple[float]] = []
+    period_from = None if posture.fixed_rate else timestamp
+    for sensor_group in posture.sensor_groups:
+        # skips some iteration so to the sensors could stabilise
+        if iteration < 100:
+            sensor_group.count_orientation(only_count=True, timestamp=period_from)
         else:
-            sleep(0.05) # because there are 200ms delays in data receiving from port
-            try:
-                line = from_file_data[iteration].rstrip()
-                if not line: continue
-            except IndexError:
-                print(analyser.info_on_user)
-                break
-            data = posture.preprocess_data_from_file(line, sep=',')
-
-        posture.set_sensor_data(data, writer)
-        if not posture.lower_sensor_group.gyro.settings:
-            # waits for bias that will be then applied to each element
-            print('. . .')
-            continue
-
-        current_angles: List[Tuple[float]] = []
-        for sensor_group in posture.sensor_groups:
-            # skips some iteration so to the sensors could stabilise
-            if iteration < 100:
-                sensor_group.count_orientation(only_count=True)
-            else:
-                sensor_group.count_orientation()
-
-            if sensor_group.has_optimal_position():
-                # port in which we will write in case if the posture is bad
-                # for test func: displays info about separate sensors groups
-                # sensor_group.check_current_posture(port=port)
-                # current_angles.append(sensor_group.orientation.to_euler()[:-1])
-                current_angles.append(sensor_group.normalised_angles())
-        if not current_angles: continue
-        analyser.check_mode(*current_angles, port=port)
+            sensor_group.count_orientation(timestamp=period_from)
+
+        if sensor_group.has_optimal_position():
+            # led which is turned on in case if the posture is bad
+            # for test func: displays info about separate sensors groups
+            # sensor_group.check_current_posture(led=led)
+            # current_angles.append(sensor_group.orientation.to_euler()[:-1])
+            current_angles.append(sensor_group.normalised_angles())
+    classified = clock()
+    metrics.filter.observe(classified - start)
+    if not current_angles: return None
+    label = analyser.check_mode(*current_angles, led=led, timestamp=timestamp)
+    metrics.classify.observe(clock() - classified)
+    metrics.classifications[label].inc()
+    if feed is not None:
+        feed.push(timestamp, *current_angles, label)
+    return label
 
 if __name__ == '__main__':
     # filename = 'datasets/row_data/forward_tilt_and_rotation.csv'
     filename = None
     # to_file = 'test.csv'
     to_file = 'GODSPRESENTTOPEOPLE2.csv'
-    while main(from_file=filename, to_file=to_file) == -1:
+    setup_logging()
+    while main(from_file=filename, to_file=to_file) == RECALIBRATE:
         main(from_file=filename)
@@ -0,0 +1,56 @@
+'''
+Cache of the processed datasets for the app pages. Entries are keyed by
+the path of the dataset and the time of its modification, so a changed
+file is processed again. The least recently used entries are evicted.
+'''
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Tuple
+
+
+class DatasetCache:
+    '''
+    Keeps whatever build returns for a dataset path (e.g. processed
+    arrays and the figure) for at most maxsize datasets
+    '''
+
+    def __init__(self, build: Callable[[str], Any], maxsize: int = 16) -> None:
+        self.build = build
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def _key(self, path: str) -> Tuple[str, int]:
+        return str(path), os.stat(path).st_mtime_ns
+
+    def get(self, path: str) -> Any:
+        key = self._key(path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # dataset is processed outside of the lock, so the viewers of
+        # other datasets do not wait for it
+        value = self.build(path)
+        with self._lock:
+            # the old versions of the same file are not needed anymore
+            for stale in [stale for stale in self._entries if stale[0] == key[0]]:
+                del self._entries[stale]
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def warm(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            self.get(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,8 +1,12 @@
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+import dash
 import pandas as pd
 import pathlib
+import os
+import sys
+import threading
 from app import app
 
 import plotly as py
@@ -14,11 +18,34 @@ import dash_player as player
 import numpy as np
 import time as t
 
-labels = ['steady','forward_tilt','side_tilt','forward_rotation']
-values = [390, 161, 97, 52]
+PATH = pathlib.Path(__file__).parent.parent
+
+# the app is run from its own directory, strYa package is next to it
+sys.path.append(str(PATH.parent))
+from strYa.analyser import POSTURES
+from strYa.live import LiveFeed, LIVE_COLUMNS
+from strYa.logs import setup as setup_logging
+
+# the pipeline is run in the same process as the app and pushes its
+# results to the feed; the source is either path of the dataset to
+# replay or 'serial' for the device
+SOURCE = os.environ.get('STRYA_LIVE_SOURCE')
+FEED = LiveFeed()
+
+# how often the page asks for new samples (ms) and how many
+# of them are kept in the angles graph
+UPDATE_INTERVAL = 1000
+NUM_OF_POINTS = 600
+
+labels = list(POSTURES) + ['not_clear']
 
 # pull is given as a fraction of the pie radius
-fig = go.Figure(data=[go.Pie(labels=labels, values=values, pull=[0.2, 0, 0, 0])])
+fig = go.Figure(data=[go.Pie(labels=labels, values=[0] * len(labels), sort=False,
+                             pull=[0.2] + [0] * (len(labels) - 1))])
+
+angles_fig = go.Figure(data=[go.Scatter(x=[], y=[], name=name) for name in LIVE_COLUMNS])
+angles_fig.update_yaxes(title_text="angle", range=[-90, 90])
+angles_fig.update_layout(title_text="Posture position", height=400)
 
 video = player.DashPlayer(
     id="main_video.mp4",
@@ -35,12 +62,59 @@ layout = html.Div([
 
     html.Div([
         html.Div(dcc.Graph(
-            id='graphs_timeline', 
+            id='graphs_timeline',
             figure=fig
         ), style={'display': 'inline-block', 'width': '49%'}),
         html.Div(id='video',
-            children=video, 
+            children=video,
             style={'display': 'inline-block', 'width': '49%'})
-    ])
-    
+    ]),
+
+    dcc.Graph(id='live_angles', figure=angles_fig),
+    dcc.Interval(id='live_interval', interval=UPDATE_INTERVAL),
+    # sequence number of the last sample, that is shown on the page
+    dcc.Store(id='live_seq', data=0)
+
 ])
+
+
+def run_pipeline(source: str) -> None:
+    '''
+    Runs the processing script, that pushes its results to the feed
+    '''
+    import main
+
+    from_file = None if source == 'serial' else source
+    while main.main(from_file=from_file, feed=FEED) == main.RECALIBRATE:
+        pass
+
+
+if SOURCE:
+    setup_logging()
+    threading.Thread(target=run_pipeline, args=(SOURCE, ), daemon=True).start()
+
+
+@app.callback(
+    [Output(component_id='live_angles', component_property='extendData'),
+    Output(component_id='graphs_timeline', component_property='extendData'),
+    Output(component_id='live_seq', component_property='data')],
+    Input(component_id='live_interval', component_property='n_intervals'),
+    State(component_id='live_seq', component_property='data')
+)
+def update_live(n_intervals, seq):
+    '''
+    Sends only the samples, that were pushed after the last update,
+    figures are extended with them instead of being rebuilt
+    '''
+    if FEED.seq == (seq or 0):
+        return dash.no_update, dash.no_update, dash.no_update
+
+    seq, times, angles, _ = FEED.since(seq or 0)
+    times = pd.to_datetime(times, unit='s').astype(str).tolist()
+    angles_update = ({'x': [times] * len(LIVE_COLUMNS), 'y': angles.T.tolist()},
+                     list(range(len(LIVE_COLUMNS))), NUM_OF_POINTS)
+
+    # values of the pie are replaced, as only the last len(labels) are kept
+    counts = FEED.counts()
+    pie_update = ({'values': [[counts[label] for label in labels]]}, [0], len(labels))
+    return angles_update, pie_update, seq
@@ -1,9 +1,12 @@
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output
+import dash
 import pandas as pd
 import pathlib
+import sys
 from app import app
+from apps.cache import DatasetCache
 
 import plotly as py
 from plotly.subplots import make_subplots
@@ -18,6 +21,15 @@ PATH = pathlib.Path(__file__).parent.parent
 print(PATH)
 DATA_PATH = PATH.joinpath("../datasets/angles").resolve()
 
+# the app is run from its own directory, strYa package is next to it
+sys.path.append(str(PATH.parent))
+from strYa.downsampling import lttb
+from strYa.recording import TimeIndex, read_angles
+
+# number of points of each graph that are sent to the browser,
+# either for the whole dataset or for the zoomed range
+NUM_OF_POINTS = 1000
+
 modes_list = ["Steady", "Forward rotation", "Forward tilt", "Forward tilt and rotation", "Side tilt"]
 
 modes_dict = {"Steady": "angles_steady.csv", "Forward rotation": "angles_forward_rotation.csv",
@@ -51,47 +63,87 @@ layout = html.Div([
 ])
 
 
-@app.callback(
-    [Output(component_id='six_graphs', component_property='figure'),
-    Output(component_id='video_field', component_property='children')],
-    Input(component_id='posture_mode', component_property='value')
-)
-def display_value(mode_chosen):
-    df = pd.read_csv(DATA_PATH.joinpath(modes_dict[mode_chosen]))
-    rounded = np.round(df)
-
+def read_arrays(path: str, start: float = None, end: float = None,
+                index: TimeIndex = None) -> dict:
+    '''
+    Reads angles dataset (only the rows with start <= computer_time < end,
+    if either is given) and normalises the angles due to the optimal position
+    '''
+    time, angles, optimal = read_angles(path, start, end, index)
 
+    #find all par for graphs
+    return {'time': time,
+            'x1': angles[:, 0] + optimal[0],
+            'y1': angles[:, 1] - optimal[1],
+            'x2': angles[:, 3] + optimal[3],
+            'y2': angles[:, 4] - optimal[4]}
+
+
+def process_dataset(path: str) -> dict:
+    '''
+    Reads angles dataset and builds the figure of the whole of it. Only the
+    figure is kept, the zoomed ranges are read again with the time index,
+    which is kept in memory, as the datasets may be in a read-only location
+    '''
+    arrays = read_arrays(path)
+    origin = arrays['time'][0]
+    arrays['time'] = arrays['time'] - origin
+
+    return {'origin': origin, 'index': TimeIndex(path, persistent=False),
+            'figure': build_figure(arrays, revision=pathlib.Path(path).name).to_dict()}
+
+
+def zoomed_figure(path: str, dataset: dict, x_range: tuple) -> go.Figure:
+    '''
+    Builds the figure of the visible range (seconds since the start of the
+    dataset), only the rows of that range are read from the dataset
+    '''
+    origin = dataset['origin']
+    arrays = read_arrays(path, origin + x_range[0], origin + x_range[1], dataset['index'])
+    arrays['time'] = arrays['time'] - origin
+    return build_figure(arrays, x_range, pathlib.Path(path).name)
+
+
+def visible_range(relayout_data: dict) -> tuple:
+    '''
+    Returns the time range, that is visible after zooming, or None if the
+    whole dataset is shown. All the graphs share x axis, so the range
+    of any of them is used; zoom of y axes does not change the time range
+    '''
+    if not relayout_data:
+        return None
+    for key, value in relayout_data.items():
+        if not key.startswith('xaxis'):
+            continue
+        if key.endswith('.range[0]'):
+            return value, relayout_data[key.replace('[0]', '[1]')]
+        if key.endswith('.range'):
+            return tuple(value)
+    return None
+
+
+def build_figure(arrays: dict, x_range: tuple = None, revision: str = None) -> go.Figure:
+    '''
+    Builds the figure of angles, each graph is downsampled to NUM_OF_POINTS
+    points in the given time range (the whole dataset by default).
+    Zoom is kept while figures of the same revision replace each other
+    '''
     fig = make_subplots(
     rows=2, cols=2, subplot_titles=("x1 graph", "x2 graph", "y1 graph", "y2 graph")
 )
-    #find optimal and delete it from data frame
-    optimal = df.tail(1)
-    x1_optimal = optimal['x1'].tolist()[0]
-    y1_optimal = optimal['y1'].tolist()[0]
-    x2_optimal = optimal['x2'].tolist()[0]
-    y2_optimal = optimal['y2'].tolist()[0]
-    df = df.head(-1)
-
-    #find all par for graphs
-    time = df['computer_time'].tolist()
-    start_time = time[0]
-    time = [i-start_time for i in time]
-    x1 = df['x1'].tolist()
-    x1 = [i+x1_optimal for i in x1]
-    y1 = df['y1'].tolist()
-    y1 = [i-y1_optimal for i in y1]
-
-    x2 = df['x2'].tolist()
-    x2 = [i+x2_optimal for i in x2]
-    y2 = df['y2'].tolist()
-    y2 = [i-y2_optimal for i in y2]
+    time = arrays['time']
+    start, end = 0, len(time)
+    if x_range is not None:
+        # one point outside the range on each side, so lines reach the edges
+        start = max(np.searchsorted(time, x_range[0]) - 1, 0)
+        end = np.searchsorted(time, x_range[1], side='right') + 1
+    time = time[start:end]
 
     # Add traces
-    fig.add_trace(go.Scatter(x=time, y=x1), row=1, col=1)
-    fig.add_trace(go.Scatter(x=time, y=y1), row=2, col=1)
-
-    fig.add_trace(go.Scatter(x=time, y=x2), row=1, col=2)
-    fig.add_trace(go.Scatter(x=time, y=y2), row=2, col=2)
+    for name, row, col in (('x1', 1, 1), ('y1', 2, 1), ('x2', 1, 2), ('y2', 2, 2)):
+        values = arrays[name][start:end]
+        selected = lttb(time, values, NUM_OF_POINTS)
+        fig.add_trace(go.Scatter(x=time[selected], y=values[selected]), row=row, col=col)
 
 
     # Update xaxis properties
@@ -109,8 +161,42 @@ def display_value(mode_chosen):
     fig.update_yaxes(title_text="y2", row=2, col=2, range=[-90, 90])
 
 
+    # zooming one of the graphs zooms all of them
+    fig.update_xaxes(matches='x')
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+
     # Update title and height
-    fig.update_layout(title_text="Posture position", height=500, width=600)
+    fig.update_layout(title_text="Posture position", height=500, width=600,
+                      uirevision=revision)
+    return fig
+
+
+# processed datasets of all the modes are kept in memory, so switching
+# between them does not need reading and plotting them again
+CACHE = DatasetCache(process_dataset, maxsize=len(modes_dict))
+CACHE.warm(DATA_PATH.joinpath(name) for name in modes_dict.values())
+
+
+@app.callback(
+    [Output(component_id='six_graphs', component_property='figure'),
+    Output(component_id='video_field', component_property='children')],
+    [Input(component_id='posture_mode', component_property='value'),
+    Input(component_id='six_graphs', component_property='relayoutData')]
+)
+def display_value(mode_chosen, relayout_data):
+    path = DATA_PATH.joinpath(modes_dict[mode_chosen])
+    dataset = CACHE.get(path)
+    triggered = [item['prop_id'] for item in dash.callback_context.triggered]
+    if 'six_graphs.relayoutData' in triggered:
+        # zoomed range is read from the dataset and plotted in higher resolution
+        x_range = visible_range(relayout_data)
+        if x_range is None and not any(key.endswith('autorange') for key in relayout_data or {}):
+            return dash.no_update, dash.no_update
+        fig = dataset['figure'] if x_range is None else zoomed_figure(path, dataset, x_range)
+        return fig, dash.no_update
+
+    fig = dataset['figure']
 
     video = player.DashPlayer(
             id="video-display",
@@ -0,0 +1,209 @@
+'''
+Server mode of the script. Accepts streams of measurements from many
+devices over TCP and UDP and processes them on one asyncio event loop,
+with separate PosturePosition and Analyzer for each device.
+
+TCP connection starts with the line that contains ID of the device,
+followed by the measurements in the same format as the device sends
+them to the serial port (text lines or, if binary is set, binary frames).
+Notifications about the bad posture are sent back through the connection.
+Each UDP datagram starts with ID of the device and a newline,
+followed by one or more lines (frames) of measurements.
+
+python server.py [--host 0.0.0.0] [--port 8765] [--backlog 4096] [--binary] [--no-udp]
+'''
+
+import asyncio
+import argparse
+import logging
+from collections import deque
+from time import time
+from typing import Any, Deque, Dict, Tuple
+
+from strYa.adts import PosturePosition, LineParser, FrameDecoder
+from strYa.analyser import Analyzer
+from strYa.events import LedWriter
+from strYa.logs import setup as setup_logging
+from main import process_frame, RECALIBRATE
+
+logger = logging.getLogger('strYa.server')
+
+# maximal length of the line with ID of the device
+MAX_ID_LENGTH = 64
+# connections, that wait to be accepted; when all the devices reconnect at once
+# (after restart of the server), the default 100 drops most of them. The
+# system limit (net.core.somaxconn) applies as well
+BACKLOG = 4096
+
+
+class DeviceSession:
+    '''
+    State of the pipeline of one device. Keeps the latencies of the last
+    processed frames: time between receiving the chunk of data and
+    processing of the frame from it
+    '''
+
+    def __init__(self, device_id: str, parser: Any, port: Any = None,
+                 num_of_latencies: int = 1024) -> None:
+        self.device_id: str = device_id
+        self.parser = parser
+        # led of the device, that is turned on while the posture is bad; asyncio
+        # streams never block on write, so the commands are written at once
+        self.led: LedWriter = LedWriter(port, threaded=False)
+        self.processed: int = 0
+        self.recalibrations: int = 0
+        self.latencies: Deque[float] = deque(maxlen=num_of_latencies)
+        self.reset()
+
+    def reset(self) -> None:
+        '''
+        Starts processing from the calibration. The new analyser starts
+        with the posture being ok, so the led is turned off
+        '''
+
+        self.led.set(False)
+        self.posture: PosturePosition = PosturePosition()
+        self.analyser: Analyzer = Analyzer()
+        self.iteration: int = 0
+
+    def feed(self, chunk: bytes, timestamp: float = None) -> int:
+        '''
+        Parses the chunk of received data and processes the frames
+        from it. Returns number of the processed frames
+        '''
+
+        if timestamp is None:
+            timestamp = time()
+
+        frames = self.parser.feed(chunk)
+        for values in frames:
+            self.iteration += 1
+            if process_frame(self.posture, self.analyser, self.iteration,
+                             timestamp, values, led=self.led) == RECALIBRATE:
+                self.recalibrations += 1
+                self.reset()
+            self.latencies.append(time() - timestamp)
+
+        self.processed += len(frames)
+        return len(frames)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server: 'PostureServer') -> None:
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        device_id, sep, chunk = data.partition(b'\n')
+        if not sep or len(device_id) > MAX_ID_LENGTH:
+            self.server.rejected += 1
+            return
+        self.server.session(device_id.decode('utf-8', 'replace').strip()).feed(chunk)
+
+
+class PostureServer:
+    '''
+    Keeps sessions of the devices by their IDs. Session is created when
+    the device sends its first data and is kept after it disconnects,
+    so the device can reconnect without new calibration
+    '''
+
+    def __init__(self, binary: bool = False) -> None:
+        self.binary: bool = binary
+        self.sessions: Dict[str, DeviceSession] = {}
+        # connections and datagrams without valid ID
+        self.rejected: int = 0
+        self._servers: list = []
+
+    def session(self, device_id: str, port: Any = None) -> DeviceSession:
+        if device_id not in self.sessions:
+            parser = FrameDecoder() if self.binary else LineParser()
+            self.sessions[device_id] = DeviceSession(device_id, parser, port)
+        elif port is not None:
+            # the device gets the current state of the led after reconnection
+            self.sessions[device_id].led.attach(port)
+        return self.sessions[device_id]
+
+    async def handle_stream(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        '''
+        Handles TCP connection of one device
+        '''
+
+        try:
+            line = await reader.readuntil(b'\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            line = b''
+        device_id = line.decode('utf-8', 'replace').strip()
+        if not device_id or len(device_id) > MAX_ID_LENGTH:
+            self.rejected += 1
+            writer.close()
+            return
+
+        session = self.session(device_id, port=writer)
+        try:
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    break
+                session.feed(chunk)
+        except ConnectionError:
+            pass
+        finally:
+            session.led.attach(None)
+            writer.close()
+
+    async def start(self, host: str = '0.0.0.0', port: int = 8765,
+                    udp: bool = True, backlog: int = BACKLOG) -> Tuple[str, int]:
+        '''
+        Starts listening on TCP (and UDP) port, if port is 0, it is chosen
+        by the system. Backlog should be about the number of the devices.
+        Returns the address the server listens on
+        '''
+
+        server = await asyncio.start_server(self.handle_stream, host, port, backlog=backlog)
+        self._servers.append(server)
+        address = server.sockets[0].getsockname()[:2]
+        if udp:
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=address)
+            self._servers.append(transport)
+        return address
+
+    def close(self) -> None:
+        for server in self._servers:
+            server.close()
+        self._servers = []
+
+    def stats(self) -> Dict[str, int]:
+        return {'devices': len(self.sessions),
+                'processed': sum(session.processed for session in self.sessions.values()),
+                'recalibrations': sum(session.recalibrations for session in self.sessions.values()),
+                'rejected': self.rejected}
+
+
+async def serve(host: str, port: int, binary: bool, udp: bool, backlog: int = BACKLOG) -> None:
+    server = PostureServer(binary)
+    address = await server.start(host, port, udp, backlog)
+    logger.info('Listening on %s:%s', address[0], address[1])
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.close()
+        logger.info('%s', server.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--backlog', type=int, default=BACKLOG,
+                        help='connections waiting to be accepted, about the number of devices')
+    parser.add_argument('--binary', action='store_true', help='devices send binary frames')
+    parser.add_argument('--no-udp', dest='udp', action='store_false', help='listen only on TCP')
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(serve(args.host, args.port, args.binary, args.udp, args.backlog))
+    except KeyboardInterrupt:
+        pass
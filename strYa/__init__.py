@@ -1 +1,3 @@
-import adts
\ No newline at end of file
+'''
+strYa - posture tracking system based on two IMUs.
+'''
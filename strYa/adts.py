@@ -5,70 +5,313 @@ Should be run in a simulation, or in case one wants to test the system
 could be used to analyse data written to a dataset.
 '''
 
+import re
+import pathlib
 import numpy as np
-import math
 import serial
 from typing import Any, Dict, Tuple, List
 from datetime import datetime
 from time import time
 import pandas as pd
 import csv
+import logging
 
 from abc import ABCMeta, abstractmethod
-from ahrs.filters import Mahony
+
+from strYa.batch import orientations_from_raw, RAW_COLUMNS, ANGLE_COLUMNS
+from strYa.fusion import FusedMahony, SampleClock
+from strYa.incremental import update_angles
+from strYa.rotations import euler_from_quaternion
+
+logger = logging.getLogger(__name__)
+
+# variances (of rad/s and of degrees) below which the sensor is considered
+# to be still, so its bias or optimal position could be recounted
+GYRO_STEADY_VARIANCE: float = 1e-3
+POSITION_STEADY_VARIANCE: float = 1.0
+
+# line looks like acc_x, acc_y, acc_z; gyro_x, gyro_y, gyro_z|\
+# acc_x, acc_y, acc_z; gyro_x, gyro_y, gyro_z
+_NUMBER = rb'[-+.\deE]+'
+_SENSOR_GROUP = b', '.join([_NUMBER] * 3) + b'; ' + b', '.join([_NUMBER] * 3)
+LINE_PATTERN = re.compile(rb'^(' + _SENSOR_GROUP + rb'\|' + _SENSOR_GROUP + rb')\r?$', re.MULTILINE)
+_NON_BLANK_LINE = re.compile(rb'^[^\S\n]*\S', re.MULTILINE)
+# longest part of a line that is kept while waiting for its end
+MAX_LINE_LENGTH: int = 1024
+
+
+def _to_numbers(line: bytes) -> bytes:
+    return line.replace(b'; ', b', ').replace(b'|', b', ')
+
+
+def parse_lines(chunk: bytes) -> Tuple[np.ndarray, int]:
+    '''
+    Parses chunk of bytes, which contains lines of measurements, into
+    (N, 12) array. Lines that do not match the format are skipped, their
+    number is returned along with the array. Blank lines are ignored
+    '''
+
+    rows = LINE_PATTERN.findall(chunk)
+    rejected = len(_NON_BLANK_LINE.findall(chunk)) - len(rows)
+
+    # all the matched lines are parsed at once, in case some of them
+    # contains something that only looks like a number, they are
+    # parsed one by one in order to find it
+    try:
+        values = np.fromstring(_to_numbers(b', '.join(rows)), sep=',')
+    except ValueError:
+        values = None
+    if values is None or len(values) != 12 * len(rows):
+        values = []
+        for row in rows:
+            try:
+                values.extend([float(i) for i in _to_numbers(row).split(b', ')])
+            except ValueError:
+                rejected += 1
+        values = np.array(values, dtype=np.float64)
+
+    return values.reshape(-1, 12), rejected
+
+
+class LineParser:
+    '''
+    Parses the stream of bytes that is read from the serial port. Lines can be split
+    between chunks, so the unfinished one is kept till the next chunk comes
+    '''
+
+    def __init__(self) -> None:
+        self.remainder: bytes = b''
+        self.parsed: int = 0
+        self.rejected: int = 0
+
+    def feed(self, chunk: bytes) -> np.ndarray:
+        '''
+        Returns (N, 12) array of measurements from the lines that
+        are finished in this chunk
+        '''
+
+        data = self.remainder + chunk
+        end = data.rfind(b'\n') + 1
+        self.remainder = data[end:]
+        if len(self.remainder) > MAX_LINE_LENGTH:
+            # there is no line separator for too long, so it is not a line
+            self.remainder = b''
+            self.rejected += 1
+
+        values, rejected = parse_lines(data[:end])
+        self.parsed += len(values)
+        self.rejected += rejected
+        return values
+
+
+# binary frame, which is sent by firmware if it is built with BINARY_FRAMES:
+# sync word, sequence number, 12 measurements as int16 and Fletcher-16
+# checksum of sequence number and measurements, all little-endian
+FRAME_SYNC: bytes = b'\xaa\x55'
+FRAME_DTYPE: np.dtype = np.dtype([('sync', '<u2'), ('seq', '<u2'),
+                                  ('values', '<i2', (12, )), ('checksum', '<u2')])
+FRAME_SIZE: int = FRAME_DTYPE.itemsize
+# acceleration is sent in hundredths of m/s^2, rotation in thousandths of rad/s
+FRAME_SCALE: np.ndarray = np.array(([100.0] * 3 + [1000.0] * 3) * 2)
+_SYNC_WORD: int = int.from_bytes(FRAME_SYNC, 'little')
+_CHECKSUM_WEIGHTS: np.ndarray = np.arange(FRAME_SIZE - 4, 0, -1)
+
+
+def fletcher16(frames: np.ndarray) -> np.ndarray:
+    '''
+    Counts Fletcher-16 checksums of sequence numbers and
+    measurements of given array of frames at once
+    '''
+
+    data = frames.view(np.uint8).reshape(-1, FRAME_SIZE)[:, 2:-2].astype(np.int64)
+    low = data.sum(axis=1) % 255
+    high = (data @ _CHECKSUM_WEIGHTS) % 255
+    return ((high << 8) | low).astype(np.uint16)
+
+
+def encode_frames(values: np.ndarray, seq: int = 0) -> bytes:
+    '''
+    Encodes (N, 12) array of measurements into binary frames in the same
+    way the firmware does. Sequence numbers start from the given one
+    '''
+
+    values = np.atleast_2d(values)
+    frames = np.zeros(len(values), dtype=FRAME_DTYPE)
+    frames['sync'] = _SYNC_WORD
+    frames['seq'] = (seq + np.arange(len(values))) % 2 ** 16
+    frames['values'] = np.clip(np.round(values * FRAME_SCALE), -2 ** 15, 2 ** 15 - 1)
+    frames['checksum'] = fletcher16(frames)
+    return frames.tobytes()
+
+
+class FrameDecoder:
+    '''
+    Decodes the stream of binary frames. Frames can be split between chunks,
+    and there could be some garbage between them, so the decoder looks for sync
+    word and checks checksum of each frame. Frames lost on the way are counted
+    by gaps in sequence numbers
+    '''
+
+    def __init__(self) -> None:
+        self.remainder: bytes = b''
+        self.last_seq: int = None
+        self.decoded: int = 0
+        self.dropped: int = 0
+        self.corrupted: int = 0
+
+    def feed(self, chunk: bytes) -> np.ndarray:
+        '''
+        Returns (N, 12) array of measurements from the frames
+        that are finished in this chunk
+        '''
+
+        data = self.remainder + chunk
+        decoded = []
+        pos = 0
+        while True:
+            start = data.find(FRAME_SYNC, pos)
+            if start < 0:
+                # keeps the last byte, as it may be the first one of sync word
+                pos = max(pos, len(data) - 1)
+                break
+            count = (len(data) - start) // FRAME_SIZE
+            if not count:
+                pos = start
+                break
+
+            # usually frames follow one another, so all of them are checked
+            # at once, till the first one that is not valid
+            frames = np.frombuffer(data, dtype=FRAME_DTYPE, count=count, offset=start)
+            valid = (frames['sync'] == _SYNC_WORD) & (fletcher16(frames) == frames['checksum'])
+            num_valid = count if valid.all() else int(valid.argmin())
+            if not num_valid:
+                self.corrupted += 1
+                pos = start + 1
+                continue
+            decoded.append(frames[:num_valid])
+            pos = start + num_valid * FRAME_SIZE
+
+        self.remainder = data[pos:]
+        if not decoded:
+            return np.empty((0, 12))
+
+        frames = np.concatenate(decoded)
+        self._count_dropped(frames['seq'])
+        self.decoded += len(frames)
+        return frames['values'] / FRAME_SCALE
+
+    def _count_dropped(self, seq: np.ndarray) -> None:
+        seq = seq.astype(np.int64)
+        if self.last_seq is not None:
+            seq = np.concatenate(([self.last_seq], seq))
+        gaps = (np.diff(seq) - 1) % 2 ** 16
+        # huge gaps mean that the device was restarted, not that
+        # thousands of frames were lost
+        self.dropped += int(gaps[gaps < 2 ** 15].sum())
+        self.last_seq = int(seq[-1])
 
 
 class Buffer:
+    '''
+    Fixed-size circular buffer of measurements, preallocated as numpy array.
+    Keeps running sum and sum of squares of its elements, so their mean and
+    variance could be got at any moment without going through the buffer
+    '''
 
-    def __init__(self, size: int = 25) -> None:
-        self.data: List[float] = []
+    __slots__ = ('size', 'width', '_data', '_sum', '_sum_sq', '_head', '_count')
+
+    def __init__(self, size: int = 25, width: int = 3, dtype: Any = np.float64) -> None:
         self.size: int = size
-        self.optimal: List[float] = None
-        self.gyro_settings: Tuple[float] = None
+        self.width: int = width
+        self._data: np.ndarray = np.zeros((size, width), dtype=dtype)
+        self._sum: np.ndarray = np.zeros(width)
+        self._sum_sq: np.ndarray = np.zeros(width)
+        self._head: int = 0
+        self._count: int = 0
 
     def push(self, quat: Tuple[float]) -> None:
         '''
         Puches an elements into buffer, while it is not filled.
-        If it is, deletes the first element in order for buffer
+        If it is, overwrites the oldest element in order for buffer
         to remain of the same size.
         '''
 
+        row = self._data[self._head]
         if self.is_filled():
-            self.data.pop(0)
-        self.data.append(quat)
+            self._sum -= row
+            self._sum_sq -= row * row
+        else:
+            self._count += 1
+
+        row[:] = quat
+        self._sum += row
+        self._sum_sq += row * row
+
+        self._head = (self._head + 1) % self.size
+        if self._head == 0:
+            # recounts the sums once per buffer turn, so the rounding
+            # errors of subtractions do not pile up in long sessions
+            self._sum = self._data.sum(axis=0, dtype=np.float64)
+            self._sum_sq = (self._data.astype(np.float64) ** 2).sum(axis=0)
 
     def is_filled(self) -> bool:
         '''
         Checks whether buffer is filled
         '''
 
-        return len(self.data) == self.size
+        return self._count == self.size
+
+    def mean(self) -> np.ndarray:
+        '''
+        Mean of the elements that are in the buffer
+        '''
+
+        return self._sum / self._count
+
+    def variance(self) -> np.ndarray:
+        '''
+        Variance of the elements that are in the buffer
+        '''
+
+        mean = self._sum / self._count
+        return np.maximum(self._sum_sq / self._count - mean * mean, 0.0)
+
+    def is_steady(self, max_variance: float) -> bool:
+        '''
+        Checks whether the buffer is filled and variance of each of
+        its axes does not exceed the given one
+        '''
+
+        return self.is_filled() and bool((self.variance() <= max_variance).all())
 
-    def optimal_position(self) -> Tuple[float]:
+    def values(self) -> np.ndarray:
+        '''
+        Elements of the buffer from the oldest to the newest one
+        '''
+
+        if not self.is_filled():
+            return self._data[:self._count].copy()
+        return np.roll(self._data, -self._head, axis=0)
+
+    @property
+    def data(self) -> List[List[float]]:
+        return self.values().tolist()
+
+    def optimal_position(self) -> List[float]:
         '''
         Based on measurments, determines user's optimal position.
         '''
 
-        data = np.array(self.data)
-        print(data)
-        optimal = list(data.mean(axis=0))
-        print('optimal')
-        print(optimal)
-        return optimal
+        return list(self.mean())
 
-    def count_gyro_drift(self) -> None:
+    def count_gyro_drift(self) -> Tuple[float]:
         '''
         Finds the drift (bias) of gyro, based on the measurements
         that are in the filled buffer. Then applies them as settings in order
         to get rid of this bias later on
         '''
 
-        # takes three args that represent gyro measuremnts
-        gyro_data = np.array(self.data)
-        bias = tuple(gyro_data.mean(axis=0))
-        print(f'Gyro bias is calculated: {bias}')
-
-        return bias
+        return tuple(self.mean())
 
     def __str__(self) -> str:
         return str(self.data)
@@ -82,6 +325,8 @@ class Sensor(metaclass=ABCMeta):
     of time
     '''
 
+    __slots__ = ('buffer', 'current_value', 'settings')
+
     def __init__(self) -> None:
         self.buffer: Buffer = Buffer()
         self.current_value: Tuple[float] = None
@@ -104,24 +349,39 @@ class Accelerometer(Sensor):
     Accelerometer container class
     '''
 
+    __slots__ = ()
+
     def set_values(self, values: Tuple[float]) -> None: 
         self.current_value = values
 
 class Gyro(Sensor):
+    '''
+    Gyro container class. If continuous, keeps its buffer after the calibration
+    and recounts the bias each time the sensor holds still for the whole buffer
+    '''
+
+    __slots__ = ('continuous', 'max_variance')
 
-    def process_values(self, values: List[float]) -> Tuple[float]:
+    def __init__(self, continuous: bool = False,
+                 max_variance: float = GYRO_STEADY_VARIANCE) -> None:
+        super().__init__()
+        self.continuous: bool = continuous
+        self.max_variance: float = max_variance
+
+    def process_values(self, values: List[float]) -> List[float]:
         '''
         Processes value due to the gyro setings.
-        If there is no such, raises ValueError
+        If there is no such, raises ValueError.
+        The measurements (a list or an array) are not changed
         '''
 
         if self.settings is None:
             raise ValueError('There is no settings counted')
 
-        for idx, value in enumerate(values):
-            values[idx] = value - self.settings[idx]
-
-        return values            
+        # arithmetic on three plain floats is faster than on numpy arrays
+        bias_x, bias_y, bias_z = self.settings
+        x, y, z = values.tolist() if isinstance(values, np.ndarray) else values
+        return [x - bias_x, y - bias_y, z - bias_z]
 
     def set_values(self, values: Tuple[float]) -> None:
         '''
@@ -129,27 +389,40 @@ class Gyro(Sensor):
         in order to have the bias counted
         '''
 
-        if self.settings is not None:
-            self.current_value = self.process_values(values)
-            return
-        if not self.buffer.is_filled():
+        if self.settings is None:
+            if not self.buffer.is_filled():
+                self.buffer.push(values)
+                self.current_value = values
+                return
+            self.settings = self.buffer.count_gyro_drift()
+            logger.info('Gyro bias is calculated: %s', self.settings)
+            if not self.continuous:
+                self.buffer = None
+        elif self.continuous:
             self.buffer.push(values)
-            self.current_value = values
-            return
-        self.settings = self.buffer.count_gyro_drift()
+            if self.buffer.is_steady(self.max_variance):
+                self.settings = self.buffer.count_gyro_drift()
+
         self.current_value = self.process_values(values)
-        self.buffer = None
-        return
 
 
 class QuaternionContainer:
-    
+
+    __slots__ = ('w', 'x', 'y', 'z')
+
     def __init__(self, data: np.array) -> None:
         self.w, self.x, self.y, self.z = data
 
     def as_numpy_array(self) -> np.array:
         return np.array([self.w, self.x, self.y, self.z])
 
+    def set(self, data: np.array) -> None:
+        '''
+        Sets the values of quaternion in place
+        '''
+
+        self.w, self.x, self.y, self.z = data
+
     def __str__(self) -> str:
         return str(self.as_numpy_array())
 
@@ -158,20 +431,7 @@ class QuaternionContainer:
         Turns the Quaternion readings into Euler Angles for projection
         '''
 
-        t0 = +2.0 * (self.w * self.x + self.y * self.z)
-        t1 = +1.0 - 2.0 * (self.x * self.x + self.y * self.y)
-        X = math.degrees(math.atan2(t0, t1))
-
-        t2 = +2.0 * (self.w * self.y - self.z * self.x)
-        t2 = +1.0 if t2 > +1.0 else t2
-        t2 = -1.0 if t2 < -1.0 else t2
-        Y = math.degrees(math.asin(t2))
-
-        t3 = +2.0 * (self.w * self.z + self.x * self.y)
-        t4 = +1.0 - 2.0 * (self.y * self.y + self.z * self.z)
-        Z = math.degrees(math.atan2(t3, t4))
-
-        return X, Y, Z
+        return euler_from_quaternion(self.w, self.x, self.y, self.z)
 
 
 class SensorGroup:
@@ -181,14 +441,20 @@ class SensorGroup:
     rotation and relative position
     '''
 
-    def __init__(self, name: str = 'sensor_group') -> None:
+    __slots__ = ('name', 'continuous', 'acc', 'gyro', 'orientation', 'optimal_position',
+                 'buffer', 'filter', 'clock', 'num_of_bad_posture_measurements')
+
+    def __init__(self, name: str = 'sensor_group', continuous: bool = False) -> None:
         self.name = name
+        self.continuous = continuous
         self.acc = Accelerometer()
-        self.gyro = Gyro()
+        self.gyro = Gyro(continuous)
         self.orientation = QuaternionContainer([1.0, 0.0, 0.0, 0.0])
         self.optimal_position = None
         self.buffer: Buffer = Buffer()
-        self.filter = Mahony(frequency=5)
+        self.filter = FusedMahony(frequency=5)
+        # periods of the samples, if their timestamps are given
+        self.clock = SampleClock(frequency=5)
         self.num_of_bad_posture_measurements: int = 0
 
     def normalised_angles(self) -> List[float]:
@@ -197,27 +463,41 @@ class SensorGroup:
         # print(angles, optimal)
         return [angles[0] - optimal[0], angles[1] - optimal[1]]
 
-    def count_orientation(self, only_count: bool = False) -> None:
+    def count_orientation(self, only_count: bool = False, timestamp: float = None) -> None:
+        '''
+        Updates the orientation with the current values of the sensors. If
+        timestamp of the sample is given, the sample period is taken from
+        the timestamps, otherwise the fixed one (5 Hz) is used
+        '''
 
-        self.orientation = QuaternionContainer(self.filter.updateIMU(self.orientation.as_numpy_array(),
-                                                                     self.gyro.current_value_np,
-                                                                     self.acc.current_value_np))
+        dt = self.clock.step(timestamp) if timestamp is not None else None
+        # filter keeps the quaternion in its state, so it is only copied
+        # into the container, that is not created again
+        self.orientation.set(self.filter.update(self.gyro.current_value,
+                                                self.acc.current_value, dt).tolist())
         if only_count:
             return
 
         if self.optimal_position is not None:
+            if self.continuous:
+                # user's optimal position is recounted each time
+                # the user holds still for the whole buffer
+                self.buffer.push(self.orientation.to_euler())
+                if self.buffer.is_steady(POSITION_STEADY_VARIANCE):
+                    self.optimal_position = self.buffer.optimal_position()
             return
         if not self.buffer.is_filled():
             self.buffer.push(self.orientation.to_euler())
             return
         if not self.optimal_position:
             self.optimal_position = self.buffer.optimal_position()
-            print(self.buffer.data)
-            print(f'Optimal position of {self.name} sensor grroup is estimated, it is: {self.optimal_position}\n')
-            self.buffer = None
+            logger.info('Optimal position of %s sensor group is estimated, it is: %s',
+                        self.name, self.optimal_position)
+            if not self.continuous:
+                self.buffer = None
             return
 
-    def check_current_posture(self, port: serial.Serial = None) -> None:
+    def check_current_posture(self, led: Any = None) -> None:
         # print(self.orientation.to_euler())
         try:
             x, y, z = self.orientation.to_euler()
@@ -234,14 +514,15 @@ class SensorGroup:
         if abs(x - self.optimal_position[0]) > 5:
             horisontal_posture = False
 
-        print(f'Sensor: {self.name} | Vertical: {posture_to_str[vertical_posture]}; \
-Horisontal: {posture_to_str[horisontal_posture]}; {datetime.now()}')
+        logger.debug('Sensor: %s | Vertical: %s; Horisontal: %s', self.name,
+                     posture_to_str[vertical_posture], posture_to_str[horisontal_posture])
 
-        # in case the posture is bad, writes 1 to the serial port so
-        # it would be handled and the led would be powered
-        if port and (not vertical_posture or not horisontal_posture):
-            port.write(bytearray(b'1'))
-            self.num_of_bad_posture_measurements += 1
+        # the led (strYa.events.LedWriter) is on while the posture is bad,
+        # it writes to the port only when its state changes
+        if led is not None:
+            bad_posture = not vertical_posture or not horisontal_posture
+            led.set(bad_posture)
+            self.num_of_bad_posture_measurements += bad_posture
 
     
     def has_optimal_position(self) -> bool:
@@ -260,36 +541,68 @@ Horisontal: {posture_to_str[horisontal_posture]}; {datetime.now()}')
 
 class PosturePosition:
 
-    def __init__(self) -> None:
+    def __init__(self, fixed_rate: bool = True) -> None:
         '''
         Should be used as container for certain variables that would be comfportable
         to use while analysing the user's posture
+
+        If fixed_rate, the measurements are integrated at 5 Hz, as the angles that
+        THRESHOLDS of the analyser are set for, otherwise the sample periods are
+        taken from the timestamps of the measurements
         '''
 
         self.upper_sensor_group = SensorGroup('upper one')
         self.lower_sensor_group = SensorGroup('lower one')
         self.sensor_groups = (self.upper_sensor_group, self.lower_sensor_group)
         self.num_of_groups: int = 2
+        self.fixed_rate: bool = fixed_rate
 
     
-    def set_sensor_data(self, data: List[List[List[float]]], writer=None) -> None:
+    def set_sensor_data(self, data: List[List[List[float]]], writer=None,
+                        timestamp: float = None) -> None:
         '''
         Receives a list of data with measurements: [[[acc], [gyro]], [[acc], [gyro]]]
-        Sets it into allocated memory for it (created instance of class so to make
-        it go to its calibratio buffer etc.)
+        and sets it as a frame (see set_frame)
         '''
 
-        outstr_info: List[Any] = [datetime.now()]+[time()]
-        for line, sensor_group in zip(data, self.sensor_groups):
-            acc, gyro = line
-            outstr_info = outstr_info + acc + gyro
-            sensor_group.gyro.set_values(gyro)
-            sensor_group.acc.set_values(acc)
+        (acc_1, gyro_1), (acc_2, gyro_2) = data
+        self.set_frame(np.array(acc_1 + gyro_1 + acc_2 + gyro_2, dtype=np.float64),
+                       writer, timestamp)
+
+    def set_frame(self, frame: np.ndarray, writer=None, timestamp: float = None) -> None:
+        '''
+        Receives a frame - flat array of 12 measurements: acc_1, gyro_1, acc_2, gyro_2,
+        as it is given by the parsers. Sets it into allocated memory for it (created
+        instance of class so to make it go to its calibratio buffer etc.). Sensors
+        get their own lists of values, so the ones that callers keep are not changed
+        by the next frame. Timestamp is the time when the data was received,
+        if it is not given, current time is used
+        '''
+
+        if timestamp is None:
+            timestamp = time()
 
         if writer:
-            writer.writerow(outstr_info)
+            self.write_frame(frame, writer, timestamp)
+
+        values = frame.tolist()
+        for column, sensor_group in zip((0, 6), self.sensor_groups):
+            sensor_group.gyro.set_values(values[column + 3:column + 6])
+            sensor_group.acc.set_values(values[column:column + 3])
 
 
+    @staticmethod
+    def write_frame(frame: np.ndarray, writer, timestamp: float) -> None:
+        '''
+        Writes the frame either with csv writer or into the binary recording
+        '''
+
+        if hasattr(writer, 'write_frame'):
+            # binary recording takes the frame as it is
+            writer.write_frame(timestamp, frame)
+        else:
+            writer.writerow([datetime.fromtimestamp(timestamp), timestamp, *frame.tolist()])
+
     def preprocess_data_from_file(self, line: str, sep: str =',') -> List[List[List[float]]]:
         '''
         Preprocesses data from csv file, in ordet ro return it 
@@ -306,37 +619,29 @@ class PosturePosition:
 
     def preprocess_data(self, line: bytes) -> List[List[List[float]]]:
         '''
-        Converts line of data from str or byte string into somekind of lists
+        Converts line of data from byte string into somekind of lists
         Line looks like acc_x, acc_y, acc_z; gyro_x, gyro_y, gyro_z|\
         acc_x, acc_y, acc_z; gyro_x, gyro_y, gyro_z
         '''
 
-        SENSOR_GROUP_SEPARATOR = '|'
-        SENSOR_SEPARATOR = '; '
-        COORDINATE_SEPARATOR = ', '
-
-        try:
-            data = line.decode('utf-8').rstrip('\r\n').split(SENSOR_GROUP_SEPARATOR)
-        except AttributeError:
+        if not isinstance(line, bytes):
             raise ValueError('The data cannot be readen')
 
-        if len(data) != self.num_of_groups: # if there is not enought data  for 4 sensors
-            raise ValueError('Number of data that is read does not match with the number\
-of given sensor groups to read into')
+        values, _ = parse_lines(line)
+        if len(values) != 1:
+            raise ValueError('The line does not match the format of measurements\
+of given sensor groups')
 
-        outdata = []
-        for line, sensor_group in zip(data, self.sensor_groups):
-            try:
-                acc, gyro = line.split(SENSOR_SEPARATOR)
-            except ValueError:
-                return
+        return self.split_frame(values[0].tolist())
 
-            # time is saved at the time of creation of an object
-            acc = [round(float(i), 2) for i in acc.split(COORDINATE_SEPARATOR)]
-            gyro = [round(float(i), 2) for i in gyro.split(COORDINATE_SEPARATOR)]
-            outdata.append([acc, gyro])
+    @staticmethod
+    def split_frame(values: List[float]) -> List[List[List[float]]]:
+        '''
+        Splits 12 measurements of the frame into such outlook:
+        [[[acc], [gyro]], [[acc], [gyro]]]
+        '''
 
-        return outdata
+        return [[values[0:3], values[3:6]], [values[6:9], values[9:12]]]
 
     @property
     def bad_posture_iters(self) -> int:
@@ -344,9 +649,11 @@ of given sensor groups to read into')
                     self.lower_sensor_group.num_of_bad_posture_measurements)
             
 
-    def establish_connection(self, baudrate: int = 115200) -> serial.Serial:
+    def establish_connection(self, baudrate: int = 115200,
+                             timeout: float = 0.1) -> serial.Serial:
         '''
-        Establishes a connection on available port on a given baudrate
+        Establishes a connection on available port on a given baudrate.
+        Reading from the port blocks for not longer than timeout seconds
         '''
 
         possible_ports = ['COM3',\
@@ -356,7 +663,7 @@ of given sensor groups to read into')
 
         for port in possible_ports:
             try:
-                return serial.Serial(port, baudrate)
+                return serial.Serial(port, baudrate, timeout=timeout)
             except serial.serialutil.SerialException as exc:
                 continue
         raise ValueError('There is no available port to connect to')
@@ -366,52 +673,72 @@ of given sensor groups to read into')
         self.optimal_position = optimal_position
 
 
-    def process_data_from_file(self, from_file):
-        to_file = 'angles_' + from_file
-        file_to_write = open(to_file, 'w')
-        writer = csv.writer(file_to_write)
-        writer.writerow(['human_time', 'computer_time', 'x1', 'y1', 'z1', 'x2', 'y2', 'z2'])
+    def process_data_from_file(self, from_file: str, to_file: str = None,
+                               incremental: bool = False, fixed_rate: bool = None) -> int:
+        '''
+        Counts the angles for each measurement in the raw data file and writes
+        them into to_file, with the optimal position in the last row. By default
+        it is angles_ file next to the raw one. Returns number of measurements
+
+        If fixed_rate (by default it is the one of the posture position), the rows
+        are integrated at 5 Hz, as the reference datasets were, otherwise the
+        sample periods are taken from computer_time of the rows
+
+        If incremental, the state of the pipeline is kept in the checkpoint next
+        to to_file, and only the rows, that were added to the raw file since
+        the last call, are processed (see strYa.incremental). Until there are
+        enough rows to calibrate the sensors, nothing is written and 0 is returned
+        '''
+
+        if to_file is None:
+            from_file = pathlib.Path(from_file)
+            to_file = from_file.with_name('angles_' + from_file.name)
+        if fixed_rate is None:
+            fixed_rate = self.fixed_rate
+
+        if incremental:
+            checkpoint = update_angles(from_file, to_file, fixed_rate=fixed_rate)
+            if checkpoint is None:
+                return 0
+            self.restore(checkpoint['bias'], checkpoint['quaternions'], checkpoint['optimal'],
+                         checkpoint['clock'])
+            return checkpoint['rows']
+
         df = pd.read_csv(from_file)
-        human_time = df['human_time'].tolist()
-        computer_time = df['computer_time'].tolist()
-        x_acc_1 = df['x_acc_1'].tolist()
-        y_acc_1 = df['y_acc_1'].tolist()
-        z_acc_1 = df['z_acc_1'].tolist()
-        x_gyro_1 = df['x_gyro_1'].tolist()
-        y_gyro_1 = df['y_gyro_1'].tolist()
-        z_gyro_1 = df['z_gyro_1'].tolist()
-        x_acc_2 = df['x_acc_2'].tolist()
-        y_acc_2 = df['y_acc_2'].tolist()
-        z_acc_2 = df['z_acc_2'].tolist()
-        x_gyro_2 = df['x_gyro_2'].tolist()
-        y_gyro_2 = df['y_gyro_2'].tolist()
-        z_gyro_2 = df['z_gyro_2'].tolist()
-        for i in range(len(x_acc_1)):
-            acc1 = [x_acc_1[i], y_acc_1[i], z_acc_1[i]]
-            acc2 = [x_acc_2[i], y_acc_2[i], z_acc_2[i]]
-            gyro1 = [x_gyro_1[i], y_gyro_1[i], z_gyro_1[i]]
-            gyro2 = [x_gyro_2[i], y_gyro_2[i], z_gyro_2[i]]
-            data = [[acc1, gyro1], [acc2, gyro2]]
-            for index, sensor_group in enumerate(self.sensor_groups):
-                sensor_group.acc.set_values(data[index][0])
-                sensor_group.gyro.set_values(data[index][1])
-            if not self.lower_sensor_group.gyro.settings:
-                print('. . .')
-                continue
-            orientations = []
-            for sensor_group in self.sensor_groups:
-                sensor_group.count_orientation()
-                if sensor_group.optimal_position is None:
-                    continue
-                orientations.extend(sensor_group.orientation.to_euler())
-            if orientations:
-                orientations = [human_time[i], computer_time[i]] + orientations
-                writer.writerow(orientations)
-        optimal_orientations = []
-        for sensor_group in self.sensor_groups:
-            optimal_orientations.extend([str(i) for i in sensor_group.optimal_position])
-        writer.writerow(['0', '0'] + optimal_orientations)
-        file_to_write.close()
+        state = {}
+        timestamps = None if fixed_rate else df['computer_time'].to_numpy(dtype=np.float64)
+        angles, optimal, start = orientations_from_raw(df[RAW_COLUMNS].to_numpy(dtype=np.float64),
+                                                       state=state, timestamps=timestamps)
+        self.restore(state['bias'], state['quaternions'], optimal,
+                     state['clock'] and state['clock'].state())
+
+        with open(to_file, 'w') as file_to_write:
+            writer = csv.writer(file_to_write)
+            writer.writerow(['human_time', 'computer_time'] + ANGLE_COLUMNS)
+            writer.writerows(zip(df['human_time'].iloc[start:].tolist(),
+                                 df['computer_time'].iloc[start:].tolist(),
+                                 *angles.T.tolist()))
+            writer.writerow(['0', '0'] + [str(i) for i in optimal.tolist()])
+
+        return len(df)
+
+    def restore(self, bias: np.ndarray, quats: np.ndarray, optimal: np.ndarray,
+                clock: Dict[str, Any] = None) -> None:
+        '''
+        Sets state of the sensor groups after batch processing: (2, 3) gyro biases,
+        (2, 4) quaternions and (6, ) optimal position of both groups, and the
+        state of their sample clock, if the periods were taken from timestamps
+        '''
+
+        optimal = np.asarray(optimal, dtype=np.float64)
+        for idx, sensor_group in enumerate(self.sensor_groups):
+            quaternion = np.asarray(quats[idx], dtype=np.float64).tolist()
+            sensor_group.gyro.settings = tuple(np.asarray(bias[idx], dtype=np.float64).tolist())
+            sensor_group.filter.reset(quaternion)
+            sensor_group.orientation.set(quaternion)
+            sensor_group.optimal_position = optimal[3 * idx:3 * idx + 3].tolist()
+            if clock is not None:
+                sensor_group.clock = SampleClock.from_state(clock)
 
 # posture = PosturePosition()
 # posture.process_data_from_file('main_two.csv')
\ No newline at end of file
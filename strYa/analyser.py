@@ -1,15 +1,50 @@
 '''
 Posture-data-receiving-implementaiton-free implementation of its analysis.
 Analyser class is an convenient analysis function storage.
-Its main function - check mode - prints out the logs on the
-current posture position.
+Its main function - check mode - logs the current posture position
+and periodic summaries of the postures.
 '''
 
-import pandas as pd
 import numpy as np
-import serial
-from collections import defaultdict
-from typing import List
+import logging
+from time import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Tuple
+
+try:
+    from strYa.events import Debouncer, LedWriter, PostureEvent
+    from strYa.logs import PostureSummary
+    from strYa.rolling import RollingStats
+except ImportError:
+    # the scripts in strYa/ (visualization.py) import it as a top-level module
+    from events import Debouncer, LedWriter, PostureEvent
+    from logs import PostureSummary
+    from rolling import RollingStats
+
+# names of the postures in order in which they are checked;
+# label of a sample, for which none of them holds, is UNCLEAR
+POSTURES: Tuple[str] = ('steady', 'forward_rotation', 'forward_tilt', 'side_tilt')
+UNCLEAR: int = len(POSTURES)
+# labels of the postures, while which the led of the device is on
+BAD_POSTURES: Tuple[int] = (2, 3)
+# limits of the angles (degrees) of the postures, see strYa.tuning for their sweep.
+# They hold for the angles integrated at the fixed rate (datasets/angles); on the
+# ones with the periods from the timestamps (datasets/angles_timestamps) most of
+# the forward postures are not clear, and no set of the default grid fixes it
+THRESHOLDS: Dict[str, float] = {
+    # all the angles are within the limit
+    'steady': 5,
+    # both groups are bent forward
+    'rotation_low': 30, 'rotation_high': 70,
+    # upper group is bent forward, lower one is not
+    'tilt_low': 10, 'tilt_high': 25, 'tilt_lower': 7,
+    # forward tilt while sitting: both groups are bent
+    'sitting_low': 10, 'sitting_high': 15, 'sitting_lower_low': 25, 'sitting_lower_high': 30,
+    # either group is bent to the side
+    'side_low': 10, 'side_high': 30,
+}
+
+logger = logging.getLogger(__name__)
 
 
 class Analyzer:
@@ -27,44 +62,32 @@ class Analyzer:
         '''
 
         self.info_on_user: defaultdict = defaultdict(int)
+        # logs share of each posture once in a while instead of a line per sample
+        self.summary: PostureSummary = PostureSummary(POSTURES + ('not_clear', ))
+        # counts over the recent windows, e.g. self.stats.window(300) for the last 5 minutes
+        self.stats: RollingStats = RollingStats(POSTURES + ('not_clear', ))
+        # changes of the posture, that held for a while, and the last of them
+        self.debouncer: Debouncer = Debouncer()
+        self.events: Deque[PostureEvent] = deque(maxlen=64)
 
-    def __read_data(self, path: str) -> List[List[float]]:
+    def __read_data(self, path: str, start: float = None, end: float = None) -> Tuple[np.ndarray]:
         '''
-        Prepapares some lists of data from dataset. Is useful if
+        Prepapares some arrays of data from dataset. Is useful if
         onw wants to faslty get the stats on whole dataset (in a 
-        wrapper function)
-        '''
-
-        # data frame from rounded data file
-        df = pd.read_csv(path)
-        rounded = np.round(df)
-
-        # find optimal and delete it from data frame
-        optimal = df.tail(1)
-        print(optimal)
-        x1_optimal = optimal['x1'].tolist()[0]
-        y1_optimal = optimal['y1'].tolist()[0]
-        # # print(x_optimal, y_optimal)
-        # print(optimal)
-        x2_optimal = optimal['x2'].tolist()[0]
-        y2_optimal = optimal['y2'].tolist()[0]
-        df = df.head(-1)
-
-        # find all par for graphs
-        time = df['computer_time'].tolist()
-        start_time = time[0]
-        time = [i-start_time for i in time]
-        x1 = df['x1'].tolist()
-        x1 = [i+x1_optimal for i in x1]
-        y1 = df['y1'].tolist()
-        y1 = [i-y1_optimal for i in y1]
-        # z1 = df['z1'].tolist()
-
-        x2 = df['x2'].tolist()
-        x2 = [i+x2_optimal for i in x2]
-        y2 = df['y2'].tolist()
-        y2 = [i-y2_optimal for i in y2]
-        # z2 = df['z2'].tolist()
+        wrapper function). If start or end is given, only the rows
+        of that time range are read (see strYa.recording.read_range)
+        '''
+
+        # the scripts in strYa/ do not need it, and cannot import it
+        from strYa.recording import read_angles
+
+        # angles without the optimal position, which is the last row of the file
+        _, angles, optimal = read_angles(path, start, end)
+
+        x1 = angles[:, 0] + optimal[0]
+        y1 = angles[:, 1] - optimal[1]
+        x2 = angles[:, 3] + optimal[3]
+        y2 = angles[:, 4] - optimal[4]
         return x1, y1, x2, y2
 
     @staticmethod
@@ -74,9 +97,10 @@ class Analyzer:
         ok in the current moment of time
         '''
 
+        limit = THRESHOLDS['steady']
         for orientation in [orient_1, orient_2]:
             for axis in orientation:
-                if abs(axis) > 5:
+                if abs(axis) > limit:
                     return False
         return True
 
@@ -88,7 +112,8 @@ class Analyzer:
         '''
 
         y1, y2 = orient_1[1], orient_2[1]
-        if 30 < abs(y1) < 70 and 30 < abs(y2) < 70:
+        low, high = THRESHOLDS['rotation_low'], THRESHOLDS['rotation_high']
+        if low < abs(y1) < high and low < abs(y2) < high:
             if abs(y1-y1) < 20:
                 return True
         return False
@@ -101,10 +126,12 @@ class Analyzer:
 
         y1 = orient_1[1]
         y2 = orient_2[1]
-        if 10 < abs(y1) < 25 and abs(y2) < 7:
+        limits = THRESHOLDS
+        if limits['tilt_low'] < abs(y1) < limits['tilt_high'] and abs(y2) < limits['tilt_lower']:
             return True
         # check sitting
-        if 10 < abs(y1) < 15 and 25 < abs(y2) < 30:
+        if limits['sitting_low'] < abs(y1) < limits['sitting_high'] and \
+                limits['sitting_lower_low'] < abs(y2) < limits['sitting_lower_high']:
             return True
         return False
 
@@ -116,47 +143,115 @@ class Analyzer:
 
         x1 = orient_1[0]
         x2 = orient_2[0]
-        if 10 < abs(x1) < 30 or 10 < abs(x2) < 30:
+        low, high = THRESHOLDS['side_low'], THRESHOLDS['side_high']
+        if low < abs(x1) < high or low < abs(x2) < high:
             return True
         return False
 
-    def check_mode(self, *args, port: serial.Serial = None) -> None:
+    def check_mode(self, *args, led: LedWriter = None, timestamp: float = None) -> int:
         '''
         Main funciton of class. Checks current posture represented in angles for
-        each type of analyser-function and print out the trend on the screen.
+        each type of analyser-function and logs the trend (at debug level).
+        Returns label of the posture - index in POSTURES, or UNCLEAR.
+        Timestamp of the sample (now by default) is used for rolling stats
+        and debouncing: the led is turned on when the bad posture held
+        for a while and off when the good one did
         '''
 
         upper_sensor_group, lower_sensor_group = args
+        if timestamp is None:
+            timestamp = time()
         self.info_on_user['num_of_iterations'] += 1
         funcs = [self.steady, self.forward_rotation,
                  self.forward_tilt, self.side_tilt]
 
+        label = UNCLEAR
         for idx, func in enumerate(funcs):
-            if not func(upper_sensor_group, lower_sensor_group):
-                continue
-
-            if port and idx >= 2:
-                port.write(bytearray(b'1'))
+            if func(upper_sensor_group, lower_sensor_group):
+                label = idx
+                self.info_on_user[func.__name__] += 1
+                logger.debug('%d iteration: %s', self.info_on_user['num_of_iterations'], func.__name__)
+                break
+        else:
+            logger.debug('%d iteration: the trend is not clear', self.info_on_user['num_of_iterations'])
 
-            self.info_on_user[func.__name__] += 1
+        self.summary.add(label)
+        self.stats.add(timestamp, label)
+        event = self.debouncer.update(timestamp, label in BAD_POSTURES, label)
+        if event is not None:
+            self.events.append(event)
+            logger.info('Posture is %s', 'bad' if event.bad else 'ok')
+            if led is not None:
+                led.set(event.bad)
+        return label
 
-            print(
-                f"{self.info_on_user['num_of_iterations']} iteration: {func.__name__}")
-            return
+    @staticmethod
+    def classify(upper: np.ndarray, lower: np.ndarray,
+                 thresholds: Dict[str, Any] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+        '''
+        Classifies whole recording at once. Takes (N, 2) arrays of angles (x, y)
+        of upper and lower sensor groups, returns array of N labels - indices in
+        POSTURES, or UNCLEAR if the trend is not clear - and number of samples
+        of each class. Classes are checked in the same order as in check_mode.
+        Thresholds are THRESHOLDS by default (see posture_labels)
+        '''
 
-        print(
-            f"{self.info_on_user['num_of_iterations']} iteration: the trend is not clear")
+        labels = posture_labels(upper, lower, THRESHOLDS if thresholds is None else thresholds)
+        counts = np.bincount(labels.ravel(), minlength=len(POSTURES) + 1)
+        return labels, dict(zip(POSTURES + ('not_clear',), counts.tolist()))
 
-    def check_data(self, path):
+    def check_data(self, path: str, start: float = None, end: float = None) -> Dict[str, int]:
         '''
-        Function to check data from file
+        Function to check data from file. Classifies it as a whole (or only
+        the rows with start <= computer_time < end) and adds the result to
+        the info on user
         '''
 
-        x1, y1, x2, y2 = self.__read_data(path)
-        for i in range(len(x1)):
-            self.check_mode((x1[i], y1[i]), (x2[i], y2[i]))
+        x1, y1, x2, y2 = self.__read_data(path, start, end)
+        _, counts = self.classify(np.column_stack((x1, y1)), np.column_stack((x2, y2)))
+
+        self.info_on_user['num_of_iterations'] += len(x1)
+        for posture in POSTURES:
+            if counts[posture]:
+                self.info_on_user[posture] += counts[posture]
+
+        return counts
+
+
+def posture_labels(upper: np.ndarray, lower: np.ndarray,
+                   thresholds: Dict[str, Any] = THRESHOLDS) -> np.ndarray:
+    '''
+    Labels of the samples, that are given as (N, 2) arrays of angles (x, y) of
+    upper and lower sensor groups. Each threshold is either a number or (P, 1)
+    array of P values; in the latter case the labels are (P, N) array, a row
+    for each set of thresholds, which are evaluated at once by broadcasting
+    '''
+
+    upper = np.asarray(upper, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+    x1, y1 = np.abs(upper[:, 0]), np.abs(upper[:, 1])
+    x2, y2 = np.abs(lower[:, 0]), np.abs(lower[:, 1])
+    limits = {name: np.asarray(thresholds[name], dtype=np.float64) for name in THRESHOLDS}
+
+    steady = np.maximum(np.maximum(x1, y1), np.maximum(x2, y2)) <= limits['steady']
+    forward_rotation = (limits['rotation_low'] < np.minimum(y1, y2)) & \
+                       (np.maximum(y1, y2) < limits['rotation_high'])
+    forward_tilt = ((limits['tilt_low'] < y1) & (y1 < limits['tilt_high']) &
+                    (y2 < limits['tilt_lower'])) | \
+                   ((limits['sitting_low'] < y1) & (y1 < limits['sitting_high']) &
+                    (limits['sitting_lower_low'] < y2) & (y2 < limits['sitting_lower_high']))
+    side_tilt = ((limits['side_low'] < x1) & (x1 < limits['side_high'])) | \
+                ((limits['side_low'] < x2) & (x2 < limits['side_high']))
+
+    # the first condition, that holds, gives the label
+    labels = np.full(np.broadcast(steady, forward_rotation, forward_tilt, side_tilt).shape,
+                     UNCLEAR, dtype=np.int8)
+    for label, condition in reversed(list(enumerate((steady, forward_rotation,
+                                                      forward_tilt, side_tilt)))):
+        labels[np.broadcast_to(condition, labels.shape)] = label
+    return labels
 
 
 if __name__ == '__main__':
     analyze = Analyzer()
-    analyze.check_data('datasets/angles/angles_side_tilt.csv')
+    print(analyze.check_data('datasets/angles/angles_side_tilt.csv'))
@@ -0,0 +1,110 @@
+'''
+Batch processing of the whole recordings. Does the same as the
+PosturePosition does sample by sample (gyro calibration, orientation
+estimation and optimal position estimation), but on the arrays of
+measurements, without creating any containers for a separate row.
+'''
+
+import numpy as np
+from typing import Dict, List, Tuple, Union
+
+from strYa.fusion import mahony_step, sample_periods, SampleClock
+from strYa.rotations import quaternion_to_euler
+
+RAW_COLUMNS: List[str] = ['x_acc_1', 'y_acc_1', 'z_acc_1',
+                          'x_gyro_1', 'y_gyro_1', 'z_gyro_1',
+                          'x_acc_2', 'y_acc_2', 'z_acc_2',
+                          'x_gyro_2', 'y_gyro_2', 'z_gyro_2']
+ANGLE_COLUMNS: List[str] = ['x1', 'y1', 'z1', 'x2', 'y2', 'z2']
+
+
+def integrate_orientation(gyr: np.ndarray, acc: np.ndarray, dt: Union[float, np.ndarray],
+                          q0: Tuple[float] = (1.0, 0.0, 0.0, 0.0)) -> np.ndarray:
+    '''
+    Runs the Mahony filter over (N, 3) arrays of gyro and accelerometer
+    measurements. Sample period is either the same for all the samples or
+    given for each of them. Returns (N, 4) array of quaternions, one for each sample
+    '''
+
+    quats = np.empty((len(gyr), 4))
+    q = tuple(q0)
+    dts = np.broadcast_to(np.asarray(dt, dtype=np.float64), len(gyr)).tolist()
+    for idx, (g, a, dt) in enumerate(zip(gyr.tolist(), acc.tolist(), dts)):
+        q, _ = mahony_step(q, g, a, dt)
+        quats[idx] = q
+
+    return quats
+
+
+def _check_raw(raw: np.ndarray) -> np.ndarray:
+    raw = np.asarray(raw, dtype=np.float64)
+    if raw.ndim != 2 or raw.shape[1] != len(RAW_COLUMNS):
+        raise ValueError(f'Expected (N, {len(RAW_COLUMNS)}) array of measurements')
+    return raw
+
+
+def resume_orientations(raw: np.ndarray, bias: np.ndarray, quats: np.ndarray,
+                        frequency: float = 5.0,
+                        periods: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Continues processing of a recording from the saved state of the filters:
+    bias is (2, 3) array of gyro biases of the sensor groups and quats is (2, 4)
+    array of their last quaternions. Sample periods of the rows can be given,
+    otherwise 1 / frequency is used. Returns (N, 6) array of Euler angles of the
+    rows of raw and (2, 4) array of the quaternions after the last of them
+    '''
+
+    raw = _check_raw(raw)
+    angles = np.empty((len(raw), len(ANGLE_COLUMNS)))
+    last = np.array(quats, dtype=np.float64)
+    if not len(raw):
+        return angles, last
+
+    for group, column in enumerate((0, 6)):
+        acc = raw[:, column:column + 3]
+        gyro = raw[:, column + 3:column + 6]
+        group_quats = integrate_orientation(gyro - bias[group], acc,
+                                            1 / frequency if periods is None else periods,
+                                            last[group].tolist())
+        quaternion_to_euler(group_quats, out=angles[:, 3 * group:3 * group + 3])
+        last[group] = group_quats[-1]
+
+    return angles, last
+
+
+def orientations_from_raw(raw: np.ndarray, buffer_size: int = 25, frequency: float = 5.0,
+                          state: Dict[str, np.ndarray] = None,
+                          timestamps: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    '''
+    Processes (N, 12) array of raw measurements, in which each row looks like
+    acc_1, gyro_1, acc_2, gyro_2. The first buffer_size rows are used to count
+    gyro bias, next buffer_size are used to estimate the optimal position.
+
+    Returns (N - start, 6) array of Euler angles (x1, y1, z1, x2, y2, z2)
+    for the rows beginning from start, (6, ) array of optimal position and start.
+    If state dict is given, gyro biases, the last quaternions and the clock
+    are put into it (as bias, quaternions and clock), so the processing
+    can be resumed later.
+
+    If timestamps of the rows are given, sample periods are taken from them
+    (see strYa.fusion.SampleClock), as the live pipeline does, otherwise
+    the samples are integrated at the fixed frequency (and the clock is None)
+    '''
+
+    raw = _check_raw(raw)
+    start = 2 * buffer_size
+    if len(raw) <= start:
+        raise ValueError('There is not enough measurements to calibrate the sensors')
+
+    bias = np.stack([raw[:buffer_size, 3:6].mean(axis=0), raw[:buffer_size, 9:12].mean(axis=0)])
+    clock = periods = None
+    if timestamps is not None:
+        clock = SampleClock(frequency)
+        periods = sample_periods(timestamps[buffer_size:], clock=clock)
+    angles, quats = resume_orientations(raw[buffer_size:], bias,
+                                        np.tile([1.0, 0.0, 0.0, 0.0], (2, 1)), frequency, periods)
+    if state is not None:
+        state.update(bias=bias, quaternions=quats, clock=clock)
+
+    optimal = angles[:buffer_size].mean(axis=0)
+    return angles[buffer_size:], optimal, start
@@ -0,0 +1,113 @@
+'''
+Batch conversion of raw recordings into angles datasets. Files are
+converted in parallel on a process pool, each one by a fresh
+PosturePosition. With --incremental, only the rows that were added to
+the recordings since the last conversion are processed. Rows are integrated
+at 5 Hz, as the reference datasets were, with --timestamps the sample periods
+are taken from the timestamps of the rows.
+
+python -m strYa.convert datasets/raw_data [--out-dir DIR] [--workers N] [--incremental] [--timestamps]
+'''
+
+import os
+import glob
+import pathlib
+import argparse
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Tuple
+
+from strYa.adts import PosturePosition
+
+ANGLES_PREFIX: str = 'angles_'
+
+
+def find_recordings(inputs: Iterable[str], pattern: str = '*.csv') -> List[pathlib.Path]:
+    '''
+    Expands directories (files in them that match the pattern) and glob patterns
+    into the list of raw recordings. Angles datasets are skipped
+    '''
+
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = pathlib.Path(item).glob(pattern)
+        else:
+            found = map(pathlib.Path, glob.glob(item))
+        paths.extend(path for path in sorted(found)
+                     if path.is_file() and not path.name.startswith(ANGLES_PREFIX))
+
+    return list(dict.fromkeys(paths))
+
+
+def angles_path(from_file: pathlib.Path, out_dir: str = None) -> pathlib.Path:
+    '''
+    Path of the angles dataset: next to the raw one or in out_dir
+    '''
+
+    directory = pathlib.Path(out_dir) if out_dir else from_file.parent
+    return directory.joinpath(ANGLES_PREFIX + from_file.name)
+
+
+def convert_file(from_file: pathlib.Path, to_file: pathlib.Path, incremental: bool = False,
+                 fixed_rate: bool = True) -> Tuple[pathlib.Path, int, float]:
+    '''
+    Converts one raw recording, returns its path, number
+    of measurements and time that it took
+    '''
+
+    start = perf_counter()
+    num_of_samples = PosturePosition().process_data_from_file(from_file, to_file, incremental,
+                                                              fixed_rate)
+    return from_file, num_of_samples, perf_counter() - start
+
+
+def convert(paths: List[pathlib.Path], out_dir: str = None, workers: int = None,
+            incremental: bool = False,
+            fixed_rate: bool = True) -> Iterator[Tuple[pathlib.Path, int, float]]:
+    '''
+    Converts the recordings on the pool of workers (all cores by default),
+    yields the result of each conversion as soon as it is done. If the
+    conversion fails, the exception is given instead of the number of
+    measurements
+    '''
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(convert_file, path, angles_path(path, out_dir),
+                                   incremental, fixed_rate): path
+                   for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as exc:
+                yield futures[future], exc, 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('inputs', nargs='+', help='directories, files or glob patterns of raw recordings')
+    parser.add_argument('--out-dir', help='directory for angles datasets, next to raw ones by default')
+    parser.add_argument('--workers', type=int, help='number of processes, all cores by default')
+    parser.add_argument('--pattern', default='*.csv', help='pattern of recordings in directories')
+    parser.add_argument('--incremental', action='store_true',
+                        help='process only the rows added since the last conversion')
+    parser.add_argument('--timestamps', action='store_false', dest='fixed_rate',
+                        help='take sample periods from the timestamps of the rows instead of 5 Hz')
+    args = parser.parse_args()
+
+    paths = find_recordings(args.inputs, args.pattern)
+    start = perf_counter()
+    total = 0
+    for path, num_of_samples, seconds in convert(paths, args.out_dir, args.workers,
+                                                 args.incremental, args.fixed_rate):
+        if isinstance(num_of_samples, Exception):
+            print(f'{path}: failed, {num_of_samples}')
+            continue
+        total += num_of_samples
+        print(f'{path}: {num_of_samples} samples, {num_of_samples / seconds:.0f} samples/s')
+
+    elapsed = perf_counter() - start
+    print(f'{len(paths)} files, {total} samples in {elapsed:.2f} s, {total / elapsed:.0f} samples/s')
@@ -0,0 +1,90 @@
+'''
+Downsampling of long time series for plotting. Both methods keep the
+first and the last points and return indices of the kept points, so
+the same selection could be applied to other columns.
+'''
+
+import numpy as np
+from typing import Tuple
+
+LTTB: str = 'lttb'
+MINMAX: str = 'minmax'
+
+
+def lttb(x: np.ndarray, y: np.ndarray, num_of_points: int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets. Splits the points into buckets and takes
+    from each one the point that forms the largest triangle with the point
+    taken from the previous bucket and the average of the next bucket
+    '''
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(x)
+    if num_of_points >= size or num_of_points < 3:
+        return np.arange(size)
+
+    # the first and the last points are buckets on their own
+    edges = np.linspace(1, size - 1, num_of_points - 1).astype(np.int64)
+    edges = np.append(edges, size)
+    # averages of all the buckets are counted at once
+    sums_x = np.add.reduceat(x, edges[:-1])
+    sums_y = np.add.reduceat(y, edges[:-1])
+    counts = np.diff(edges)
+    avg_x, avg_y = sums_x / counts, sums_y / counts
+
+    selected = np.empty(num_of_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    prev = 0
+    for bucket in range(num_of_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+        # doubled area of the triangle for each point of the bucket
+        area = np.abs((x[prev] - next_x) * (y[start:end] - y[prev]) -
+                      (x[prev] - x[start:end]) * (next_y - y[prev]))
+        prev = start + int(area.argmax())
+        selected[bucket + 1] = prev
+
+    return selected
+
+
+def minmax(y: np.ndarray, num_of_buckets: int) -> np.ndarray:
+    '''
+    Splits the points into buckets of the same size (e.g. one for each
+    pixel) and takes the minimum and the maximum of each one
+    '''
+
+    y = np.asarray(y, dtype=np.float64)
+    size = len(y)
+    bucket_size = size // num_of_buckets if num_of_buckets else 0
+    if bucket_size < 2:
+        return np.arange(size)
+
+    # buckets except the last one are of the same size, so they are
+    # handled at once; the last one also takes the remaining points
+    full = bucket_size * (num_of_buckets - 1)
+    buckets = y[:full].reshape(num_of_buckets - 1, bucket_size)
+    offsets = np.arange(num_of_buckets - 1) * bucket_size
+    last = y[full:]
+    selected = np.concatenate(([0], offsets + buckets.argmin(axis=1),
+                               offsets + buckets.argmax(axis=1),
+                               [full + last.argmin(), full + last.argmax(), size - 1]))
+    return np.unique(selected)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, num_of_points: int,
+               method: str = LTTB) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns x and y reduced to about num_of_points points by the given method
+    '''
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == LTTB:
+        selected = lttb(x, y, num_of_points)
+    elif method == MINMAX:
+        selected = minmax(y, num_of_points // 2)
+    else:
+        raise ValueError(f'Unknown downsampling method: {method}')
+
+    return x[selected], y[selected]
@@ -0,0 +1,148 @@
+'''
+Posture events and the led of the device. Classification of a single
+sample is noisy, so the posture is considered changed (and the event is
+emitted) only when the new one held for some time. The led is latched by
+the device: it is turned on by b'1' and stays on until b'0', so the
+commands are sent only when the state of the led changes, from a
+separate thread, so the reading of the port never waits for them.
+'''
+
+import logging
+import threading
+from typing import Any, NamedTuple, Optional
+
+LED_ON: bytes = b'1'
+LED_OFF: bytes = b'0'
+
+logger = logging.getLogger(__name__)
+
+
+class PostureEvent(NamedTuple):
+    '''
+    Change of the posture: time of the sample that confirmed it,
+    whether the posture became bad and label of that sample
+    '''
+
+    timestamp: float
+    bad: bool
+    label: int
+
+
+class Debouncer:
+    '''
+    Hysteresis over the samples: the posture becomes bad after the bad
+    samples held for hold seconds, and becomes ok after the good ones held
+    for release seconds. Shorter runs of samples change nothing
+    '''
+
+    __slots__ = ('hold', 'release', 'bad', '_since')
+
+    def __init__(self, hold: float = 2.0, release: float = 1.0) -> None:
+        self.hold: float = hold
+        self.release: float = release
+        self.bad: bool = False
+        # time of the first sample, that differs from the current posture
+        self._since: Optional[float] = None
+
+    def update(self, timestamp: float, bad: bool, label: int = None) -> Optional[PostureEvent]:
+        '''
+        Takes the next sample, returns the event if the posture has changed
+        '''
+
+        if bad == self.bad:
+            self._since = None
+            return None
+        if self._since is None:
+            self._since = timestamp
+        if timestamp - self._since < (self.hold if bad else self.release):
+            return None
+
+        self.bad = bad
+        self._since = None
+        return PostureEvent(timestamp, bad, label)
+
+
+class LedWriter:
+    '''
+    Keeps the state of the led and sends it to the port when it changes.
+    If threaded, writes are made by a separate thread and set never waits
+    for them; if the state changes several times before the thread gets
+    to it, only the last one is sent. Otherwise (for ports, that never
+    block, like asyncio streams) it is written at once. Port can be
+    attached later or replaced, the current state is then sent to it
+    '''
+
+    def __init__(self, port: Any = None, threaded: bool = True) -> None:
+        self.port: Any = port
+        self.writes: int = 0
+        self.errors: int = 0
+        self._wanted: Optional[bool] = None
+        self._sent: Optional[bool] = None
+        self._closed: bool = False
+        self._cond: threading.Condition = threading.Condition()
+        self._thread: threading.Thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name='led-writer', daemon=True)
+            self._thread.start()
+
+    @property
+    def state(self) -> Optional[bool]:
+        '''
+        Last state, that was asked for (None if none)
+        '''
+
+        return self._wanted
+
+    def set(self, on: bool) -> None:
+        with self._cond:
+            if on == self._wanted:
+                return
+            self._wanted = on
+            self._wake()
+
+    def attach(self, port: Any) -> None:
+        with self._cond:
+            self.port = port
+            self._sent = None
+            self._wake()
+
+    def close(self, timeout: float = 1.0) -> None:
+        '''
+        Sends the last state and stops the thread
+        '''
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _pending(self) -> bool:
+        return self.port is not None and self._wanted is not None and self._wanted != self._sent
+
+    def _wake(self) -> None:
+        if self._thread is not None:
+            self._cond.notify()
+        elif self._pending():
+            self._write(self.port, self._wanted)
+
+    def _write(self, port: Any, state: bool) -> None:
+        try:
+            port.write(LED_ON if state else LED_OFF)
+            self.writes += 1
+        except OSError as exc:
+            # the state is not sent again until it changes
+            self.errors += 1
+            logger.warning('Could not write to the led: %s', exc)
+        with self._cond:
+            if port is self.port:
+                self._sent = state
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending())
+                if not self._pending():
+                    return
+                port, state = self.port, self._wanted
+            self._write(port, state)
@@ -0,0 +1,231 @@
+'''
+Sensor fusion kernels. Contains a scalar implementation of the
+Mahony IMU update, that works on plain floats, so it could be called
+once per sample without allocating numpy arrays for each of them (it is
+the only one: both the filter and the batch engine call it),
+the filter that keeps its state in preallocated arrays and the clock,
+that gives the filter sample periods from the timestamps of the samples.
+'''
+
+import numpy as np
+from math import sqrt
+from typing import Any, Dict, Sequence, Tuple
+
+# gains that are used by default in ahrs.filters.Mahony
+K_P: float = 1.0
+K_I: float = 0.3
+
+
+def mahony_step(q: Sequence[float], gyr: Sequence[float], acc: Sequence[float], dt: float,
+                k_p: float = K_P, k_i: float = K_I,
+                integral: Sequence[float] = None) -> Tuple[Tuple[float], Tuple[float]]:
+    '''
+    The Mahony IMU update on plain floats, that both the filter and the
+    batch engine use. Takes the a-priori quaternion (w, x, y, z), gyro (rad/s)
+    and accelerometer (m/s^2) sample. If the integral of the error is given,
+    the error is accumulated in it, as in the original filter, otherwise the
+    bias is estimated from the error of the current sample only. Returns the
+    new quaternion and the integral (the error, if it is not accumulated),
+    which is None if the accelerometer gave nothing to correct with
+    '''
+
+    qw, qx, qy, qz = q
+    gx, gy, gz = gyr
+    if not gx * gx + gy * gy + gz * gz > 0:
+        return (qw, qx, qy, qz), integral
+
+    ax, ay, az = acc
+    a_norm = sqrt(ax * ax + ay * ay + az * az)
+    if a_norm > 0:
+        ax, ay, az = ax / a_norm, ay / a_norm, az / a_norm
+        # expected Earth's gravity, which is the last row of rotation matrix
+        vx = 2.0 * (qx * qz - qw * qy)
+        vy = 2.0 * (qw * qx + qy * qz)
+        vz = 1.0 - 2.0 * (qx * qx + qy * qy)
+        # cost function is the cross product of measured and expected gravity
+        ex, ey, ez = ay * vz - az * vy, az * vx - ax * vz, ax * vy - ay * vx
+        if integral is None:
+            ix, iy, iz = ex, ey, ez
+        else:
+            ix, iy, iz = integral
+            ix, iy, iz = ix + ex * dt, iy + ey * dt, iz + ez * dt
+        integral = ix, iy, iz
+        # both proportional and bias terms are applied to gyro
+        gx += k_p * ex + k_i * ix
+        gy += k_p * ey + k_i * iy
+        gz += k_p * ez + k_i * iz
+
+    half_dt = 0.5 * dt
+    qw, qx, qy, qz = (qw + half_dt * (-qx * gx - qy * gy - qz * gz),
+                      qx + half_dt * (qw * gx + qy * gz - qz * gy),
+                      qy + half_dt * (qw * gy - qx * gz + qz * gx),
+                      qz + half_dt * (qw * gz + qx * gy - qy * gx))
+
+    norm = sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+    return (qw / norm, qx / norm, qy / norm, qz / norm), integral
+
+
+def mahony_update_imu(q: Sequence[float], gyr: Sequence[float],
+                      acc: Sequence[float], dt: float,
+                      k_p: float = K_P, k_i: float = K_I) -> Tuple[float]:
+    '''
+    Estimates new orientation from the a-priori quaternion (w, x, y, z),
+    gyro (rad/s) and accelerometer (m/s^2) sample. Is numerically equivalent
+    to ahrs.filters.Mahony.updateIMU, with its frequency set to 1 / dt
+    '''
+
+    return mahony_step(q, gyr, acc, dt, k_p, k_i)[0]
+
+
+class FusedMahony:
+    '''
+    Mahony filter for IMU, that updates its state in place: quaternion q
+    (w, x, y, z), integral of the error and estimated gyro bias. No arrays
+    are allocated per sample, the state arrays are the same for all the
+    updates. Sample period can be given to each update, otherwise 1 / frequency
+    is used.
+
+    By default gives the same output as ahrs.filters.Mahony.updateIMU, which
+    estimates the bias from the error of the current sample only. If integrate
+    is set, the error is accumulated over time, as in the original filter
+    '''
+
+    __slots__ = ('dt', 'k_p', 'k_i', 'integrate', 'q', 'integral', 'bias')
+
+    def __init__(self, frequency: float = 5.0, k_p: float = K_P, k_i: float = K_I,
+                 q0: Sequence[float] = (1.0, 0.0, 0.0, 0.0), integrate: bool = False) -> None:
+        self.dt: float = 1.0 / frequency
+        self.k_p: float = k_p
+        self.k_i: float = k_i
+        self.integrate: bool = integrate
+        self.q: np.ndarray = np.array(q0, dtype=np.float64)
+        self.integral: np.ndarray = np.zeros(3)
+        self.bias: np.ndarray = np.zeros(3)
+
+    def reset(self, q0: Sequence[float] = (1.0, 0.0, 0.0, 0.0)) -> None:
+        self.q[:] = q0
+        self.integral[:] = 0.0
+        self.bias[:] = 0.0
+
+    def update(self, gyr: Sequence[float], acc: Sequence[float], dt: float = None) -> np.ndarray:
+        '''
+        Updates the orientation with gyro (rad/s) and accelerometer (m/s^2)
+        sample. Returns the quaternion, which is the state array itself
+        '''
+
+        if dt is None:
+            dt = self.dt
+        # arithmetic on plain floats is faster than on numpy scalars
+        if isinstance(gyr, np.ndarray):
+            gyr = gyr.tolist()
+        if isinstance(acc, np.ndarray):
+            acc = acc.tolist()
+
+        q = self.q
+        (q[0], q[1], q[2], q[3]), integral = mahony_step(
+            q.tolist(), gyr, acc, dt, self.k_p, self.k_i,
+            self.integral.tolist() if self.integrate else None)
+        if integral is not None:
+            ix, iy, iz = integral
+            self.integral[0], self.integral[1], self.integral[2] = ix, iy, iz
+            k_i = self.k_i
+            self.bias[0], self.bias[1], self.bias[2] = -k_i * ix, -k_i * iy, -k_i * iz
+        return q
+
+
+class SampleClock:
+    '''
+    Sample periods (dt) of a stream from the timestamps of its samples.
+    The rate of the stream is estimated as the moving average of the
+    intervals between the timestamps, so it does not have to be known.
+
+    Timestamps are noisy: the host stamps a whole chunk of frames at once,
+    so the interval to the next timestamp is shared by all the frames that
+    had the same one. Each dt is clamped to (1 - tolerance, 1 + tolerance)
+    of the estimated period, and the difference is carried to the next
+    samples: integrated time follows the timestamps, but no single step is
+    much longer or shorter than the others. If the stream stops for more
+    than max_gap periods (samples were dropped, or the device was paused),
+    the current rate of the gyro says nothing about the gap, so the clock
+    jumps to the new timestamp and the number of dropped samples is counted
+    '''
+
+    __slots__ = ('period', 'tolerance', 'max_gap', 'smoothing', 'min_period', 'dropped',
+                 '_count', '_shared', '_previous', '_integrated')
+
+    def __init__(self, frequency: float = 5.0, tolerance: float = 0.5, max_gap: float = 10.0,
+                 smoothing: float = 0.02, min_period: float = 1e-4) -> None:
+        self.period: float = 1.0 / frequency
+        self.tolerance: float = tolerance
+        self.max_gap: float = max_gap
+        self.smoothing: float = smoothing
+        self.min_period: float = min_period
+        self.dropped: int = 0
+        self._count: int = 0
+        # number of samples with the previous timestamp
+        self._shared: int = 0
+        self._previous: float = None
+        # time up to which the samples were integrated
+        self._integrated: float = None
+
+    def state(self) -> Dict[str, Any]:
+        '''
+        State of the clock, that can be saved (e.g. as json) and restored
+        '''
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'SampleClock':
+        clock = cls()
+        for name in cls.__slots__:
+            setattr(clock, name, state[name])
+        return clock
+
+    def step(self, timestamp: float) -> float:
+        '''
+        Period of the sample with the timestamp (seconds). The first
+        sample is given 0, as there is nothing to integrate over
+        '''
+
+        if self._previous is None:
+            self._previous = self._integrated = timestamp
+            self._shared = 1
+            return 0.0
+
+        period = self.period
+        interval = timestamp - self._previous
+        if interval == 0:
+            self._shared += 1
+        else:
+            if 0 < interval <= self.max_gap * period * self._shared:
+                # average of all the intervals until there are enough of them
+                self._count += self._shared
+                weight = max(self.smoothing * self._shared, self._shared / self._count)
+                period += min(weight, 1.0) * (interval / self._shared - period)
+                self.period = period = max(period, self.min_period)
+            self._previous = timestamp
+            self._shared = 1
+
+        elapsed = timestamp - self._integrated
+        if abs(elapsed) > self.max_gap * period:
+            if elapsed > 0:
+                self.dropped += max(int(elapsed / period + 0.5) - 1, 0)
+            self._integrated = timestamp
+            return period
+
+        dt = min(max(elapsed, (1.0 - self.tolerance) * period), (1.0 + self.tolerance) * period)
+        self._integrated += dt
+        return dt
+
+
+def sample_periods(timestamps: Sequence[float], frequency: float = 5.0,
+                   clock: SampleClock = None) -> np.ndarray:
+    '''
+    Sample periods of the whole stream, as SampleClock gives them. If the clock
+    is given, the stream is continued from its state (and the clock is updated)
+    '''
+
+    if clock is None:
+        clock = SampleClock(frequency)
+    return np.array([clock.step(timestamp) for timestamp in np.asarray(timestamps, dtype=np.float64).tolist()])
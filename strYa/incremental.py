@@ -0,0 +1,193 @@
+'''
+Incremental processing of the raw recordings, that are still being
+written. State of the pipeline (gyro biases, last quaternions of the sensor
+groups, their sample clock, optimal position and how much of both files was
+processed) is saved in the checkpoint next to the angles file, so the next run computes
+the angles only for the rows, that were added to the raw file since then,
+and appends them to the angles file, moving the optimal position row to
+its end. Checkpoint keeps the hash of the beginning and of the end of the
+processed part of the raw file, so the file, that was replaced by another
+one, is processed from the start. Until the recording has enough rows to
+calibrate the sensors, nothing is written.
+'''
+
+import io
+import os
+import csv
+import json
+import hashlib
+import pathlib
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from strYa.batch import orientations_from_raw, resume_orientations, RAW_COLUMNS, ANGLE_COLUMNS
+from strYa.fusion import SampleClock, sample_periods
+
+CHECKPOINT_SUFFIX: str = '.checkpoint.json'
+ANGLES_HEADER: List[str] = ['human_time', 'computer_time'] + ANGLE_COLUMNS
+
+
+def checkpoint_path(to_file: str) -> pathlib.Path:
+    '''
+    Path of the checkpoint of the angles file
+    '''
+
+    to_file = pathlib.Path(to_file)
+    return to_file.with_name(to_file.name + CHECKPOINT_SUFFIX)
+
+
+def load_checkpoint(to_file: str) -> Dict[str, Any]:
+    '''
+    Checkpoint of the angles file or None if there is none
+    '''
+
+    try:
+        with open(checkpoint_path(to_file)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(to_file: str, checkpoint: Dict[str, Any]) -> None:
+    '''
+    Writes the checkpoint. It is replaced at once, so it always
+    describes the whole angles file
+    '''
+
+    path = checkpoint_path(to_file)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(tmp_path, path)
+
+
+def read_complete_rows(from_file: str, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    '''
+    Reads the rows of the csv file, that begin at the byte offset (after
+    the header if it is 0). The last row is skipped, if it is not written
+    completely yet. Returns the rows and offset of the end of the last one
+    '''
+
+    with open(from_file, 'rb') as file:
+        header = file.readline()
+        offset = max(offset, len(header))
+        file.seek(offset)
+        data = file.read()
+
+    end = data.rfind(b'\n') + 1
+    return pd.read_csv(io.BytesIO(header + data[:end])), offset + end
+
+
+def _angle_rows(df: pd.DataFrame, angles: np.ndarray) -> bytes:
+    output = io.StringIO()
+    csv.writer(output).writerows(zip(df['human_time'].tolist(), df['computer_time'].tolist(),
+                                     *angles.T.tolist()))
+    return output.getvalue().encode('utf-8')
+
+
+def _optimal_row(optimal: np.ndarray) -> bytes:
+    output = io.StringIO()
+    csv.writer(output).writerow(['0', '0'] + [str(i) for i in optimal])
+    return output.getvalue().encode('utf-8')
+
+
+def fingerprint(path: str, size: int, block_size: int = 1 << 16) -> str:
+    '''
+    Hash of the first size bytes of the file: of their first and last
+    block_size bytes, so it costs the same however large the file is
+    '''
+
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as file:
+        digest.update(file.read(min(block_size, size)))
+        if size > block_size:
+            file.seek(max(size - block_size, block_size))
+            digest.update(file.read(size - file.tell()))
+    return digest.hexdigest()
+
+
+def _is_valid(checkpoint: Dict[str, Any], from_file: str, to_file: str,
+              buffer_size: int, frequency: float, fixed_rate: bool) -> bool:
+    # the files could be replaced, truncated or rewritten since the checkpoint
+    # was saved: the processed part of the raw file should be the same and
+    # the angles file should end with the optimal position row
+    return checkpoint is not None and \
+        checkpoint.get('buffer_size') == buffer_size and \
+        checkpoint.get('frequency') == frequency and \
+        (checkpoint.get('clock') is None) == fixed_rate and \
+        os.path.getsize(from_file) >= checkpoint['raw_offset'] and \
+        os.path.exists(to_file) and os.path.getsize(to_file) == \
+        checkpoint['angles_offset'] + len(_optimal_row(checkpoint['optimal'])) and \
+        checkpoint.get('raw_hash') == fingerprint(from_file, checkpoint['raw_offset'])
+
+
+def update_angles(from_file: str, to_file: str, buffer_size: int = 25,
+                  frequency: float = 5.0, fixed_rate: bool = True) -> Optional[Dict[str, Any]]:
+    '''
+    Brings the angles file up to date with the raw one. If there is a valid
+    checkpoint, only the new rows of the raw file are processed, otherwise
+    the whole file is. Unless fixed_rate, sample periods are taken from the
+    timestamps of the rows (see PosturePosition.process_data_from_file).
+    Returns the new checkpoint, or None if there are not enough rows
+    to calibrate the sensors yet (then nothing is written)
+    '''
+
+    checkpoint = load_checkpoint(to_file)
+    if not _is_valid(checkpoint, from_file, to_file, buffer_size, frequency, fixed_rate):
+        return _process_all(from_file, to_file, buffer_size, frequency, fixed_rate)
+
+    df, raw_offset = read_complete_rows(from_file, checkpoint['raw_offset'])
+    if df.empty:
+        return checkpoint
+
+    periods = None
+    if not fixed_rate:
+        clock = SampleClock.from_state(checkpoint['clock'])
+        periods = sample_periods(df['computer_time'].to_numpy(dtype=np.float64), clock=clock)
+        checkpoint['clock'] = clock.state()
+    angles, quats = resume_orientations(df[RAW_COLUMNS].to_numpy(dtype=np.float64),
+                                        np.array(checkpoint['bias']),
+                                        np.array(checkpoint['quaternions']), frequency, periods)
+    # rows are written in place of the optimal position row,
+    # which is written again after them
+    with open(to_file, 'rb+') as file:
+        file.seek(checkpoint['angles_offset'])
+        file.truncate()
+        file.write(_angle_rows(df, angles))
+        angles_offset = file.tell()
+        file.write(_optimal_row(checkpoint['optimal']))
+
+    checkpoint.update(rows=checkpoint['rows'] + len(df), raw_offset=raw_offset,
+                      raw_hash=fingerprint(from_file, raw_offset),
+                      angles_offset=angles_offset, quaternions=quats.tolist())
+    save_checkpoint(to_file, checkpoint)
+    return checkpoint
+
+
+def _process_all(from_file: str, to_file: str, buffer_size: int, frequency: float,
+                 fixed_rate: bool) -> Optional[Dict[str, Any]]:
+    df, raw_offset = read_complete_rows(from_file)
+    if len(df) <= 2 * buffer_size:
+        # the recording has just started
+        return None
+    state = {}
+    timestamps = None if fixed_rate else df['computer_time'].to_numpy(dtype=np.float64)
+    angles, optimal, start = orientations_from_raw(df[RAW_COLUMNS].to_numpy(dtype=np.float64),
+                                                   buffer_size, frequency, state, timestamps)
+
+    header = io.StringIO()
+    csv.writer(header).writerow(ANGLES_HEADER)
+    with open(to_file, 'wb') as file:
+        file.write(header.getvalue().encode('utf-8'))
+        file.write(_angle_rows(df.iloc[start:], angles))
+        angles_offset = file.tell()
+        file.write(_optimal_row(optimal.tolist()))
+
+    checkpoint = {'rows': len(df), 'raw_offset': raw_offset,
+                  'raw_hash': fingerprint(from_file, raw_offset), 'angles_offset': angles_offset,
+                  'bias': state['bias'].tolist(), 'quaternions': state['quaternions'].tolist(),
+                  'clock': state['clock'] and state['clock'].state(),
+                  'optimal': optimal.tolist(), 'buffer_size': buffer_size, 'frequency': frequency}
+    save_checkpoint(to_file, checkpoint)
+    return checkpoint
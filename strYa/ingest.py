@@ -0,0 +1,165 @@
+'''
+Sources of the measurements. Reading from the serial port is done in
+a separate thread, so that slow processing of the measurements does not
+make the port's buffer overflow. Parsed frames are passed to the
+processing loop through a bounded queue. Datasets are replayed with
+the same interface: both sources are iterables of (time, frame) pairs.
+'''
+
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from time import time, monotonic, sleep
+from typing import Any, Iterator, Tuple
+
+from strYa.adts import LineParser
+from strYa.batch import RAW_COLUMNS
+from strYa.metrics import PipelineMetrics, DISABLED
+from strYa.recording import Recording, RECORDING_SUFFIX
+
+# what to do with a new frame when the queue is full
+DROP_OLDEST: str = 'drop_oldest'
+BLOCK: str = 'block'
+
+
+class SerialReader(threading.Thread):
+    '''
+    Reads everything that is waiting in the port at once, parses it with
+    given parser (LineParser or FrameDecoder) and puts (time, frame) pairs
+    into the queue, where frame is an array of 12 measurements. Time of
+    parsing of each chunk is recorded into the metrics. If reading of the
+    port fails (e.g. the device is disconnected), the reader stops and the
+    error is raised by the iteration, when the frames, that were read
+    before it, are given
+    '''
+
+    def __init__(self, port: Any, parser: Any = None, maxsize: int = 1024,
+                 policy: str = DROP_OLDEST, metrics: PipelineMetrics = DISABLED) -> None:
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f'Unknown backpressure policy: {policy}')
+
+        super().__init__(daemon=True)
+        self.port = port
+        self.parser = parser if parser is not None else LineParser()
+        self.policy: str = policy
+        self.metrics: PipelineMetrics = metrics
+        self.frames: queue.Queue = queue.Queue(maxsize)
+        self.received: int = 0
+        self.overflows: int = 0
+        self.max_depth: int = 0
+        self.error: Exception = None
+        self._stopped: threading.Event = threading.Event()
+
+    @property
+    def depth(self) -> int:
+        return self.frames.qsize()
+
+    def run(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                # blocks for the port's timeout if there is nothing to read
+                chunk = self.port.read(self.port.in_waiting or 1)
+                if not chunk:
+                    continue
+
+                timestamp = time()
+                start = self.metrics.clock()
+                frames = self.parser.feed(chunk)
+                self.metrics.parse.observe(self.metrics.clock() - start)
+                for frame in frames:
+                    self.put((timestamp, frame))
+        except Exception as exc:
+            # serial.SerialException is an OSError
+            self.error = exc
+        finally:
+            self._stopped.set()
+
+    def put(self, item: Tuple[float, np.ndarray]) -> None:
+        '''
+        Puts the item into queue, in case it is full either waits for
+        the free place or drops the oldest item, due to the policy
+        '''
+
+        self.received += 1
+        if self.policy == BLOCK:
+            while not self._stopped.is_set():
+                try:
+                    self.frames.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            while True:
+                try:
+                    self.frames.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.frames.get_nowait()
+                        self.overflows += 1
+                    except queue.Empty:
+                        pass
+
+        self.max_depth = max(self.max_depth, self.frames.qsize())
+
+    def get(self, timeout: float = None) -> Tuple[float, np.ndarray]:
+        '''
+        Returns the oldest (time, frame) pair. Raises queue.Empty
+        if there is nothing in the queue for timeout seconds
+        '''
+
+        return self.frames.get(timeout=timeout)
+
+    def __iter__(self) -> Iterator[Tuple[float, np.ndarray]]:
+        while not self._stopped.is_set() or not self.frames.empty():
+            try:
+                yield self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        if self.error is not None:
+            raise self.error
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+class ReplaySource:
+    '''
+    Replays the dataset of raw measurements (csv file or binary recording).
+    The file is read lazily, block by block. Frames are paced due to their
+    computer_time, speed is how many times faster than real time they are
+    given; if it is None, frames are given as fast as possible
+    '''
+
+    def __init__(self, path: str, speed: float = 1.0, block_size: int = 1024) -> None:
+        self.path: str = path
+        self.speed: float = speed
+        self.block_size: int = block_size
+
+    def _blocks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        if str(self.path).endswith(RECORDING_SUFFIX):
+            recording = Recording(self.path)
+            columns = [recording.columns.index(column) for column in RAW_COLUMNS]
+            for start in range(0, len(recording), self.block_size):
+                block = np.asarray(recording.data[start:start + self.block_size])
+                yield block[:, recording.columns.index('computer_time')], block[:, columns]
+            return
+
+        for block in pd.read_csv(self.path, chunksize=self.block_size):
+            yield (block['computer_time'].to_numpy(dtype=np.float64),
+                   block[RAW_COLUMNS].to_numpy(dtype=np.float64))
+
+    def __iter__(self) -> Iterator[Tuple[float, np.ndarray]]:
+        start = None
+        for times, values in self._blocks():
+            for timestamp, frame in zip(times.tolist(), values):
+                if self.speed:
+                    if start is None:
+                        start = (timestamp, monotonic())
+                    delay = start[1] + (timestamp - start[0]) / self.speed - monotonic()
+                    if delay > 0:
+                        sleep(delay)
+                yield timestamp, frame
@@ -0,0 +1,77 @@
+'''
+In-memory feed of the running pipeline for the live views. Keeps the
+recent angles and labels in preallocated ring buffers and the counts of
+each posture, so a reader can ask for everything after the last sample
+it has already got, without any files being read.
+'''
+
+import threading
+import numpy as np
+from typing import Dict, Sequence, Tuple
+
+from strYa.analyser import POSTURES
+
+# names of the angles that are kept, in order of the columns
+LIVE_COLUMNS: Tuple[str] = ('x1', 'y1', 'x2', 'y2')
+
+
+class LiveFeed:
+    '''
+    Ring buffers of the last size samples. Each sample is given a
+    sequence number, readers keep the number of the last sample
+    they have got and ask for the newer ones
+    '''
+
+    def __init__(self, size: int = 600) -> None:
+        self.size: int = size
+        self._times: np.ndarray = np.zeros(size)
+        self._angles: np.ndarray = np.zeros((size, len(LIVE_COLUMNS)))
+        self._labels: np.ndarray = np.zeros(size, dtype=np.int64)
+        self._counts: np.ndarray = np.zeros(len(POSTURES) + 1, dtype=np.int64)
+        self._seq: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        '''
+        Number of samples that were pushed so far
+        '''
+
+        return self._seq
+
+    def push(self, timestamp: float, upper: Sequence[float],
+             lower: Sequence[float], label: int) -> None:
+        '''
+        Adds angles (x, y) of upper and lower sensor groups and label
+        of the posture (index in POSTURES or UNCLEAR)
+        '''
+
+        with self._lock:
+            idx = self._seq % self.size
+            self._times[idx] = timestamp
+            self._angles[idx, :2] = upper[:2]
+            self._angles[idx, 2:] = lower[:2]
+            self._labels[idx] = label
+            self._counts[label] += 1
+            self._seq += 1
+
+    def since(self, seq: int) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Returns sequence number of the last sample and copies of times,
+        (N, 4) angles and labels of the samples that were pushed after
+        seq. If the reader is behind more than size samples, only
+        the last size of them are returned
+        '''
+
+        with self._lock:
+            first = max(seq, self._seq - self.size, 0)
+            idx = np.arange(first, self._seq) % self.size
+            return self._seq, self._times[idx], self._angles[idx], self._labels[idx]
+
+    def counts(self) -> Dict[str, int]:
+        '''
+        Number of samples of each posture since the start
+        '''
+
+        with self._lock:
+            return dict(zip(POSTURES + ('not_clear', ), self._counts.tolist()))
@@ -0,0 +1,172 @@
+'''
+Logging of the pipeline. Records of the strYa loggers are put into a
+bounded queue and written by a background thread, so the processing loop
+never waits for the terminal. Each message is rate limited and the records,
+that do not fit into the queue, are dropped, so the cost of the output is
+bounded however fast the frames arrive. Instead of a line per sample,
+periodic summaries of the postures are logged.
+'''
+
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from time import monotonic
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+LOGGER_NAME: str = 'strYa'
+FORMAT: str = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Lets through at most burst records of each message (the same format
+    string of the same logger and level) per interval seconds. Number of
+    the suppressed ones is added to the next record that passes
+    '''
+
+    def __init__(self, interval: float = 1.0, burst: int = 1,
+                 clock: Callable[[], float] = monotonic) -> None:
+        super().__init__()
+        self.interval: float = interval
+        self.burst: int = burst
+        self.clock: Callable[[], float] = clock
+        # message -> [start of the window, records in it, suppressed records]
+        self._windows: Dict[Tuple[Any], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = self.clock()
+        key = (record.name, record.levelno, record.msg)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = [now, 0, 0]
+        elif now - window[0] >= self.interval:
+            window[0], window[1] = now, 0
+
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+
+        window[1] += 1
+        if window[2]:
+            record.msg = f'{record.msg} ({window[2]} similar messages suppressed)'
+            window[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Puts records into the bounded queue without waiting,
+    the ones that do not fit are dropped and counted
+    '''
+
+    def __init__(self, records: queue.Queue) -> None:
+        super().__init__(records)
+        self.dropped: int = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    '''
+    Listener, which sentinel waits for space in the bounded queue, so it
+    can be stopped while the queue is full. If the stream does not take
+    the records within timeout seconds, the rest of them are dropped
+    '''
+
+    def __init__(self, records: queue.Queue, *handlers: logging.Handler,
+                 timeout: float = 1.0) -> None:
+        super().__init__(records, *handlers)
+        self.timeout: float = timeout
+
+    def enqueue_sentinel(self) -> None:
+        try:
+            self.queue.put(self._sentinel, timeout=self.timeout)
+        except queue.Full:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(self._sentinel)
+
+
+def setup(level: int = logging.INFO, stream: Any = None, interval: float = 1.0,
+          burst: int = 1, maxsize: int = 1024) -> DrainingQueueListener:
+    '''
+    Configures the strYa loggers to write into stream (stdout by default)
+    through the background thread. There is one such thread: the one of the
+    previous call is stopped. Returns the listener, that is stopped, with the
+    rest of the records written, by shutdown (which is called at exit)
+    '''
+
+    global _listener
+    shutdown()
+
+    records = queue.Queue(maxsize)
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(RateLimitFilter(interval, burst))
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    output.setFormatter(logging.Formatter(FORMAT))
+    _listener = DrainingQueueListener(records, output)
+    _listener.start()
+    return _listener
+
+
+def shutdown() -> None:
+    '''
+    Writes the rest of the records and stops the thread, that writes them
+    '''
+
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            logger.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+_listener: DrainingQueueListener = None
+atexit.register(shutdown)
+
+
+class PostureSummary:
+    '''
+    Counts the labels of the samples and logs share of each posture
+    once per interval seconds, e.g. "last 10 s: steady 87%, side_tilt 13%"
+    '''
+
+    def __init__(self, names: Sequence[str], interval: float = 10.0,
+                 logger: logging.Logger = None, clock: Callable[[], float] = monotonic) -> None:
+        self.names: Tuple[str] = tuple(names)
+        self.interval: float = interval
+        self.logger: logging.Logger = logger or logging.getLogger(f'{LOGGER_NAME}.summary')
+        self.clock: Callable[[], float] = clock
+        self.counts: List[int] = [0] * len(self.names)
+        self.start: float = clock()
+
+    def add(self, label: int) -> None:
+        self.counts[label] += 1
+        now = self.clock()
+        if now - self.start >= self.interval:
+            self.logger.info('last %d s: %s', round(now - self.start), self.message())
+            self.counts = [0] * len(self.names)
+            self.start = now
+
+    def message(self) -> str:
+        total = sum(self.counts)
+        shares = sorted(((count, name) for name, count in zip(self.names, self.counts) if count),
+                        reverse=True)
+        return ', '.join(f'{name} {100 * count / total:.0f}%' for count, name in shares)
@@ -0,0 +1,261 @@
+'''
+Lightweight metrics of the pipeline: counters and histograms with fixed
+buckets, that are updated on the hot path, and values that are read from
+the other objects only when the metrics are exported. Metrics are exported
+as Prometheus text, either through local HTTP endpoint or into a file.
+
+If the registry is disabled, it gives metrics that do nothing and a clock
+that does not read the time, so instrumented code costs almost nothing.
+'''
+
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from strYa.analyser import POSTURES
+
+# upper bounds of the buckets of the histograms of timings, in seconds
+TIME_BUCKETS: Tuple[float] = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4,
+                              2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 0.1, 1.0)
+CONTENT_TYPE: str = 'text/plain; version=0.0.4'
+
+
+def _labels(labels: Dict[str, str], extra: str = '') -> str:
+    items = [f'{key}="{value}"' for key, value in labels.items()]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+class Counter:
+    '''
+    Value that only grows
+    '''
+
+    __slots__ = ('labels', 'value')
+
+    def __init__(self, labels: Dict[str, str]) -> None:
+        self.labels: Dict[str, str] = labels
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def samples(self, name: str) -> List[str]:
+        return [f'{name}{_labels(self.labels)} {self.value}']
+
+
+class Histogram:
+    '''
+    Counts of the observed values in the buckets with fixed upper bounds,
+    their sum and number
+    '''
+
+    __slots__ = ('labels', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, labels: Dict[str, str], bounds: Sequence[float]) -> None:
+        self.labels: Dict[str, str] = labels
+        self.bounds: Tuple[float] = tuple(bounds)
+        # the last bucket is for the values that are greater than all the bounds
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf', ), self.counts):
+            cumulative += count
+            le = 'le="{}"'.format(bound)
+            lines.append(f'{name}_bucket{_labels(self.labels, le)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(self.labels)} {self.sum}')
+        lines.append(f'{name}_count{_labels(self.labels)} {self.count}')
+        return lines
+
+
+class Callback:
+    '''
+    Value that is read from the function when the metrics are exported
+    '''
+
+    __slots__ = ('labels', 'func')
+
+    def __init__(self, labels: Dict[str, str], func: Callable[[], float]) -> None:
+        self.labels: Dict[str, str] = labels
+        self.func: Callable[[], float] = func
+
+    def samples(self, name: str) -> List[str]:
+        return [f'{name}{_labels(self.labels)} {self.func()}']
+
+
+class _NullMetric:
+    '''
+    Metric of the disabled registry
+    '''
+
+    __slots__ = ()
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+def _no_clock() -> float:
+    return 0.0
+
+
+class Registry:
+    '''
+    Collection of metrics, that are grouped by names. Metrics of the same
+    name (family) differ by their labels
+    '''
+
+    def __init__(self, enabled: bool = True, prefix: str = 'strya') -> None:
+        self.enabled: bool = enabled
+        self.prefix: str = prefix
+        # clock that should be used to time the stages
+        self.clock: Callable[[], float] = perf_counter if enabled else _no_clock
+        self._families: Dict[str, Tuple[str, str, List[Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _add(self, name: str, kind: str, help_text: str, metric: Any) -> Any:
+        name = f'{self.prefix}_{name}' if self.prefix else name
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, []))
+            if family[0] != kind:
+                raise ValueError(f'Metric {name} is already registered as {family[0]}')
+            family[2].append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, **labels: str) -> Counter:
+        if not self.enabled:
+            return NULL_METRIC
+        return self._add(name, 'counter', help_text, Counter(labels))
+
+    def histogram(self, name: str, help_text: str, bounds: Sequence[float] = TIME_BUCKETS,
+                  **labels: str) -> Histogram:
+        if not self.enabled:
+            return NULL_METRIC
+        return self._add(name, 'histogram', help_text, Histogram(labels, bounds))
+
+    def callback(self, name: str, help_text: str, func: Callable[[], float],
+                 kind: str = 'counter', **labels: str) -> None:
+        '''
+        Registers the value that is read from func on export,
+        kind is either counter or gauge
+        '''
+
+        if self.enabled:
+            self._add(name, kind, help_text, Callback(labels, func))
+
+    def export(self) -> str:
+        '''
+        Snapshot of all the metrics in Prometheus text format
+        '''
+
+        lines = []
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics))
+                        for name, (kind, help_text, metrics) in self._families.items()]
+        for name, kind, help_text, metrics in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for metric in metrics:
+                lines.extend(metric.samples(name))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        '''
+        Writes the snapshot into the file. It is replaced at once, so the
+        readers never see the partially written one
+        '''
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(self.export())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int = 9100, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        '''
+        Starts HTTP server in a separate thread, that gives the snapshot
+        on /metrics. If port is 0, it is chosen by the system
+        '''
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.export().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class PipelineMetrics:
+    '''
+    Metrics of the stages of the processing script: timings of each stage
+    of a frame processing, number of processed frames and classifications
+    of each posture. Numbers of the frames that were read, dropped or could
+    not be parsed are taken from the reader when they are exported
+    '''
+
+    STAGES: Tuple[str] = ('parse', 'set_frame', 'write', 'filter', 'classify', 'frame')
+
+    def __init__(self, registry: Registry = None) -> None:
+        self.registry: Registry = registry if registry is not None else Registry(enabled=False)
+        self.clock: Callable[[], float] = self.registry.clock
+        for stage in self.STAGES:
+            setattr(self, stage, self.registry.histogram(
+                'stage_seconds', 'Time of the stages of processing', stage=stage))
+        self.frames: Counter = self.registry.counter(
+            'frames_processed_total', 'Frames that went through the pipeline')
+        # indices are the labels of the postures
+        self.classifications: List[Counter] = [
+            self.registry.counter('classifications_total', 'Classified samples by posture',
+                                  posture=posture) for posture in POSTURES + ('not_clear', )]
+
+    def watch_reader(self, reader: Any) -> None:
+        '''
+        Registers the numbers that are counted by the reader of the port and its parser
+        '''
+
+        parser = reader.parser
+        self.registry.callback('frames_read_total', 'Frames that were read from the port',
+                               lambda: reader.received)
+        self.registry.callback('parse_errors_total', 'Lines or frames that could not be parsed',
+                               lambda: getattr(parser, 'rejected', 0) + getattr(parser, 'corrupted', 0))
+        self.registry.callback('dropped_frames_total', 'Frames that were lost or dropped',
+                               lambda: reader.overflows + getattr(parser, 'dropped', 0))
+        self.registry.callback('queue_depth', 'Frames that wait to be processed',
+                               lambda: reader.depth, kind='gauge')
+
+
+# metrics that are used if none are given
+DISABLED: PipelineMetrics = PipelineMetrics()
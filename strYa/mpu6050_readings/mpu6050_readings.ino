@@ -4,8 +4,26 @@
 #include <Adafruit_Sensor.h>
 #include <Wire.h>
 
+// set to 1 in order to send the readings as binary frames (see FrameDecoder
+// in strYa/adts.py), instead of the text lines
+#define BINARY_FRAMES 0
+
+// acceleration is sent in hundredths of m/s^2, rotation in thousandths of rad/s
+#define ACC_SCALE 100.0
+#define GYRO_SCALE 1000.0
+
 int led = 7;
-int state = 0;
+// the led is latched: it is turned on by '1' and stays on until '0' comes
+int state = LOW;
+
+struct __attribute__((packed)) Frame {
+  uint8_t sync[2];
+  uint16_t seq;
+  int16_t values[12];
+  uint16_t checksum;
+};
+
+Frame frame = {{0xAA, 0x55}, 0, {0}, 0};
 
 Adafruit_MPU6050 mpu;
 Adafruit_MPU6050 mpu1;
@@ -44,23 +62,36 @@ void setup(void) {
 
 void loop() {
 
-  if (Serial.available() > 0) {
-    state = Serial.read();
-  }
-
-  if (state == '1') {
-    digitalWrite(led, HIGH);
-    state = 0;
-  } else {
-    digitalWrite(led, LOW);
-    state = 0;
+  while (Serial.available() > 0) {
+    int command = Serial.read();
+    if (command == '1') {
+      state = HIGH;
+    } else if (command == '0') {
+      state = LOW;
+    }
   }
+  digitalWrite(led, state);
   delay(100);
 
   /* Get new sensor events with the readings */
   sensors_event_t a, g, temp;
   mpu.getEvent(&a, &g, &temp);
 
+  sensors_event_t a1, g1, temp1;
+  mpu1.getEvent(&a1, &g1, &temp1);
+
+#if BINARY_FRAMES
+  sendFrame(a, g, a1, g1);
+#else
+  printReadings(a, g);
+  // sperator between two sensors readings
+  Serial.print("|");
+  printReadings(a1, g1);
+  Serial.println("");
+#endif
+}
+
+void printReadings(sensors_event_t &a, sensors_event_t &g) {
   /* Print out the values */
   // Acceleration - m/s^2
   //Acceleration X:
@@ -82,26 +113,38 @@ void loop() {
   Serial.print(", ");
   // Rotation Z
   Serial.print(g.gyro.z);
+}
 
-  // sperator between two sensors readings
-  Serial.print("|");
-
-  sensors_event_t a1, g1, temp1;
-  mpu1.getEvent(&a1, &g1, &temp1);
-
+int16_t toFixedPoint(float value, float scale) {
+  return (int16_t)constrain(round(value * scale), -32768, 32767);
+}
 
-  Serial.print(a1.acceleration.x);
-  Serial.print(", ");
-  Serial.print(a1.acceleration.y);
-  Serial.print(", ");
-  Serial.print(a1.acceleration.z);
-  Serial.print("; ");
+uint16_t fletcher16(const uint8_t *data, size_t len) {
+  uint16_t sum1 = 0;
+  uint16_t sum2 = 0;
+  for (size_t i = 0; i < len; i++) {
+    sum1 = (sum1 + data[i]) % 255;
+    sum2 = (sum2 + sum1) % 255;
+  }
+  return (sum2 << 8) | sum1;
+}
 
-  Serial.print(g1.gyro.x);
-  Serial.print(", ");
-  Serial.print(g1.gyro.y);
-  Serial.print(", ");
-  Serial.print(g1.gyro.z);
+void sendFrame(sensors_event_t &a, sensors_event_t &g,
+               sensors_event_t &a1, sensors_event_t &g1) {
+  sensors_event_t *acc[2] = {&a, &a1};
+  sensors_event_t *gyro[2] = {&g, &g1};
+  for (int i = 0; i < 2; i++) {
+    frame.values[6 * i + 0] = toFixedPoint(acc[i]->acceleration.x, ACC_SCALE);
+    frame.values[6 * i + 1] = toFixedPoint(acc[i]->acceleration.y, ACC_SCALE);
+    frame.values[6 * i + 2] = toFixedPoint(acc[i]->acceleration.z, ACC_SCALE);
+    frame.values[6 * i + 3] = toFixedPoint(gyro[i]->gyro.x, GYRO_SCALE);
+    frame.values[6 * i + 4] = toFixedPoint(gyro[i]->gyro.y, GYRO_SCALE);
+    frame.values[6 * i + 5] = toFixedPoint(gyro[i]->gyro.z, GYRO_SCALE);
+  }
 
-  Serial.println("");
+  // checksum covers everything between sync word and itself
+  frame.checksum = fletcher16((uint8_t *)&frame.seq,
+                              sizeof(frame.seq) + sizeof(frame.values));
+  Serial.write((uint8_t *)&frame, sizeof(frame));
+  frame.seq++;
 }
@@ -6,43 +6,46 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from downsampling import downsample, MINMAX
 
-def plot_timeline(file_name):
+
+def plot_timeline(file_name, num_of_points=2000):
     '''
-    Makes timeline graphs from csv data.
+    Makes timeline graphs from csv data. Each graph is downsampled
+    to about num_of_points points (min and max of each bucket are kept).
     '''
     # data frame from rounded data file
     df = pd.read_csv(file_name)
 
     # find all par for graphs
-    time = df['computer_time']
+    time = df['computer_time'].to_numpy()
 
     # plotting
     fig, (x_acc_1, y_acc_1, x_gyro_1, y_gyro_1, x_acc_2,
           y_acc_2, x_gyro_2, y_gyro_2) = plt.subplots(8, 1)
 
-    x_acc_1.plot(time, df['x_acc_1'].tolist())
+    x_acc_1.plot(*downsample(time, df['x_acc_1'].to_numpy(), num_of_points, MINMAX))
     x_acc_1.set_title('x_acc_1')
 
-    y_acc_1.plot(time, df['y_acc_1'].tolist())
+    y_acc_1.plot(*downsample(time, df['y_acc_1'].to_numpy(), num_of_points, MINMAX))
     y_acc_1.set_title('y_acc_1')
 
-    x_gyro_1.plot(time, df['x_gyro_1'].tolist())
+    x_gyro_1.plot(*downsample(time, df['x_gyro_1'].to_numpy(), num_of_points, MINMAX))
     x_gyro_1.set_title('x_gyro_1')
 
-    y_gyro_1.plot(time, df['y_gyro_1'].tolist())
+    y_gyro_1.plot(*downsample(time, df['y_gyro_1'].to_numpy(), num_of_points, MINMAX))
     y_gyro_1.set_title('y_gyro_1')
 
-    x_acc_2.plot(time, df['x_acc_2'].tolist())
+    x_acc_2.plot(*downsample(time, df['x_acc_2'].to_numpy(), num_of_points, MINMAX))
     x_acc_2.set_title('x_acc_2')
 
-    y_acc_2.plot(time, df['y_acc_2'].tolist())
+    y_acc_2.plot(*downsample(time, df['y_acc_2'].to_numpy(), num_of_points, MINMAX))
     y_acc_2.set_title('y_acc_2')
 
-    x_gyro_2.plot(time, df['x_gyro_2'].tolist())
+    x_gyro_2.plot(*downsample(time, df['x_gyro_2'].to_numpy(), num_of_points, MINMAX))
     x_gyro_2.set_title('x_gyro_2')
 
-    y_gyro_2.plot(time, df['y_gyro_2'].tolist())
+    y_gyro_2.plot(*downsample(time, df['y_gyro_2'].to_numpy(), num_of_points, MINMAX))
     y_gyro_2.set_title('y_gyro_2')
 
     fig.subplots_adjust(hspace=0.5)
@@ -0,0 +1,388 @@
+'''
+Binary format of the recordings. File starts with a header, that
+describes its columns, followed by fixed-width records of float64
+values, so a recording can be memory-mapped and sliced without parsing.
+Also contains converter of the csv datasets into this format and the
+time index of the csv datasets, so the rows of a time range can be read
+without reading the whole file.
+'''
+
+import io
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Sequence, Tuple
+
+from strYa.batch import RAW_COLUMNS, ANGLE_COLUMNS
+
+RECORDING_SUFFIX: str = '.strya'
+INDEX_SUFFIX: str = '.index.json'
+RAW_RECORDING_COLUMNS: List[str] = ['computer_time'] + RAW_COLUMNS
+ANGLES_RECORDING_COLUMNS: List[str] = ['computer_time'] + ANGLE_COLUMNS
+
+_MAGIC: bytes = b'STRYA\x01'
+# records start at the offset, that is multiple of this one
+_ALIGNMENT: int = 64
+
+
+def _header(columns: Sequence[str], meta: Dict[str, Any]) -> bytes:
+    description = json.dumps({'columns': list(columns), 'dtype': '<f8',
+                              'meta': meta}).encode('utf-8')
+    size = len(_MAGIC) + 4 + len(description)
+    padding = -size % _ALIGNMENT
+    description += b' ' * padding
+    return _MAGIC + len(description).to_bytes(4, 'little') + description
+
+
+class RecordingWriter:
+    '''
+    Appends records to the binary recording. Records are collected in
+    preallocated block and written when it is filled, or when the writer
+    is flushed or closed
+    '''
+
+    def __init__(self, path: str, columns: Sequence[str] = RAW_RECORDING_COLUMNS,
+                 meta: Dict[str, Any] = None, block_size: int = 256) -> None:
+        self.path: str = path
+        self.columns: List[str] = list(columns)
+        self._file = open(path, 'wb')
+        self._file.write(_header(self.columns, meta or {}))
+        self._block: np.ndarray = np.empty((block_size, len(self.columns)), dtype='<f8')
+        self._filled: int = 0
+
+    def append(self, row: Sequence[float]) -> None:
+        '''
+        Appends a record, that contains a value for each column
+        '''
+
+        self._block[self._filled] = row
+        self._filled += 1
+        if self._filled == len(self._block):
+            self.flush()
+
+    def writerow(self, row: Sequence[Any]) -> None:
+        '''
+        Same as the one of csv writer, so the writer could be passed to
+        PosturePosition.set_sensor_data. Row starts with human time,
+        which is not stored, as it is the same as computer time
+        '''
+
+        self.append(row[1:])
+
+    def write_frame(self, timestamp: float, frame: np.ndarray) -> None:
+        '''
+        Appends a record of computer time and the frame of measurements,
+        is used by PosturePosition.set_frame
+        '''
+
+        row = self._block[self._filled]
+        row[0] = timestamp
+        row[1:] = frame
+        self._filled += 1
+        if self._filled == len(self._block):
+            self.flush()
+
+    def extend(self, rows: np.ndarray) -> None:
+        '''
+        Appends (N, number of columns) array of records
+        '''
+
+        self.flush()
+        self._file.write(np.ascontiguousarray(rows, dtype='<f8').tobytes())
+
+    def flush(self) -> None:
+        self._file.write(self._block[:self._filled].tobytes())
+        self._filled = 0
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> 'RecordingWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class Recording:
+    '''
+    Binary recording that is opened for reading. Data is memory-mapped,
+    so slicing it reads only the needed part of the file
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, 'rb') as file:
+            if file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f'{path} is not a recording')
+            size = int.from_bytes(file.read(4), 'little')
+            header = json.loads(file.read(size))
+
+        self.columns: List[str] = header['columns']
+        self.meta: Dict[str, Any] = header['meta']
+        offset = len(_MAGIC) + 4 + size
+        row_size = 8 * len(self.columns)
+        with open(path, 'rb') as file:
+            file.seek(0, 2)
+            # the last record may be incomplete if the writer was interrupted
+            num_of_rows = (file.tell() - offset) // row_size
+
+        if num_of_rows:
+            self.data: np.ndarray = np.memmap(path, dtype=header['dtype'], mode='r', offset=offset,
+                                              shape=(num_of_rows, len(self.columns)))
+        else:
+            self.data = np.empty((0, len(self.columns)), dtype=header['dtype'])
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.data[:, self.columns.index(column)]
+
+    def select(self, columns: Sequence[str]) -> np.ndarray:
+        '''
+        (N, len(columns)) array of the values of given columns
+        '''
+
+        return self.data[:, [self.columns.index(column) for column in columns]]
+
+
+class TimeIndex:
+    '''
+    Index of the csv dataset, that is kept in the file next to it: time
+    (computer_time) of the first row of each block of block_size rows and
+    byte offset of that row. Rows, that are earlier than the ones before
+    them (like the optimal position row of the angles datasets), are not
+    indexed. If the dataset has grown (and the last indexed block is still
+    where it was), the index is extended from that block, otherwise, if the
+    dataset has changed, it is built again
+
+    If not persistent, or the file cannot be written (the dataset is in a
+    read-only location), the index is only kept in memory, so the instance
+    should be kept to read the dataset again
+    '''
+
+    def __init__(self, path: str, block_size: int = 256, persistent: bool = True) -> None:
+        self.path: str = str(path)
+        self.block_size: int = block_size
+        self.persistent: bool = persistent
+        self.header: bytes = b''
+        self.times: List[float] = []
+        self.offsets: List[int] = []
+        self.rows: int = 0
+        # end of the last indexed row, size of the indexed part
+        # of the file and its last modification
+        self.end: int = 0
+        self.size: int = 0
+        self.mtime: int = 0
+        if persistent:
+            self._load()
+        self.update()
+
+    @property
+    def index_path(self) -> str:
+        return self.path + INDEX_SUFFIX
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return
+        if index.get('block_size') == self.block_size and 'end' in index:
+            self.header = index['header'].encode('utf-8')
+            self.times, self.offsets = index['times'], index['offsets']
+            self.rows, self.end = index['rows'], index['end']
+            self.size, self.mtime = index['size'], index['mtime']
+
+    def _save(self) -> None:
+        if not self.persistent:
+            return
+        index = {'block_size': self.block_size, 'header': self.header.decode('utf-8'),
+                 'times': self.times, 'offsets': self.offsets,
+                 'rows': self.rows, 'end': self.end, 'size': self.size, 'mtime': self.mtime}
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(index, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # it is built again the next time
+            self.persistent = False
+
+    def update(self) -> None:
+        '''
+        Brings the index up to date with the dataset
+        '''
+
+        stat = os.stat(self.path)
+        if stat.st_size == self.size and stat.st_mtime_ns == self.mtime:
+            return
+
+        with open(self.path, 'rb') as file:
+            header = file.readline()
+            column = header.decode('utf-8').strip().split(',').index('computer_time')
+            if not self._grown(file, header, column, stat.st_size):
+                self.header, self.times, self.offsets, self.rows = header, [], [], 0
+                start = self.end = len(header)
+            else:
+                # the last block is indexed again, as its rows could be rewritten
+                start = self.offsets.pop()
+                self.times.pop()
+                self.rows -= self.rows % self.block_size or self.block_size
+
+            file.seek(start)
+            offset = start
+            last = self.times[-1] if self.times else -np.inf
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # the row is not written completely yet
+                    break
+                time = _row_time(line, column)
+                if time is not None and time >= last:
+                    if self.rows % self.block_size == 0:
+                        self.times.append(time)
+                        self.offsets.append(offset)
+                    self.rows += 1
+                    self.end = offset + len(line)
+                    last = time
+                offset += len(line)
+
+        self.size, self.mtime = offset, stat.st_mtime_ns
+        if offset != stat.st_size:
+            # the unfinished row is indexed the next time
+            self.mtime = 0
+        self._save()
+
+    def _grown(self, file: Any, header: bytes, column: int, size: int) -> bool:
+        # the file, that was written anew (even with the same header), is
+        # not a continuation, unless the last indexed block is still there
+        if header != self.header or size < self.size or not self.offsets:
+            return False
+        file.seek(self.offsets[-1])
+        return _row_time(file.readline(), column) == self.times[-1]
+
+    def locate(self, start: float, end: float) -> Tuple[int, int]:
+        '''
+        Byte range of the blocks, that contain the rows with start <= time < end
+        '''
+
+        # pandas may parse the times a bit differently (in the last digit),
+        # so the block, that starts right at the end, is read as well
+        first = max(bisect_right(self.times, start) - 1, 0)
+        last = bisect_right(self.times, end)
+        # rows after the last indexed one (the optimal position) are not read
+        stop = self.offsets[last] if last < len(self.offsets) else self.end
+        return (self.offsets[first], stop) if self.offsets else (0, 0)
+
+
+def _row_time(line: bytes, column: int) -> float:
+    try:
+        return float(line.split(b',')[column])
+    except (ValueError, IndexError):
+        return None
+
+
+def read_range(path: str, start: float, end: float, index: TimeIndex = None) -> pd.DataFrame:
+    '''
+    Rows of the dataset (csv file or recording) with start <= computer_time < end.
+    Only the rows of the blocks around the range are read from the file: the
+    block is found by binary search in the time index (or in the time column
+    of the memory-mapped recording). Index of the csv file can be given, if it
+    is kept by the caller, otherwise it is loaded from (or saved to) its file
+    '''
+
+    if str(path).endswith(RECORDING_SUFFIX):
+        recording = Recording(path)
+        # bisect reads only the records it compares with, np.searchsorted
+        # would make a copy of the whole column
+        times = recording['computer_time']
+        first, last = bisect_left(times, start), bisect_left(times, end)
+        return pd.DataFrame(np.asarray(recording.data[first:last]), columns=recording.columns)
+
+    if index is None:
+        index = TimeIndex(path)
+    else:
+        index.update()
+    first, last = index.locate(start, end)
+    with open(path, 'rb') as file:
+        file.seek(first)
+        data = file.read(last - first)
+    df = pd.read_csv(io.BytesIO(index.header + data))
+    times = df['computer_time']
+    # rows, that are earlier than the ones before them, are not indexed
+    return df[(times >= start) & (times < end) & (times >= times.cummax())].reset_index(drop=True)
+
+
+def read_angles(path: str, start: float = None, end: float = None,
+                index: TimeIndex = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Reads angles dataset either from csv file, in which the last row is
+    the optimal position, or from the recording. Returns computer time,
+    (N, 6) array of angles and (6, ) array of optimal position. If start
+    or end is given, only the rows of that time range are read (see read_range)
+    '''
+
+    if start is not None or end is not None:
+        df = read_range(path, -np.inf if start is None else start,
+                        np.inf if end is None else end, index)
+        return (df['computer_time'].to_numpy(), df[ANGLE_COLUMNS].to_numpy(),
+                _optimal_position(path))
+
+    if str(path).endswith(RECORDING_SUFFIX):
+        recording = Recording(path)
+        return (recording['computer_time'], recording.select(ANGLE_COLUMNS),
+                np.array(recording.meta['optimal']))
+
+    df = pd.read_csv(path)
+    angles = df[ANGLE_COLUMNS].to_numpy()
+    return df['computer_time'].to_numpy()[:-1], angles[:-1], angles[-1]
+
+
+def _optimal_position(path: str) -> np.ndarray:
+    if str(path).endswith(RECORDING_SUFFIX):
+        return np.array(Recording(path).meta['optimal'])
+
+    # it is the last row of the csv dataset
+    with open(path, 'rb') as file:
+        header = file.readline()
+        file.seek(max(file.seek(0, 2) - 4096, len(header)))
+        last = file.read().rstrip().splitlines()[-1]
+    return pd.read_csv(io.BytesIO(header + last))[ANGLE_COLUMNS].to_numpy()[0]
+
+
+def convert_csv(from_file: str, to_file: str = None) -> str:
+    '''
+    Converts the csv dataset (either raw measurements or angles) into the
+    recording. If to_file is not given, the recording is written next
+    to the dataset. Returns the path of the recording
+    '''
+
+    if to_file is None:
+        to_file = str(from_file).rsplit('.', 1)[0] + RECORDING_SUFFIX
+
+    df = pd.read_csv(from_file)
+    if set(ANGLE_COLUMNS) <= set(df.columns):
+        columns = ANGLES_RECORDING_COLUMNS
+        # the last row of angles dataset contains the optimal position
+        meta = {'optimal': df[ANGLE_COLUMNS].iloc[-1].tolist()}
+        df = df.iloc[:-1]
+    else:
+        columns = RAW_RECORDING_COLUMNS
+        meta = {}
+
+    with RecordingWriter(to_file, columns, meta) as writer:
+        writer.extend(df[columns].to_numpy(dtype=np.float64))
+
+    return to_file
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(f'{path} -> {convert_csv(path)}')
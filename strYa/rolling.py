@@ -0,0 +1,120 @@
+'''
+Rolling statistics of the postures. Counts of the samples of each posture
+are kept in time buckets of several resolutions (seconds, minutes, hours),
+each one in a fixed-size circular array, so the memory does not grow
+however long the session is, and the counts over any recent window are
+summed over at most the number of buckets of one resolution.
+'''
+
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+# width of the buckets in seconds and their number: last 5 minutes
+# by seconds, last hour by minutes and last day by hours
+RESOLUTIONS: Tuple[Tuple[float, int]] = ((1.0, 300), (60.0, 60), (3600.0, 24))
+
+
+class RollingCounts:
+    '''
+    Counts of each class in the last size buckets of the given width.
+    Bucket of a sample is its timestamp // width (epoch), it is kept in
+    the slot epoch % size until a newer bucket takes its place. Samples
+    of the current bucket are counted in a list and are moved to the
+    array when the bucket is over
+    '''
+
+    def __init__(self, width: float, size: int, num_of_classes: int) -> None:
+        self.width: float = width
+        self.size: int = size
+        self.counts: np.ndarray = np.zeros((size, num_of_classes), dtype=np.int32)
+        # epoch of the bucket that is kept in each slot, -1 if none
+        self.epochs: np.ndarray = np.full(size, -1, dtype=np.int64)
+        self._epoch: int = -1
+        self._start: float = 0.0
+        self._end: float = 0.0
+        self._current: List[int] = [0] * num_of_classes
+
+    def add(self, timestamp: float, label: int) -> None:
+        if not self._start <= timestamp < self._end:
+            self._flush()
+            self._epoch = int(timestamp // self.width)
+            self._start = self._epoch * self.width
+            self._end = self._start + self.width
+        self._current[label] += 1
+
+    def _flush(self) -> None:
+        if self._epoch < 0:
+            return
+        slot = self._epoch % self.size
+        if self.epochs[slot] == self._epoch:
+            self.counts[slot] += self._current
+        elif self.epochs[slot] < self._epoch:
+            self.counts[slot] = self._current
+            self.epochs[slot] = self._epoch
+        # else the samples are older than the buckets that are kept
+        self._current = [0] * len(self._current)
+
+    def span(self) -> float:
+        '''
+        Longest window, that can be counted
+        '''
+
+        return self.width * self.size
+
+    def window(self, seconds: float, now: float) -> np.ndarray:
+        '''
+        Counts of each class in the buckets, that end within seconds before
+        now (the bucket of now included)
+        '''
+
+        self._flush()
+        last = int(now // self.width)
+        first = last - int(np.ceil(seconds / self.width)) + 1
+        kept = (self.epochs >= first) & (self.epochs <= last)
+        return self.counts[kept].sum(axis=0, dtype=np.int64)
+
+
+class RollingStats:
+    '''
+    Counts of the postures at several resolutions. Window is counted by
+    the finest of them, that covers it
+    '''
+
+    def __init__(self, names: Sequence[str],
+                 resolutions: Sequence[Tuple[float, int]] = RESOLUTIONS) -> None:
+        self.names: Tuple[str] = tuple(names)
+        self.levels: List[RollingCounts] = sorted(
+            (RollingCounts(width, size, len(self.names)) for width, size in resolutions),
+            key=lambda level: level.width)
+        self.last: float = 0.0
+
+    def add(self, timestamp: float, label: int) -> None:
+        '''
+        Counts sample of the label (index in names) at the timestamp (seconds)
+        '''
+
+        self.last = timestamp
+        for level in self.levels:
+            level.add(timestamp, label)
+
+    def window(self, seconds: float, now: float = None) -> Dict[str, int]:
+        '''
+        Number of samples of each posture in the last seconds before now,
+        which is the time of the last sample by default. Window is rounded
+        up to the whole buckets
+        '''
+
+        now = self.last if now is None else now
+        for level in self.levels:
+            if seconds <= level.span():
+                return dict(zip(self.names, level.window(seconds, now).tolist()))
+
+        raise ValueError(f'Only the last {self.levels[-1].span():.0f} seconds are kept')
+
+    def since(self, start: float, now: float = None) -> Dict[str, int]:
+        '''
+        Number of samples of each posture from start (e.g. midnight) until now
+        '''
+
+        now = self.last if now is None else now
+        return self.window(now - start, now)
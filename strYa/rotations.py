@@ -0,0 +1,52 @@
+'''
+Conversions between representations of rotations. Quaternions are
+expected to be in (w, x, y, z) order, Euler angles are in degrees.
+'''
+
+import math
+import numpy as np
+from typing import Tuple
+
+
+def euler_from_quaternion(w: float, x: float, y: float, z: float) -> Tuple[float]:
+    '''
+    Turns a single quaternion into Euler angles. Is meant for streaming,
+    so works on plain floats and does not create any arrays
+    '''
+
+    t0 = +2.0 * (w * x + y * z)
+    t1 = +1.0 - 2.0 * (x * x + y * y)
+    X = math.degrees(math.atan2(t0, t1))
+
+    t2 = +2.0 * (w * y - z * x)
+    t2 = +1.0 if t2 > +1.0 else t2
+    t2 = -1.0 if t2 < -1.0 else t2
+    Y = math.degrees(math.asin(t2))
+
+    t3 = +2.0 * (w * z + x * y)
+    t4 = +1.0 - 2.0 * (y * y + z * z)
+    Z = math.degrees(math.atan2(t3, t4))
+
+    return X, Y, Z
+
+
+def quaternion_to_euler(quats: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    '''
+    Turns (N, 4) array of quaternions into (N, 3) array of Euler angles.
+    If out is given, angles are written into it (it may be a view,
+    e.g. columns of a bigger array), and it is returned
+    '''
+
+    quats = np.asarray(quats, dtype=np.float64)
+    if quats.ndim != 2 or quats.shape[1] != 4:
+        raise ValueError('Expected (N, 4) array of quaternions')
+    if out is None:
+        out = np.empty((len(quats), 3))
+    elif out.shape != (len(quats), 3):
+        raise ValueError(f'Expected output buffer of shape ({len(quats)}, 3)')
+
+    w, x, y, z = quats.T
+    np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y), out=out[:, 0])
+    np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0), out=out[:, 1])
+    np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z), out=out[:, 2])
+    return np.degrees(out, out=out)
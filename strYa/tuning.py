@@ -0,0 +1,191 @@
+'''
+Tuning of the thresholds of the classifier. Labelled datasets are the
+angles datasets, that are named after the posture (angles_<posture>.csv).
+Grid of the sets of thresholds is evaluated at once by broadcasting the
+thresholds along the first axis, in chunks on a process pool. For each
+set, confusion matrix and accuracy of each class are counted.
+
+python -m strYa.tuning datasets/angles [--set side_low=6:14:2 ...] [--start T0] [--end T1] [--workers N] [--top 5]
+'''
+
+import pathlib
+import argparse
+import numpy as np
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+from strYa.analyser import POSTURES, THRESHOLDS, posture_labels
+from strYa.recording import read_angles
+
+ANGLES_PREFIX: str = 'angles_'
+CLASSES: Tuple[str] = POSTURES + ('not_clear', )
+
+# grid that is swept by default, about 94 thousand sets of thresholds;
+# the thresholds, that are not in it, keep their values
+DEFAULT_GRID: Dict[str, Sequence[float]] = {
+    'steady': np.arange(3, 9),
+    'rotation_low': np.arange(20, 45, 5),
+    'tilt_low': np.arange(6, 16, 2),
+    'tilt_high': np.arange(20, 32.5, 2.5),
+    'tilt_lower': np.arange(5, 10),
+    'side_low': np.arange(6, 16, 2),
+    'side_high': np.arange(20, 45, 5),
+}
+
+
+def load_datasets(directory: str, start: float = None,
+                  end: float = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Reads the datasets, which names are the postures (only the rows with
+    start <= computer_time < end, if either is given). Angles are normalised
+    due to the optimal position as Analyzer.check_data does it. Returns (N, 2)
+    arrays of angles (x, y) of upper and lower sensor groups and N labels
+    '''
+
+    uppers, lowers, labels = [], [], []
+    for label, posture in enumerate(POSTURES):
+        path = pathlib.Path(directory).joinpath(f'{ANGLES_PREFIX}{posture}.csv')
+        if not path.exists():
+            continue
+        _, angles, optimal = read_angles(path, start, end)
+        x1, y1 = angles[:, 0] + optimal[0], angles[:, 1] - optimal[1]
+        x2, y2 = angles[:, 3] + optimal[3], angles[:, 4] - optimal[4]
+        uppers.append(np.column_stack((x1, y1)))
+        lowers.append(np.column_stack((x2, y2)))
+        labels.append(np.full(len(angles), label))
+
+    if not labels:
+        raise ValueError(f'There are no labelled datasets in {directory}')
+    return np.concatenate(uppers), np.concatenate(lowers), np.concatenate(labels)
+
+
+def make_grid(ranges: Dict[str, Sequence[float]]) -> Dict[str, np.ndarray]:
+    '''
+    All the combinations of the values of the thresholds, as a (P, ) array
+    for each of them. Thresholds, that are not in ranges, are the defaults
+    '''
+
+    unknown = set(ranges) - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f'Unknown thresholds: {", ".join(sorted(unknown))}')
+
+    names = list(THRESHOLDS)
+    values = [np.atleast_1d(ranges.get(name, THRESHOLDS[name])) for name in names]
+    mesh = np.meshgrid(*values, indexing='ij')
+    return {name: axis.ravel().astype(np.float64) for name, axis in zip(names, mesh)}
+
+
+def confusion_matrices(upper: np.ndarray, lower: np.ndarray, labels: np.ndarray,
+                       grid: Dict[str, np.ndarray]) -> np.ndarray:
+    '''
+    (P, len(POSTURES), len(CLASSES)) array of confusion matrices, one for
+    each set of thresholds: rows are the true postures, columns are the
+    predicted ones (not_clear included)
+    '''
+
+    num_of_sets = len(next(iter(grid.values())))
+    predicted = posture_labels(upper, lower, {name: values[:, None] for name, values in grid.items()})
+    # each set has its own range of len(POSTURES) * len(CLASSES) cells
+    cells = (np.arange(num_of_sets)[:, None] * len(POSTURES) + labels) * len(CLASSES) + predicted
+    counts = np.bincount(cells.ravel(), minlength=num_of_sets * len(POSTURES) * len(CLASSES))
+    return counts.reshape(num_of_sets, len(POSTURES), len(CLASSES))
+
+
+def class_accuracy(confusion: np.ndarray) -> np.ndarray:
+    '''
+    Share of the samples of each posture, that were classified
+    correctly (recall), for each set of thresholds
+    '''
+
+    correct = np.diagonal(confusion, axis1=-2, axis2=-1)
+    total = confusion.sum(axis=-1)
+    return np.divide(correct, total, out=np.full(correct.shape, np.nan), where=total > 0)
+
+
+def _chunk(args: Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]) -> np.ndarray:
+    return confusion_matrices(*args)
+
+
+def sweep(directory: str, ranges: Dict[str, Sequence[float]] = None, workers: int = None,
+          chunk_size: int = 500, start: float = None,
+          end: float = None) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    '''
+    Evaluates all the sets of thresholds of the grid on the pool of workers
+    (all cores by default), on the rows of the time range of the datasets
+    (see load_datasets). Returns the grid and the confusion matrices
+    '''
+
+    upper, lower, labels = load_datasets(directory, start, end)
+    grid = make_grid(DEFAULT_GRID if ranges is None else ranges)
+    num_of_sets = len(next(iter(grid.values())))
+    chunks = ((upper, lower, labels, {name: values[start:start + chunk_size]
+                                      for name, values in grid.items()})
+              for start in range(0, num_of_sets, chunk_size))
+
+    with ProcessPoolExecutor(workers) as executor:
+        confusion = np.concatenate(list(executor.map(_chunk, chunks)))
+    return grid, confusion
+
+
+def report(grid: Dict[str, np.ndarray], confusion: np.ndarray, top: int = 5) -> List[str]:
+    '''
+    Lines of the report: the best sets of thresholds by mean accuracy of the
+    classes, accuracy of each class and confusion matrices of the best one
+    and of the current thresholds, if they are in the grid
+    '''
+
+    accuracy = class_accuracy(confusion)
+    score = np.nanmean(accuracy, axis=1)
+    best = np.argsort(-score, kind='stable')[:top]
+    swept = [name for name, values in grid.items() if len(np.unique(values)) > 1]
+
+    params = [', '.join(f'{name}={grid[name][idx]:g}' for name in swept) for idx in best]
+    width = max(map(len, params + [f'{len(score)} sets of thresholds'])) + 2
+    lines = [f'{len(score)} sets of thresholds'.ljust(width) +
+             ''.join(f'{posture:>18}' for posture in POSTURES) + f'{"mean":>8}']
+    for idx, text in zip(best, params):
+        lines.append(text.ljust(width) + ''.join(f'{value:>18.3f}' for value in accuracy[idx]) +
+                     f'{score[idx]:>8.3f}')
+
+    current = np.flatnonzero(np.logical_and.reduce(
+        [grid[name] == value for name, value in THRESHOLDS.items()]))
+    for title, idx in (('the best one', best[0]), ('the current thresholds', current[:1])):
+        if np.size(idx) == 0:
+            continue
+        idx = int(np.ravel(idx)[0])
+        lines.append('')
+        lines.append(f'confusion matrix of {title}, mean accuracy {score[idx]:.3f} '
+                     '(rows are true postures)')
+        lines.append(' ' * 18 + ''.join(f'{name:>18}' for name in CLASSES))
+        for posture, row in zip(POSTURES, confusion[idx]):
+            lines.append(f'{posture:<18}' + ''.join(f'{value:>18}' for value in row))
+    return lines
+
+
+def _parse_range(text: str) -> Tuple[str, np.ndarray]:
+    # name=value or name=start:stop:step (stop is not included)
+    name, _, values = text.partition('=')
+    if ':' in values:
+        start, stop, step = map(float, values.split(':'))
+        return name, np.arange(start, stop, step)
+    return name, np.array([float(value) for value in values.split(',')])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('directory', help='directory of labelled angles datasets')
+    parser.add_argument('--set', action='append', default=[], dest='ranges',
+                        help='values of a threshold: name=start:stop:step or name=a,b,c; '
+                             'if none are given, the default grid is swept')
+    parser.add_argument('--start', type=float, help='computer_time of the first rows to use')
+    parser.add_argument('--end', type=float, help='computer_time up to which the rows are used')
+    parser.add_argument('--workers', type=int, help='number of processes, all cores by default')
+    parser.add_argument('--top', type=int, default=5, help='number of the best sets to show')
+    args = parser.parse_args()
+
+    ranges = dict(map(_parse_range, args.ranges)) if args.ranges else None
+    start = perf_counter()
+    grid, confusion = sweep(args.directory, ranges, args.workers, start=args.start, end=args.end)
+    print('\n'.join(report(grid, confusion, args.top)))
+    print(f'\n{len(confusion)} sets in {perf_counter() - start:.1f} s')
@@ -2,11 +2,11 @@
 Module that contains function to visualise the sensor with OpenGL and pygame.
 '''
 from analyser import Analyzer
+from rotations import euler_from_quaternion
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import pygame
 from pygame.locals import *
-import math
 import pandas as pd
 import time
 import numpy as np
@@ -117,22 +117,8 @@ def Quaternion_to_Euler(Q):
     '''
     Return the Euler angles that are gotten from quaternion.
     '''
-    # Turns the Quaternion readings into Euler Angles for projection
     w, x, y, z = Q[0], Q[1], Q[2], Q[3]
-    ysqr = y*y
-    t0 = +2.0 * (w * x + y*z)
-    t1 = +1.0 - 2.0 * (x*x + ysqr)
-    ax = (math.degrees(math.atan2(t0, t1)))
-
-    t2 = +2.0 * (w*y - z*x)
-    t2 = 1 if t2 > 1 else t2
-    t2 = -1 if t2 < -1 else t2
-    ay = math.degrees(math.asin(t2))
-
-    t3 = +2.0 * (w * z + x*y)
-    t4 = +1.0 - 2.0 * (ysqr + z*z)
-    az = math.degrees(math.atan2(t3, t4))
-    return ax, ay, az
+    return euler_from_quaternion(w, x, y, z)
 
 
 def read_data(path):
@@ -4,9 +4,32 @@ TODO: Tests for analyser, posture position and sensor group
 
 import unittest
 import sys
+import io
+import os
+import pathlib
+import contextlib
+import tempfile
+import shutil
+import subprocess
+import time
+import queue
+import threading
+import logging
+from unittest import mock
 # sys.path.append("..") # Adds higher directory to python modules path.
 
-import adts
+import numpy as np
+import pandas as pd
+from ahrs.filters import Mahony
+
+import main
+import server
+import asyncio
+from benchmarks import memory, pipeline
+from posture_app.apps.cache import DatasetCache
+from strYa import adts, analyser, batch, convert, downsampling, events, fusion, incremental, ingest, live, logs, metrics, recording, rolling, rotations, tuning
+
+DATASETS = pathlib.Path(__file__).parent.parent.joinpath('datasets')
 
 class TestBuffer(unittest.TestCase):
 
@@ -38,6 +61,27 @@ class TestBuffer(unittest.TestCase):
         # thouhg it is worth discussing whether we actually need this mean or not
         self.assertEqual(self.buffer.count_gyro_drift(), (12, 12, 12))
 
+    def test_running_statistics(self):
+        # pushes the buffer over several turns, so that the oldest
+        # elements are overwritten and the sums are recounted
+        for i in range(25, 80):
+            self.buffer.push((i, 2 * i, 0))
+        values = self.buffer.values()
+        self.assertEqual(values[0].tolist(), [55, 110, 0])
+        self.assertEqual(values[-1].tolist(), [79, 158, 0])
+        np.testing.assert_allclose(self.buffer.mean(), values.mean(axis=0))
+        np.testing.assert_allclose(self.buffer.variance(), values.var(axis=0))
+        self.assertFalse(self.buffer.is_steady(1.0))
+
+    def test_dtype(self):
+        buffer = adts.Buffer(size=4, width=2, dtype=np.float32)
+        self.assertFalse(buffer.is_steady(1.0))
+        for _ in range(4):
+            buffer.push((0.5, 1.5))
+        self.assertEqual(buffer.values().dtype, np.float32)
+        self.assertEqual(buffer.optimal_position(), [0.5, 1.5])
+        self.assertTrue(buffer.is_steady(0.0))
+
 
 # ---- there is no point in testing acc, because it is simply a container -----
 
@@ -67,6 +111,17 @@ class TestGyro(unittest.TestCase):
         # checks that the buffer bias is applied to the measurements
         self.assertEqual(self.gyro.process_values([15, 15, 15]), [3, 3, 3])
 
+    def test_continuous_bias(self):
+        gyro = adts.Gyro(continuous=True)
+        for i in range(30):
+            gyro.set_values([i, i, i])
+        self.assertEqual(gyro.settings, (12, 12, 12))
+        # the sensor holds still, so the bias follows its measurements
+        for _ in range(25):
+            gyro.set_values([0.5, 0.5, 0.5])
+        self.assertEqual(gyro.settings, (0.5, 0.5, 0.5))
+        self.assertEqual(list(gyro.current_value), [0, 0, 0])
+
 
 class TestQuaternionContainer(unittest.TestCase):
 
@@ -79,6 +134,170 @@ class TestQuaternionContainer(unittest.TestCase):
         self.assertEqual(self.orientation.to_euler(), (0, 0, 0))
 
 
+class TestConvert(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        raw = self.path.joinpath('raw')
+        raw.mkdir()
+        for name in ('steady.csv', 'side_tilt.csv'):
+            raw.joinpath(name).write_bytes(DATASETS.joinpath('raw_data', name).read_bytes())
+        raw.joinpath('angles_steady.csv').write_text('')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_find_recordings(self):
+        raw = self.path.joinpath('raw')
+        paths = convert.find_recordings([raw, str(raw.joinpath('s*.csv'))])
+        self.assertEqual([path.name for path in paths], ['side_tilt.csv', 'steady.csv'])
+
+    def test_process_data_from_file(self):
+        from_file = self.path.joinpath('raw', 'steady.csv')
+        self.assertEqual(adts.PosturePosition().process_data_from_file(str(from_file)), 294)
+        angles = pd.read_csv(self.path.joinpath('raw', 'angles_steady.csv'))
+        self.assertEqual(len(angles), 245)
+
+        # the rows are integrated at 5 Hz, unless the periods are asked
+        # to be taken from the timestamps
+        raw = pd.read_csv(from_file)
+        for fixed_rate in (False, True):
+            posture = adts.PosturePosition()
+            posture.process_data_from_file(from_file, self.path.joinpath('angles.csv'),
+                                           fixed_rate=fixed_rate)
+            expected, _, _ = batch.orientations_from_raw(
+                raw[batch.RAW_COLUMNS].to_numpy(),
+                timestamps=None if fixed_rate else raw['computer_time'].to_numpy())
+            angles = pd.read_csv(self.path.joinpath('angles.csv'))[batch.ANGLE_COLUMNS]
+            np.testing.assert_allclose(angles.to_numpy()[:-1], expected, atol=1e-9)
+            # the recording is made at about 9 Hz, not 5
+            self.assertAlmostEqual(posture.upper_sensor_group.clock.period,
+                                   0.2 if fixed_rate else 1 / 9, delta=0.02)
+
+    def test_incremental(self):
+        raw = DATASETS.joinpath('raw_data', 'steady.csv').read_bytes()
+        lines = [line + b'\n' for line in raw.split(b'\n')[:-1]]
+        from_file = self.path.joinpath('growing.csv')
+        to_file = self.path.joinpath('angles_growing.csv')
+        expected_file = self.path.joinpath('expected.csv')
+
+        # the recording has just started, there is nothing to calibrate with
+        from_file.write_bytes(b''.join(lines[:51]))
+        posture = adts.PosturePosition(fixed_rate=False)
+        self.assertEqual(posture.process_data_from_file(from_file, to_file, incremental=True), 0)
+        self.assertEqual(list(self.path.glob('angles_growing*')), [])
+
+        # the last row is not written completely yet
+        from_file.write_bytes(b''.join(lines[:121]) + lines[121][:20])
+        self.assertEqual(posture.process_data_from_file(from_file, to_file, incremental=True), 120)
+        checkpoint = incremental.load_checkpoint(to_file)
+        self.assertGreater(checkpoint['clock']['_count'], 0)
+        for lines_written in (200, 200, len(lines)):
+            from_file.write_bytes(b''.join(lines[:lines_written]))
+            samples = posture.process_data_from_file(from_file, to_file, incremental=True)
+            self.assertEqual(samples, lines_written - 1)
+        self.assertEqual(incremental.load_checkpoint(to_file)['bias'], checkpoint['bias'])
+
+        full = adts.PosturePosition(fixed_rate=False)
+        full.process_data_from_file(from_file, expected_file)
+        self.assertEqual(to_file.read_bytes(), expected_file.read_bytes())
+        for group, expected in zip(posture.sensor_groups, full.sensor_groups):
+            self.assertEqual(group.clock.state(), expected.clock.state())
+            self.assertEqual(group.gyro.settings, expected.gyro.settings)
+            self.assertEqual(group.optimal_position, expected.optimal_position)
+            self.assertEqual(group.orientation.to_euler(), expected.orientation.to_euler())
+
+        # file, that was rewritten since the checkpoint, is processed from the start
+        from_file.write_bytes(b''.join(lines[:100]))
+        self.assertEqual(posture.process_data_from_file(from_file, to_file, incremental=True), 99)
+        self.assertEqual(len(pd.read_csv(to_file)), 50)
+
+        # and so is the larger recording, that replaced it
+        other = DATASETS.joinpath('raw_data', 'main_two.csv')
+        shutil.copyfile(other, from_file)
+        samples = posture.process_data_from_file(from_file, to_file, incremental=True)
+        self.assertEqual(samples, len(pd.read_csv(other)))
+        full.process_data_from_file(from_file, expected_file)
+        self.assertEqual(to_file.read_bytes(), expected_file.read_bytes())
+
+    def test_fingerprint(self):
+        path = self.path.joinpath('recording.csv')
+        data = bytes(range(256)) * 1024
+        path.write_bytes(data)
+        expected = incremental.fingerprint(path, len(data) - 100, block_size=4096)
+        # only the beginning and the end of the processed part are read
+        for changed, same in ((10, False), (len(data) // 2, True), (len(data) - 200, False)):
+            other = bytearray(data)
+            other[changed] ^= 1
+            path.write_bytes(bytes(other))
+            fingerprint = incremental.fingerprint(path, len(data) - 100, block_size=4096)
+            self.assertEqual(fingerprint == expected, same)
+        # the rows after the processed part do not change it
+        path.write_bytes(data[:-100] + b'\0' * 1000)
+        self.assertEqual(incremental.fingerprint(path, len(data) - 100, block_size=4096), expected)
+
+    def test_convert(self):
+        out_dir = self.path.joinpath('angles')
+        paths = convert.find_recordings([self.path.joinpath('raw')])
+        results = sorted(convert.convert(paths, out_dir, workers=2))
+        self.assertEqual([(path.name, samples) for path, samples, _ in results],
+                         [('side_tilt.csv', 361), ('steady.csv', 294)])
+        self.assertEqual(sorted(path.name for path in out_dir.iterdir()),
+                         ['angles_side_tilt.csv', 'angles_steady.csv'])
+
+
+class TestRotations(unittest.TestCase):
+
+    def test_batch_matches_single(self):
+        rng = np.random.default_rng(1)
+        quats = rng.normal(size=(50, 4))
+        quats /= np.linalg.norm(quats, axis=1)[:, None]
+        expected = [rotations.euler_from_quaternion(*q) for q in quats.tolist()]
+        np.testing.assert_allclose(rotations.quaternion_to_euler(quats), expected, atol=1e-9)
+
+    def test_output_buffer(self):
+        out = np.zeros((2, 6))
+        quats = [[1, 0, 0, 0], [0.7071068, 0.7071068, 0, 0]]
+        result = rotations.quaternion_to_euler(quats, out=out[:, 3:])
+        self.assertTrue(np.shares_memory(result, out))
+        np.testing.assert_allclose(out, [[0, 0, 0, 0, 0, 0], [0, 0, 0, 90, 0, 0]], atol=1e-4)
+        with self.assertRaises(ValueError):
+            rotations.quaternion_to_euler(quats, out=np.zeros((3, 3)))
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.x = np.arange(10000, dtype=np.float64)
+        self.y = np.sin(self.x / 100)
+        self.y[4321] = 50
+
+    def test_lttb(self):
+        selected = downsampling.lttb(self.x, self.y, 200)
+        self.assertEqual(len(selected), 200)
+        self.assertEqual((selected[0], selected[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(selected) > 0))
+        # spike is the point of the largest triangle in its bucket
+        self.assertIn(4321, selected)
+        np.testing.assert_array_equal(downsampling.lttb(self.x[:100], self.y[:100], 200),
+                                      np.arange(100))
+
+    def test_minmax(self):
+        selected = downsampling.minmax(self.y[:-7], 100)
+        self.assertLessEqual(len(selected), 2 * 100 + 2)
+        self.assertIn(4321, selected)
+        self.assertEqual(self.y[:-7][selected].min(), self.y[:-7].min())
+        self.assertEqual(selected[-1], len(self.y) - 8)
+
+    def test_downsample(self):
+        x, y = downsampling.downsample(self.x, self.y, 500, downsampling.MINMAX)
+        self.assertLessEqual(len(x), 510)
+        np.testing.assert_array_equal(np.sin(x / 100)[y != 50], y[y != 50])
+        with self.assertRaises(ValueError):
+            downsampling.downsample(self.x, self.y, 500, 'every_tenth')
+
+
 class TestSensorGroup(unittest.TestCase):
     
     def setUp(self) -> None:
@@ -98,5 +317,958 @@ class TestSensorGroup(unittest.TestCase):
         self.assertEqual([int(elm) for elm in self.sg.deviation_from_optimal()], [32, 45, 101])
 
 
+class TestFusion(unittest.TestCase):
+
+    def test_matches_ahrs(self):
+        # random, but reproducible measurements of gyro and accelerometer
+        rng = np.random.default_rng(0)
+        mahony = Mahony(frequency=5)
+        q_ahrs = np.array([1.0, 0.0, 0.0, 0.0])
+        q = (1.0, 0.0, 0.0, 0.0)
+        for gyr, acc in zip(rng.normal(0, 0.5, (100, 3)), rng.normal(0, 5, (100, 3))):
+            q_ahrs = mahony.updateIMU(q_ahrs, gyr, acc)
+            q = fusion.mahony_update_imu(q, gyr.tolist(), acc.tolist(), 0.2)
+            np.testing.assert_allclose(q, q_ahrs, atol=1e-12)
+
+    def test_zero_gyro(self):
+        q = (0.5, 0.5, 0.5, 0.5)
+        self.assertEqual(fusion.mahony_update_imu(q, (0, 0, 0), (0, 0, 9.8), 0.2), q)
+
+    def test_fused_matches_ahrs(self):
+        rng = np.random.default_rng(3)
+        mahony = Mahony(frequency=5)
+        fused = fusion.FusedMahony(frequency=5)
+        state = fused.q
+        q_ahrs = np.array([1.0, 0.0, 0.0, 0.0])
+        for idx, (gyr, acc) in enumerate(zip(rng.normal(0, 0.5, (100, 3)), rng.normal(0, 5, (100, 3)))):
+            # sample period of each update may differ
+            dt = 0.2 if idx % 3 else 0.05
+            mahony.Dt = dt
+            q_ahrs = mahony.updateIMU(q_ahrs, gyr, acc)
+            q = fused.update(gyr.tolist(), acc.tolist(), None if dt == 0.2 else dt)
+            self.assertIs(q, state)
+            np.testing.assert_allclose(q, q_ahrs, atol=1e-12)
+        self.assertTrue(np.any(fused.bias != 0))
+
+    def test_sample_clock(self):
+        clock = fusion.SampleClock(frequency=5)
+        rng = np.random.default_rng(5)
+        # 9 Hz stream, stamped by chunks of 3 frames, with a pause of 5 s
+        times = np.repeat(np.arange(200) / 3, 3) + np.repeat(rng.uniform(0, 0.02, 200), 3)
+        times[300:] += 5
+        dts = np.array([clock.step(timestamp) for timestamp in times.tolist()])
+        self.assertAlmostEqual(clock.period, 1 / 9, delta=0.01)
+        self.assertEqual(dts[0], 0)
+        self.assertLessEqual(dts.max(), 1.5 * 0.2)
+        # time is integrated as the timestamps go, except for the pause
+        self.assertAlmostEqual(dts.sum(), times[-1] - times[0] - 5, delta=0.5)
+        self.assertAlmostEqual(clock.dropped, 5 * 9, delta=3)
+
+    def test_synthetic_rates(self):
+        rng = np.random.default_rng(6)
+        for rate in (10, 100, 500):
+            # tilts by 20 degrees in 2 seconds and holds still, jittery
+            # timestamps, 2% of samples are lost
+            times = np.arange(6 * rate) / rate
+            keep = rng.random(len(times)) > 0.02
+            angle = np.radians(20) * np.clip((times - 1) / 2, 0, 1)
+            rotation = np.where((times >= 1) & (times < 3), np.radians(10), 0.0)
+            stamps = times + rng.uniform(-0.2, 0.2, len(times)) / rate
+
+            errors = {}
+            for timestamped in (True, False):
+                group = adts.SensorGroup()
+                group.gyro.settings = (0.0, 0.0, 0.0)
+                error = 0.0
+                for idx in np.flatnonzero(keep).tolist():
+                    group.gyro.set_values([rotation[idx], 0.0, 0.0])
+                    group.acc.set_values([0.0, 9.81 * np.sin(angle[idx]), 9.81 * np.cos(angle[idx])])
+                    group.count_orientation(only_count=True,
+                                            timestamp=stamps[idx] if timestamped else None)
+                    roll = 2 * np.arctan2(group.orientation.x, group.orientation.w)
+                    error = max(error, abs(np.degrees(roll - angle[idx])))
+                errors[timestamped] = error
+            self.assertLess(errors[True], 1.5, rate)
+            self.assertGreater(errors[False], 3 * errors[True], rate)
+
+    def test_fused_integrate(self):
+        fused = fusion.FusedMahony(integrate=True)
+        plain = fusion.FusedMahony()
+        fused.update([0.1, 0, 0], [0, 1, 9.8])
+        plain.update([0.1, 0, 0], [0, 1, 9.8])
+        # the first error is multiplied by the sample period
+        np.testing.assert_allclose(fused.integral, plain.integral * fused.dt)
+        first = fused.integral.copy()
+        fused.update([0.1, 0, 0], [0, 1, 9.8])
+        self.assertGreater(abs(fused.integral[0]), abs(first[0]))
+        np.testing.assert_allclose(fused.bias, -fusion.K_I * fused.integral)
+        fused.reset()
+        np.testing.assert_array_equal(fused.q, [1, 0, 0, 0])
+        np.testing.assert_array_equal(fused.integral, 0)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.raw = pd.read_csv(DATASETS.joinpath('raw_data', 'main_one.csv'))
+        self.angles = pd.read_csv(DATASETS.joinpath('angles', 'angles_main_one.csv'))
+
+    def test_matches_dataset(self):
+        angles, optimal, start = batch.orientations_from_raw(
+            self.raw[batch.RAW_COLUMNS].to_numpy())
+        expected = self.angles[batch.ANGLE_COLUMNS].to_numpy()
+        self.assertEqual(start, 50)
+        np.testing.assert_allclose(angles, expected[:-1], atol=1e-6)
+        np.testing.assert_allclose(optimal, expected[-1], atol=1e-6)
+        np.testing.assert_allclose(self.raw['computer_time'].to_numpy()[start:],
+                                   self.angles['computer_time'].to_numpy()[:-1], atol=1e-3)
+
+    def test_timestamps(self):
+        raw = self.raw[batch.RAW_COLUMNS].to_numpy()
+        times = self.raw['computer_time'].to_numpy()
+        angles, optimal, _ = batch.orientations_from_raw(raw, timestamps=times)
+        # the recording is made at about 9 Hz, not 5
+        periods = fusion.sample_periods(times[25:])
+        self.assertAlmostEqual(np.median(periods), 1 / 9, delta=0.02)
+        self.assertEqual(angles.shape, (len(raw) - 50, 6))
+        self.assertFalse(np.allclose(angles, batch.orientations_from_raw(raw)[0]))
+
+    def test_not_enough_data(self):
+        with self.assertRaises(ValueError):
+            batch.orientations_from_raw(np.zeros((50, 12)))
+        with self.assertRaises(ValueError):
+            batch.orientations_from_raw(np.zeros((100, 6)))
+
+
+class TestLineParsing(unittest.TestCase):
+
+    LINE = b'2.07, 0.31, 9.09; -0.04, -0.07, -0.01|-2.24, -0.14, 7.97; -0.07, -0.08, 0.01\r\n'
+
+    def test_parse_lines(self):
+        chunk = self.LINE * 3 + b'garbage\r\n\r\n' + \
+                b'1, 2, 3; 4, 5, nan|1, 2, 3; 4, 5, 6\r\n' + \
+                b'1.2.3, 2, 3; 4, 5, 6|1, 2, 3; 4, 5, 6\r\n' + self.LINE
+        values, rejected = adts.parse_lines(chunk)
+        self.assertEqual(values.shape, (4, 12))
+        self.assertEqual(rejected, 3)
+        self.assertEqual(values[-1].tolist(), [2.07, 0.31, 9.09, -0.04, -0.07, -0.01,
+                                               -2.24, -0.14, 7.97, -0.07, -0.08, 0.01])
+
+    def test_line_parser(self):
+        parser = adts.LineParser()
+        self.assertEqual(parser.feed(self.LINE[:20]).shape, (0, 12))
+        self.assertEqual(parser.feed(self.LINE[20:] + self.LINE[:5]).shape, (1, 12))
+        self.assertEqual(parser.remainder, self.LINE[:5])
+        self.assertEqual(parser.feed(b'x' * 2000).shape, (0, 12))
+        self.assertEqual((parser.parsed, parser.rejected), (1, 1))
+
+    def test_preprocess_data(self):
+        posture = adts.PosturePosition()
+        self.assertEqual(posture.preprocess_data(self.LINE),
+                         [[[2.07, 0.31, 9.09], [-0.04, -0.07, -0.01]],
+                          [[-2.24, -0.14, 7.97], [-0.07, -0.08, 0.01]]])
+        with self.assertRaises(ValueError):
+            posture.preprocess_data(b'2.07, 0.31, 9.09|-2.24, -0.14, 7.97\r\n')
+        with self.assertRaises(ValueError):
+            posture.preprocess_data(self.LINE.decode())
+
+
+class TestFrameDecoder(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(3)
+        self.values = np.round(rng.normal(0, 3, (40, 12)), 2)
+        # sequence numbers wrap around in the middle of the stream
+        self.stream = adts.encode_frames(self.values, seq=2 ** 16 - 20)
+
+    def test_round_trip(self):
+        decoder = adts.FrameDecoder()
+        values = np.concatenate([decoder.feed(self.stream[i:i + 7])
+                                 for i in range(0, len(self.stream), 7)])
+        np.testing.assert_allclose(values, self.values, atol=1e-3)
+        self.assertEqual((decoder.decoded, decoder.dropped, decoder.corrupted), (40, 0, 0))
+
+    def test_corrupted_stream(self):
+        size = adts.FRAME_SIZE
+        stream = bytearray(self.stream)
+        # breaks checksum of the 5th frame and sync word of the 21st one
+        stream[4 * size + 10] ^= 0xff
+        stream[20 * size] = 0
+        stream = b'\xaa\x55garbage' + bytes(stream[:30 * size]) + bytes(stream[31 * size:])
+
+        decoder = adts.FrameDecoder()
+        values = decoder.feed(stream)
+        self.assertEqual(len(values), 37)
+        self.assertEqual(decoder.dropped, 3)
+        self.assertEqual(decoder.corrupted, 2)
+        np.testing.assert_allclose(values[-1], self.values[-1], atol=1e-3)
+
+
+class FakePort:
+    '''
+    Imitates serial port, that has the given bytes waiting in it
+    '''
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.written = b''
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.data)
+
+    def read(self, size: int = 1) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def write(self, data: bytes) -> int:
+        self.written += bytes(data)
+        return len(data)
+
+
+class TestSerialReader(unittest.TestCase):
+
+    LINE = TestLineParsing.LINE
+
+    def test_drop_oldest(self):
+        reader = ingest.SerialReader(FakePort(b''), maxsize=3)
+        for idx in range(5):
+            reader.put((idx, None))
+        self.assertEqual((reader.depth, reader.max_depth, reader.overflows), (3, 3, 2))
+        self.assertEqual([reader.get()[0] for _ in range(3)], [2, 3, 4])
+
+    def test_reading(self):
+        port = FakePort(self.LINE * 10 + b'garbage\r\n' + self.LINE[:10])
+        reader = ingest.SerialReader(port, policy=ingest.BLOCK, maxsize=4)
+        reader.start()
+        frames = [reader.get(timeout=1)[1] for _ in range(10)]
+        reader.stop()
+        self.assertEqual(frames[-1].tolist()[:3], [2.07, 0.31, 9.09])
+        self.assertEqual((reader.received, reader.overflows), (10, 0))
+        self.assertEqual(reader.parser.rejected, 1)
+
+    def test_port_error(self):
+        class BrokenPort(FakePort):
+
+            def read(self, size: int = 1) -> bytes:
+                if not self.data:
+                    raise OSError('device disconnected')
+                return super().read(size)
+
+        reader = ingest.SerialReader(BrokenPort(self.LINE * 3))
+        reader.start()
+        frames = []
+        with self.assertRaises(OSError):
+            for _, frame in reader:
+                frames.append(frame)
+        reader.stop()
+        self.assertEqual(len(frames), 3)
+        self.assertIsInstance(reader.error, OSError)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ingest.SerialReader(FakePort(b''), policy='drop_newest')
+
+
+class TestReplaySource(unittest.TestCase):
+
+    def test_fast_replay(self):
+        path = DATASETS.joinpath('raw_data', 'steady.csv')
+        frames = list(ingest.ReplaySource(path, speed=None, block_size=100))
+        df = pd.read_csv(path)
+        self.assertEqual(len(frames), len(df))
+        self.assertEqual(frames[-1][0], df['computer_time'].iloc[-1])
+        self.assertEqual(frames[-1][1].tolist(), df[batch.RAW_COLUMNS].iloc[-1].tolist())
+
+    def test_pacing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory).joinpath('raw.strya')
+            with recording.RecordingWriter(path) as writer:
+                # one second of measurements, replayed 10 times faster
+                writer.extend(np.column_stack((np.linspace(100, 101, 11), np.zeros((11, 12)))))
+            start = time.monotonic()
+            frames = list(ingest.ReplaySource(path, speed=10))
+            self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual([timestamp for timestamp, _ in frames], np.linspace(100, 101, 11).tolist())
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_writer(self):
+        path = self.path.joinpath('raw.strya')
+        posture = adts.PosturePosition()
+        with recording.RecordingWriter(path, block_size=4) as writer:
+            for idx in range(10):
+                posture.set_sensor_data(posture.split_frame(list(range(12))), writer, idx)
+        # the last, incomplete record is ignored
+        with open(path, 'ab') as file:
+            file.write(b'\x00' * 20)
+
+        rec = recording.Recording(path)
+        self.assertEqual(len(rec), 10)
+        self.assertEqual(rec.columns, recording.RAW_RECORDING_COLUMNS)
+        self.assertEqual(rec['computer_time'].tolist(), list(range(10)))
+        self.assertEqual(rec.select(['x_acc_1', 'z_gyro_2'])[-1].tolist(), [0, 11])
+
+    def test_convert(self):
+        from_file = DATASETS.joinpath('angles', 'angles_steady.csv')
+        to_file = recording.convert_csv(from_file, self.path.joinpath('angles.strya'))
+        self.assertEqual(len(recording.Recording(to_file)), 244)
+        for expected, actual in zip(recording.read_angles(from_file), recording.read_angles(to_file)):
+            np.testing.assert_array_equal(expected, actual)
+
+        to_file = recording.convert_csv(DATASETS.joinpath('raw_data', 'steady.csv'),
+                                        self.path.joinpath('raw.strya'))
+        rec = recording.Recording(to_file)
+        self.assertEqual(rec.data.shape, (294, 13))
+        self.assertEqual(rec.meta, {})
+
+    def test_not_recording(self):
+        with self.assertRaises(ValueError):
+            recording.Recording(DATASETS.joinpath('raw_data', 'steady.csv'))
+
+    def test_read_range(self):
+        for name in ('raw_data/main_one.csv', 'angles/angles_main_one.csv'):
+            path = self.path.joinpath(pathlib.Path(name).name)
+            path.write_bytes(DATASETS.joinpath(name).read_bytes())
+            df = pd.read_csv(path)
+            if 'x1' in df:
+                df = df.iloc[:-1]
+            start, end = df['computer_time'].iloc[[300, 500]]
+            expected = df[(df['computer_time'] >= start) & (df['computer_time'] < end)]
+
+            actual = recording.read_range(path, start, end)
+            pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True))
+            # only the blocks around the range are read
+            first, last = recording.TimeIndex(path, 256).locate(start, end)
+            self.assertLess(last - first, path.stat().st_size * 0.6)
+
+            binary = recording.read_range(recording.convert_csv(path), start, end)
+            np.testing.assert_allclose(binary['computer_time'], expected['computer_time'], atol=1e-6)
+
+        times, angles, optimal = recording.read_angles(path, start, end)
+        self.assertEqual(len(times), 200)
+        np.testing.assert_array_equal(optimal, recording.read_angles(path)[2])
+        # the optimal position row is not a row of the open range
+        full = recording.read_angles(path)
+        for start, end in ((None, np.inf), (-np.inf, None)):
+            times, angles, _ = recording.read_angles(path, start, end)
+            np.testing.assert_allclose(angles, full[1], rtol=1e-15)
+
+    def test_index_follows_file(self):
+        lines = DATASETS.joinpath('raw_data', 'steady.csv').read_bytes().split(b'\n')[:-1]
+        path = self.path.joinpath('growing.csv')
+        path.write_bytes(b'\n'.join(lines[:100]) + b'\n' + lines[100][:10])
+        index = recording.TimeIndex(path, block_size=16)
+        self.assertEqual(index.rows, 99)
+
+        with open(path, 'ab') as file:
+            file.write(lines[100][10:] + b'\n' + b'\n'.join(lines[101:]) + b'\n')
+        index = recording.TimeIndex(path, block_size=16)
+        self.assertEqual(index.rows, len(lines) - 1)
+        times = pd.read_csv(path)['computer_time']
+        np.testing.assert_allclose(index.times, times.iloc[::16], rtol=1e-15)
+        self.assertEqual(len(recording.read_range(path, times.iloc[280], np.inf)), len(times) - 280)
+
+        path.write_bytes(b'\n'.join(lines[:20]) + b'\n')
+        self.assertEqual(recording.TimeIndex(path, block_size=16).rows, 19)
+
+        # larger recording with the same header, that was written anew
+        path.write_bytes(b'computer_time,x\n' + b''.join(b'%d,0\n' % i for i in range(1000, 1600)))
+        recording.TimeIndex(path)
+        path.write_bytes(b'computer_time,x\n' + b''.join(b'%d,0\n' % i for i in range(2000, 2700)))
+        self.assertEqual(len(recording.read_range(path, 2000, np.inf)), 700)
+
+    def test_index_not_saved(self):
+        path = self.path.joinpath('angles_steady.csv')
+        path.write_bytes(DATASETS.joinpath('angles', 'angles_steady.csv').read_bytes())
+        times = recording.read_angles(path)[0]
+        index = recording.TimeIndex(path, block_size=16, persistent=False)
+        actual = recording.read_range(path, times[50], times[150], index)
+        self.assertEqual(len(actual), 100)
+        self.assertFalse(os.path.exists(index.index_path))
+
+        # the index file cannot be written, as in a read-only location
+        os.mkdir(index.index_path)
+        index = recording.TimeIndex(path, block_size=16)
+        self.assertFalse(index.persistent)
+        pd.testing.assert_frame_equal(recording.read_range(path, times[50], times[150], index), actual)
+
+
+class TestFrames(unittest.TestCase):
+
+    def test_slots(self):
+        group = adts.SensorGroup()
+        for obj in (group, group.acc, group.gyro, group.orientation, group.buffer):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_set_frame(self):
+        frame = np.arange(12, dtype=np.float64)
+        posture = adts.PosturePosition()
+        nested = adts.PosturePosition()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = pathlib.Path(directory).joinpath('frames.strya')
+        with recording.RecordingWriter(path) as writer:
+            for idx in range(30):
+                posture.set_frame(frame, writer, idx)
+                nested.set_sensor_data(nested.split_frame(frame.tolist()), None, idx)
+        # the frame is not changed by processing of gyro values
+        np.testing.assert_array_equal(frame, np.arange(12))
+        for group, expected in zip(posture.sensor_groups, nested.sensor_groups):
+            self.assertEqual(group.gyro.settings, expected.gyro.settings)
+            np.testing.assert_array_equal(group.gyro.current_value, expected.gyro.current_value)
+            np.testing.assert_array_equal(group.acc.current_value, expected.acc.current_value)
+        np.testing.assert_array_equal(posture.lower_sensor_group.gyro.current_value, [0, 0, 0])
+        self.assertEqual(recording.Recording(path).data[-1].tolist(), [29] + list(range(12)))
+
+        # values, that are kept, are not changed by the next frame
+        acc = posture.upper_sensor_group.acc.current_value
+        posture.set_frame(frame + 1)
+        self.assertEqual(list(acc), [0, 1, 2])
+        self.assertEqual(list(posture.upper_sensor_group.acc.current_value), [1, 2, 3])
+
+
+class TestAnalyzer(unittest.TestCase):
+
+    def test_classify_matches_check_mode(self):
+        rng = np.random.default_rng(2)
+        upper = rng.uniform(-80, 80, (2000, 2))
+        lower = rng.uniform(-80, 80, (2000, 2))
+        # makes some of samples fall into steady and tilt classes
+        upper[:500] /= 16
+        lower[:1000] /= 12
+
+        analyzer = analyser.Analyzer()
+        expected = [analyzer.check_mode(orient_1, orient_2)
+                    for orient_1, orient_2 in zip(upper.tolist(), lower.tolist())]
+
+        labels, counts = analyser.Analyzer.classify(upper, lower)
+        np.testing.assert_array_equal(labels, expected)
+        for posture in analyser.POSTURES:
+            self.assertEqual(counts[posture], analyzer.info_on_user[posture])
+            self.assertGreater(counts[posture], 0)
+        self.assertEqual(sum(counts.values()), 2000)
+
+    def test_check_data(self):
+        analyzer = analyser.Analyzer()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            counts = analyzer.check_data(DATASETS.joinpath('angles', 'angles_steady.csv'))
+        self.assertEqual(output.getvalue(), '')
+        self.assertEqual(analyzer.info_on_user['num_of_iterations'], 244)
+        self.assertEqual(sum(counts.values()), 244)
+
+    def test_check_data_range(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = pathlib.Path(directory).joinpath('angles_steady.csv')
+        path.write_bytes(DATASETS.joinpath('angles', 'angles_steady.csv').read_bytes())
+        times = recording.read_angles(path)[0]
+        counts = analyser.Analyzer().check_data(path, times[50], times[150])
+        self.assertEqual(sum(counts.values()), 100)
+        self.assertEqual(sum(analyser.Analyzer().check_data(path, None, np.inf).values()), 244)
+
+    def test_script_import(self):
+        # visualization.py is run from strYa/ and imports analyser as a top-level module
+        result = subprocess.run([sys.executable, '-c', 'import analyser'],
+                                cwd=pathlib.Path(analyser.__file__).parent,
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class TestTuning(unittest.TestCase):
+
+    def test_grid_matches_classify(self):
+        rng = np.random.default_rng(3)
+        upper = rng.uniform(-40, 40, (500, 2))
+        lower = rng.uniform(-40, 40, (500, 2))
+        upper[:200] /= 8
+        lower[:300] /= 6
+        labels = rng.integers(0, len(analyser.POSTURES), 500)
+
+        grid = tuning.make_grid({'steady': [4, 5, 6], 'side_low': [8, 10], 'tilt_lower': [5, 7]})
+        self.assertEqual(len(grid['steady']), 12)
+        confusion = tuning.confusion_matrices(upper, lower, labels, grid)
+        self.assertEqual(confusion.shape, (12, len(analyser.POSTURES), len(tuning.CLASSES)))
+        for idx in range(12):
+            thresholds = {name: values[idx] for name, values in grid.items()}
+            predicted, _ = analyser.Analyzer.classify(upper, lower, thresholds)
+            expected = np.zeros(confusion.shape[1:], dtype=int)
+            np.add.at(expected, (labels, predicted), 1)
+            np.testing.assert_array_equal(confusion[idx], expected)
+
+        with self.assertRaises(ValueError):
+            tuning.make_grid({'unknown': [1]})
+
+    def test_load_range(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = pathlib.Path(directory).joinpath('angles_steady.csv')
+        path.write_bytes(DATASETS.joinpath('angles', 'angles_steady.csv').read_bytes())
+        upper, lower, labels = tuning.load_datasets(directory)
+        times = recording.read_angles(path)[0]
+        ranged = tuning.load_datasets(directory, times[100], None)
+        for expected, actual in zip((upper, lower, labels), ranged):
+            np.testing.assert_array_equal(actual, expected[100:])
+
+    def test_sweep(self):
+        grid, confusion = tuning.sweep(DATASETS.joinpath('angles'),
+                                       {'steady': [4, 5], 'side_low': [8, 10]},
+                                       workers=2, chunk_size=3)
+        self.assertEqual(len(confusion), 4)
+        # only the datasets named after a posture are labelled
+        self.assertEqual(confusion[0, 0].sum(), 244)
+        current = (grid['steady'] == 5) & (grid['side_low'] == 10)
+        _, counts = analyser.Analyzer().classify(
+            *tuning.load_datasets(DATASETS.joinpath('angles'))[:2])
+        self.assertEqual(confusion[current][0].sum(axis=0).tolist(), list(counts.values()))
+        accuracy = tuning.class_accuracy(confusion)
+        self.assertTrue(((accuracy >= 0) & (accuracy <= 1)).all())
+        self.assertIn('confusion matrix of the current thresholds',
+                      '\n'.join(tuning.report(grid, confusion)))
+
+
+class TestLiveFeed(unittest.TestCase):
+
+    def test_since(self):
+        feed = live.LiveFeed(size=4)
+        for i in range(3):
+            feed.push(float(i), [i, -i, 0], [2 * i, 0, 0], i % 2)
+        seq, times, angles, labels = feed.since(0)
+        self.assertEqual(seq, 3)
+        np.testing.assert_array_equal(times, [0, 1, 2])
+        np.testing.assert_array_equal(angles[2], [2, -2, 4, 0])
+        np.testing.assert_array_equal(labels, [0, 1, 0])
+        self.assertEqual(len(feed.since(3)[1]), 0)
+
+        # reader that is behind gets only the samples that are kept
+        for i in range(3, 10):
+            feed.push(float(i), [i, 0], [i, 0], analyser.UNCLEAR)
+        seq, times, _, _ = feed.since(1)
+        self.assertEqual(seq, 10)
+        np.testing.assert_array_equal(times, [6, 7, 8, 9])
+        self.assertEqual(feed.counts()['not_clear'], 7)
+        self.assertEqual(sum(feed.counts().values()), 10)
+
+    def test_main_pushes(self):
+        feed = live.LiveFeed()
+        main.main(from_file=DATASETS.joinpath('raw_data', 'steady.csv'), speed=None, feed=feed)
+        self.assertEqual(feed.seq, 170)
+        self.assertEqual(sum(feed.counts().values()), 170)
+
+
+class TestRollingStats(unittest.TestCase):
+
+    def test_windows(self):
+        names = analyser.POSTURES + ('not_clear', )
+        stats = rolling.RollingStats(names)
+        rng = np.random.default_rng(3)
+        # 30 hours at 1 Hz with gaps, longer than any of the resolutions keep
+        timestamps = np.sort(rng.uniform(1.6e9, 1.6e9 + 30 * 3600, 100000))
+        labels = rng.integers(0, len(names), len(timestamps))
+        sizes = [level.counts.nbytes for level in stats.levels]
+        for timestamp, label in zip(timestamps.tolist(), labels.tolist()):
+            stats.add(timestamp, label)
+        self.assertEqual([level.counts.nbytes for level in stats.levels], sizes)
+
+        now = timestamps[-1]
+        for seconds, width in ((300, 1.0), (250.5, 1.0), (1800, 60.0), (86400, 3600.0)):
+            first = (now // width - np.ceil(seconds / width) + 1) * width
+            expected = np.bincount(labels[timestamps >= first], minlength=len(names))
+            self.assertEqual(stats.window(seconds), dict(zip(names, expected.tolist())))
+
+        self.assertEqual(sum(stats.since(now - 60).values()), sum(stats.window(60).values()))
+        with self.assertRaises(ValueError):
+            stats.window(2 * 86400)
+
+    def test_check_mode(self):
+        analyzer = analyser.Analyzer()
+        for idx in range(600):
+            analyzer.check_mode((0, 0), (0, 0) if idx < 300 else (20, 0), timestamp=1000 + idx / 5)
+        self.assertEqual(analyzer.stats.window(60)['side_tilt'], 300)
+        self.assertEqual(analyzer.stats.window(60)['steady'], 0)
+        self.assertEqual(analyzer.stats.window(3600)['steady'], analyzer.info_on_user['steady'])
+
+
+class TestEvents(unittest.TestCase):
+
+    class Port:
+
+        def __init__(self, delay=0.0):
+            self.delay = delay
+            self.written = []
+
+        def write(self, data):
+            time.sleep(self.delay)
+            self.written.append(data)
+
+    def test_debouncer(self):
+        debouncer = events.Debouncer(hold=1.0, release=0.5)
+        samples = [False, True, True, False, True, True, True, True, True, True, False,
+                   False, False, True, False, False, False, False]
+        emitted = [debouncer.update(idx / 5, bad) for idx, bad in enumerate(samples)]
+        changes = [(round(event.timestamp * 5), event.bad) for event in emitted if event]
+        # short runs of bad and good samples change nothing
+        self.assertEqual(changes, [(9, True), (17, False)])
+
+    def test_led_writer_coalesces(self):
+        port = self.Port(delay=0.05)
+        led = events.LedWriter(port)
+        start = time.perf_counter()
+        for idx in range(1000):
+            led.set(idx % 3 == 0)
+        led.set(True)
+        # the writes do not block the caller
+        self.assertLess(time.perf_counter() - start, 0.05)
+        led.close()
+        self.assertLessEqual(len(port.written), 3)
+        self.assertEqual(port.written[-1], events.LED_ON)
+        self.assertEqual(led.writes, len(port.written))
+
+    def test_attach(self):
+        led = events.LedWriter(threaded=False)
+        led.set(True)
+        led.set(True)
+        port = self.Port()
+        led.attach(port)
+        led.set(False)
+        led.attach(port)
+        self.assertEqual(port.written, [events.LED_ON, events.LED_OFF, events.LED_OFF])
+
+    def test_check_mode(self):
+        port = self.Port()
+        led = events.LedWriter(port, threaded=False)
+        analyzer = analyser.Analyzer()
+        rng = np.random.default_rng(4)
+        # a minute of sitting at 5 Hz, tilted in the middle of it, with noisy samples
+        tilted = (np.arange(300) >= 100) & (np.arange(300) < 200)
+        noisy = rng.random(300) < 0.1
+        for idx in range(300):
+            side = 20 if tilted[idx] != noisy[idx] else 0
+            analyzer.check_mode((0, 0), (side, 0), led=led, timestamp=idx / 5)
+        self.assertEqual(port.written, [events.LED_ON, events.LED_OFF])
+        self.assertEqual([event.bad for event in analyzer.events], [True, False])
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_summary(self):
+        result = pipeline.summary([1e-6] * 99 + [1e-4])
+        self.assertAlmostEqual(result['samples_per_sec'], 100 / 1.99e-4)
+        self.assertAlmostEqual(result['p50_us'], 1.0)
+
+    def test_compare(self):
+        baseline = {'parse': {'samples_per_sec': 100}, 'filter': {'samples_per_sec': 100}}
+        results = {'parse': {'samples_per_sec': 80}, 'filter': {'samples_per_sec': 70},
+                   'classify': {'samples_per_sec': 1}}
+        self.assertEqual(pipeline.compare(results, baseline, 0.25), ['filter'])
+
+    def test_memory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        results = memory.run(300, directory + '/session.strya')
+        self.assertGreater(results['in_flight_bytes_per_frame'], 12 * 8)
+        self.assertLess(results['retained_kb'], results['peak_kb'])
+
+    def test_to_lines(self):
+        values, _ = adts.parse_lines(b''.join(pipeline.to_lines(np.full((3, 12), -0.5))))
+        self.assertEqual(values.tolist(), np.full((3, 12), -0.5).tolist())
+
+
+class TestDatasetCache(unittest.TestCase):
+
+    def test_lru_and_mtime(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [pathlib.Path(directory).joinpath(f'{idx}.csv') for idx in range(3)]
+            for path in paths:
+                path.write_text(path.name)
+
+            cache = DatasetCache(lambda path: pathlib.Path(path).read_text(), maxsize=2)
+            cache.warm(paths[:2])
+            self.assertEqual(cache.get(paths[0]), '0.csv')
+            # the second dataset is the least recently used one
+            cache.get(paths[2])
+            self.assertEqual((len(cache), cache.hits, cache.misses), (2, 1, 3))
+            cache.get(paths[1])
+            self.assertEqual(cache.misses, 4)
+
+            paths[1].write_text('changed')
+            os.utime(paths[1], ns=(0, 10 ** 9))
+            self.assertEqual(cache.get(paths[1]), 'changed')
+            self.assertEqual(len(cache), 2)
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        df = pd.read_csv(DATASETS.joinpath('raw_data', 'steady.csv'))
+        self.lines = pipeline.to_lines(df[batch.RAW_COLUMNS].to_numpy())
+
+    def test_session_matches_replay(self):
+        session = server.DeviceSession('device', adts.LineParser())
+        # chunks are split in the middle of the lines
+        data = b''.join(self.lines)
+        for start in range(0, len(data), 1000):
+            session.feed(data[start:start + 1000])
+        expected = main.Analyzer()
+        main.process(main.PosturePosition(), expected, ingest.ReplaySource(
+            DATASETS.joinpath('raw_data', 'steady.csv'), speed=None), None, None)
+        self.assertEqual(session.processed, len(self.lines))
+        self.assertEqual(session.analyser.info_on_user, expected.info_on_user)
+
+    def test_tcp_and_udp(self):
+        async def send():
+            posture_server = server.PostureServer()
+            address = await posture_server.start('127.0.0.1', 0)
+            for device_id in ('first', 'second'):
+                reader, writer = await asyncio.open_connection(*address)
+                writer.write(device_id.encode() + b'\n' + b''.join(self.lines[:100]))
+                await writer.drain()
+                writer.close()
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=address)
+            for line in self.lines[:60]:
+                transport.sendto(b'third\n' + line)
+            transport.sendto(b'no device id')
+            transport.close()
+            for _ in range(50):
+                if posture_server.stats()['processed'] == 260:
+                    break
+                await asyncio.sleep(0.05)
+            posture_server.close()
+            return posture_server
+
+        posture_server = asyncio.run(send())
+        self.assertEqual(set(posture_server.sessions), {'first', 'second', 'third'})
+        self.assertEqual(posture_server.sessions['first'].processed, 100)
+        self.assertEqual(posture_server.sessions['third'].processed, 60)
+        self.assertEqual(posture_server.rejected, 1)
+        self.assertEqual(posture_server.sessions['second'].analyser.info_on_user,
+                         posture_server.sessions['first'].analyser.info_on_user)
+
+    def test_reset_turns_led_off(self):
+        port = TestEvents.Port()
+        session = server.DeviceSession('device', adts.LineParser(), port)
+        for idx in range(20):
+            session.analyser.check_mode((0, 0), (20, 0), led=session.led, timestamp=idx / 5)
+        self.assertEqual(port.written, [events.LED_OFF, events.LED_ON])
+        session.reset()
+        for idx in range(20, 70):
+            session.analyser.check_mode((0, 0), (0, 0), led=session.led, timestamp=idx / 5)
+        self.assertEqual(port.written, [events.LED_OFF, events.LED_ON, events.LED_OFF])
+        self.assertFalse(session.led.state)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram('stage_seconds', 'Time', bounds=(1, 2), stage='filter')
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        registry.counter('frames_total', 'Frames').inc(3)
+        registry.callback('depth', 'Depth', lambda: 7, kind='gauge')
+        lines = registry.export().splitlines()
+        self.assertIn('# TYPE strya_stage_seconds histogram', lines)
+        self.assertIn('strya_stage_seconds_bucket{stage="filter",le="1"} 2', lines)
+        self.assertIn('strya_stage_seconds_bucket{stage="filter",le="+Inf"} 4', lines)
+        self.assertIn('strya_stage_seconds_count{stage="filter"} 4', lines)
+        self.assertIn('strya_frames_total 3', lines)
+        self.assertIn('strya_depth 7', lines)
+        with self.assertRaises(ValueError):
+            registry.counter('stage_seconds', 'Time')
+
+    def test_disabled(self):
+        registry = metrics.Registry(enabled=False)
+        self.assertIs(registry.histogram('stage_seconds', 'Time'), metrics.NULL_METRIC)
+        self.assertEqual(registry.clock(), 0.0)
+        self.assertEqual(registry.export(), '\n')
+
+    def test_main_exports(self):
+        import urllib.request
+
+        registry = metrics.Registry()
+        server = registry.serve(0)
+        pipeline_metrics = metrics.PipelineMetrics(registry)
+        main.process(adts.PosturePosition(), analyser.Analyzer(), ingest.ReplaySource(
+            DATASETS.joinpath('raw_data', 'steady.csv'), speed=None), None, None,
+            metrics=pipeline_metrics)
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url) as response:
+            text = response.read().decode()
+        server.shutdown()
+        server.server_close()
+        self.assertIn('strya_frames_processed_total 294', text)
+        self.assertIn('strya_stage_seconds_count{stage="classify"} 170', text)
+        self.assertEqual(sum(counter.value for counter in pipeline_metrics.classifications), 170)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = pathlib.Path(directory).joinpath('metrics.prom')
+        main.main(from_file=DATASETS.joinpath('raw_data', 'steady.csv'), speed=None,
+                  metrics_file=str(path))
+        self.assertIn('strya_frames_processed_total 294', path.read_text())
+
+        # the port is released, so main can be called again (after recalibration)
+        servers = []
+        serve = metrics.Registry.serve
+        with mock.patch.object(metrics.Registry, 'serve', autospec=True,
+                               side_effect=lambda *args: servers.append(serve(*args)) or servers[-1]):
+            main.main(from_file=DATASETS.joinpath('raw_data', 'steady.csv'), speed=None,
+                      metrics_port=0)
+        self.assertEqual(servers[0].socket.fileno(), -1)
+
+    def test_reader(self):
+        pipeline_metrics = metrics.PipelineMetrics(metrics.Registry())
+        port = FakePort(TestLineParsing.LINE * 10 + b'garbage\r\n')
+        reader = ingest.SerialReader(port, metrics=pipeline_metrics)
+        pipeline_metrics.watch_reader(reader)
+        reader.start()
+        for _ in range(10):
+            reader.get(timeout=1)
+        reader.stop()
+        text = pipeline_metrics.registry.export()
+        self.assertIn('strya_frames_read_total 10', text)
+        self.assertIn('strya_parse_errors_total 1', text)
+        self.assertIn('strya_queue_depth 0', text)
+        self.assertGreater(pipeline_metrics.parse.count, 0)
+
+
+class TestLogs(unittest.TestCase):
+
+    def record(self, msg='. . .'):
+        return logging.LogRecord('strYa.main', logging.INFO, __file__, 0, msg, (), None)
+
+    def test_rate_limit(self):
+        now = [0.0]
+        rate_limit = logs.RateLimitFilter(interval=1.0, burst=2, clock=lambda: now[0])
+        passed = [rate_limit.filter(self.record()) for _ in range(10)]
+        self.assertEqual(passed, [True, True] + [False] * 8)
+        # other messages have their own limits
+        self.assertTrue(rate_limit.filter(self.record('other')))
+
+        now[0] = 1.5
+        record = self.record()
+        self.assertTrue(rate_limit.filter(record))
+        self.assertEqual(record.getMessage(), '. . . (8 similar messages suppressed)')
+
+    def test_dropping_queue(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(3))
+        for _ in range(5):
+            handler.handle(self.record())
+        self.assertEqual(handler.queue.qsize(), 3)
+        self.assertEqual(handler.dropped, 2)
+
+    def test_setup(self):
+        output = io.StringIO()
+        listener = logs.setup(stream=output)
+        logger = logging.getLogger('strYa.test')
+        try:
+            for _ in range(100):
+                logger.info('. . .')
+            logger.debug('not shown')
+        finally:
+            logs.shutdown()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('INFO strYa.test: . . .', lines[0])
+        self.assertEqual(logging.getLogger(logs.LOGGER_NAME).handlers, [])
+
+    def test_setup_again(self):
+        first, second = io.StringIO(), io.StringIO()
+        threads = threading.active_count()
+        logs.setup(stream=first)
+        try:
+            logs.setup(stream=second)
+            # the previous listener is stopped and its handler removed
+            self.assertEqual(threading.active_count(), threads + 1)
+            logging.getLogger('strYa.test').warning('once')
+        finally:
+            logs.shutdown()
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(first.getvalue(), '')
+        self.assertIn('once', second.getvalue())
+        logs.shutdown()
+
+    def test_shutdown_full_queue(self):
+        class SlowStream(io.StringIO):
+            delay = 0.005
+
+            def write(self, text: str) -> int:
+                time.sleep(self.delay)
+                return super().write(text)
+
+        output = SlowStream()
+        threads = threading.active_count()
+        logs.setup(stream=output, burst=100, maxsize=4)
+        logger = logging.getLogger('strYa.test')
+        for idx in range(50):
+            logger.info('record %d', idx)
+        # the queue is full, the sentinel waits for space in it
+        logs.shutdown()
+        self.assertEqual(threading.active_count(), threads)
+        self.assertIn('record 0', output.getvalue())
+
+        # the records, that the stream does not take in time, are dropped
+        stream = SlowStream()
+        stream.delay = 0.1
+        records = queue.Queue(4)
+        listener = logs.DrainingQueueListener(records, logging.StreamHandler(stream),
+                                              timeout=0.01)
+        listener.start()
+        for _ in range(5):
+            records.put(self.record())
+        listener.stop()
+        self.assertTrue(records.empty())
+        self.assertEqual(len(stream.getvalue().splitlines()), 1)
+
+    def test_posture_summary(self):
+        now = [0.0]
+        summary = logs.PostureSummary(analyser.POSTURES + ('not_clear', ), interval=10,
+                                      clock=lambda: now[0])
+        with self.assertLogs('strYa.summary', level='INFO') as captured:
+            for idx in range(100):
+                now[0] = idx / 10
+                summary.add(3 if idx % 8 == 0 else 0)
+            now[0] = 10.0
+            summary.add(0)
+        self.assertEqual(len(captured.output), 1)
+        self.assertIn('last 10 s: steady 87%, side_tilt 13%', captured.output[0])
+
+
+class TestMain(unittest.TestCase):
+
+    def test_replay(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), \
+                self.assertLogs('strYa', level='DEBUG') as captured:
+            main.main(from_file=DATASETS.joinpath('raw_data', 'steady.csv'), speed=None)
+        # nothing is printed per sample
+        self.assertEqual(output.getvalue(), '')
+        lines = [record.getMessage() for record in captured.records]
+        self.assertIn('num_of_iterations', lines[-1])
+        self.assertTrue(lines[-2].startswith('170 iteration'))
+
+    def test_fixed_rate(self):
+        # THRESHOLDS hold for the angles integrated at 5 Hz, the periods
+        # are taken from the timestamps only if it is asked for
+        path = DATASETS.joinpath('raw_data', 'steady.csv')
+        for fixed_rate in (True, False):
+            posture = adts.PosturePosition(fixed_rate)
+            with self.assertLogs('strYa', level='INFO'):
+                main.process(posture, analyser.Analyzer(), ingest.ReplaySource(path, None),
+                             None, None)
+            self.assertAlmostEqual(posture.upper_sensor_group.clock.period,
+                                   0.2 if fixed_rate else 1 / 9, delta=0.02)
+
+
 if __name__ == '__main__':
     unittest.main()